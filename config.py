@@ -0,0 +1,45 @@
+"""全エントリポイントで共有する設定
+
+.env はこのモジュールを最初に import した時に一度だけ読み込む（utils の各設定より先に import すること）。
+autogen・openai・requests はここでは読み込まず、議論や天気の取得を始めた時点で読み込む。
+"""
+
+import os
+import threading
+from typing import Dict
+from dotenv import load_dotenv
+
+# 環境変数を読み込み（utils の各設定より先に読み込む）
+load_dotenv()
+
+def build_llm_config(temperature: float = 0.7) -> Dict:
+    """全方式共通のLLM設定（MOCK_LLM=1 / LLM_BASE_URL で接続先を切り替え）"""
+    from utils.llm_cache import AUTOGEN_CACHE_SEED, llm_temperature
+    from utils.mock_llm import configure_llm_backend
+    from utils.streaming import llm_stream_enabled
+
+    config_list = configure_llm_backend([
+        {
+            "model": "gpt-4o",
+            "api_key": os.getenv("OPENAI_API_KEY"),
+        }
+    ])
+    return {
+        "config_list": config_list,
+        "temperature": llm_temperature(temperature),
+        "stream": llm_stream_enabled(),
+        # LLM_CACHE_ENABLED=0 の時に autogen 既定のディスクキャッシュ（.cache/）へ切り替わらないようにする
+        "cache_seed": AUTOGEN_CACHE_SEED,
+    }
+
+_weather_service = None
+_weather_lock = threading.Lock()
+
+def get_weather_service():
+    """全方式で共有する天気サービス（最初に天気を取得する時に作成）"""
+    global _weather_service
+    with _weather_lock:
+        if _weather_service is None:
+            from utils.weather_service import WeatherService
+            _weather_service = WeatherService()
+        return _weather_service
@@ -0,0 +1,217 @@
+"""テナントレコードとテナントストア（JSON/CSVローダー付き）"""
+
+import csv
+import itertools
+import json
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from data.takeshiba_tenants import TAKESHIBA_TENANTS
+
+# 天気適性のビット割り当て
+WEATHER_BITS = {
+    "sunny": 1 << 0,
+    "cloudy": 1 << 1,
+    "rainy": 1 << 2,
+    "cold": 1 << 3,
+    "clear": 1 << 4,
+}
+
+# 天気分類ごとに一致とみなすビット（WeatherService._classify_weather は clear を返さない）
+WEATHER_MATCH_MASKS = {
+    "sunny": WEATHER_BITS["sunny"] | WEATHER_BITS["clear"],
+    "clear": WEATHER_BITS["sunny"] | WEATHER_BITS["clear"],
+}
+
+# 同じ天気適性の並びは1つのタプルを共有する（テナントごとにリストを持たない）
+_PREFERENCE_TUPLES: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+def shared_preferences(preferences: Iterable[str]) -> Tuple[str, ...]:
+    """天気適性を記載順のまま（未知の値も含めて）共有のタプルにする"""
+    key = tuple(sys.intern(weather.strip()) for weather in preferences if weather and weather.strip())
+    return _PREFERENCE_TUPLES.setdefault(key, key)
+
+def weather_mask(preferences: Iterable[str]) -> int:
+    """天気適性のリストをビットマスクに変換"""
+    mask = 0
+    for weather in preferences:
+        mask |= WEATHER_BITS.get(weather.strip(), 0)
+    return mask
+
+def weather_match_mask(weather: Optional[str]) -> int:
+    """天気分類に一致するテナントを調べるためのマスク"""
+    if not weather:
+        return 0
+    return WEATHER_MATCH_MASKS.get(weather, WEATHER_BITS.get(weather, 0))
+
+def weather_names(mask: int) -> List[str]:
+    """ビットマスクを天気適性のリストに戻す"""
+    return [name for name, bit in WEATHER_BITS.items() if mask & bit]
+
+class Tenant:
+    """1テナント分のレコード（__slots__ で辞書を持たず、文字列はインターンして共有）
+
+    天気適性は記載順のまま共有のタプルで保持し（未知の値も残す）、照合には既知の値のビットマスクを使う。
+    """
+
+    __slots__ = ("name", "category", "group", "floor", "description", "weather_preference", "weather_mask", "property_name")
+
+    def __init__(
+        self,
+        name: str,
+        category: str,
+        group: str,
+        floor: str,
+        description: str,
+        weather_preference: Iterable[str] = (),
+        property_name: str = "",
+    ):
+        self.name = name
+        self.category = sys.intern(category)
+        self.group = sys.intern(group)
+        self.floor = sys.intern(floor)
+        self.description = description
+        self.weather_preference = shared_preferences(weather_preference)
+        self.weather_mask = weather_mask(self.weather_preference)
+        self.property_name = sys.intern(property_name)
+
+    @classmethod
+    def from_dict(cls, record: Dict, group: Optional[str] = None, property_name: str = "") -> "Tenant":
+        """TAKESHIBA_TENANTS 形式の辞書から作成"""
+        preferences = record.get("weather_preference", [])
+        if isinstance(preferences, str):
+            preferences = preferences.replace("|", ";").replace(",", ";").split(";")
+        return cls(
+            name=record["name"],
+            category=record.get("category", ""),
+            group=group or record.get("group", ""),
+            floor=record.get("floor", ""),
+            description=record.get("description", ""),
+            weather_preference=preferences,
+            property_name=record.get("property", property_name),
+        )
+
+    def matches_weather(self, weather: Optional[str]) -> bool:
+        """天気分類に適しているか（ビット演算のみ）"""
+        return bool(self.weather_mask & weather_match_mask(weather))
+
+    def to_dict(self) -> Dict:
+        """TAKESHIBA_TENANTS 形式の辞書に変換"""
+        return {
+            "name": self.name,
+            "category": self.category,
+            "floor": self.floor,
+            "weather_preference": list(self.weather_preference),
+            "description": self.description,
+        }
+
+    def __repr__(self) -> str:
+        return f"Tenant({self.name!r}, group={self.group!r}, floor={self.floor!r})"
+
+# 全ストアで通し番号の版（ストアを作り直しても版が重複しない）
+_revisions = itertools.count(1)
+
+class TenantStore:
+    """テナントレコードの集合
+
+    revision は add / extend / clear のたびに更新される版番号で、整形済みテキストや要望キャッシュの区画の鍵に使う
+    （テナントの内容を変える場合は、レコードを書き換えずにストア経由で入れ替える）。
+    """
+
+    def __init__(self, tenants: Iterable[Tenant] = ()):
+        self.tenants: List[Tenant] = list(tenants)
+        self.revision = next(_revisions)
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, List[Dict]], property_name: str = "") -> "TenantStore":
+        """{グループ: [テナント辞書]} 形式から作成"""
+        return cls(
+            Tenant.from_dict(record, group=group, property_name=property_name)
+            for group, records in mapping.items()
+            for record in records
+        )
+
+    def __len__(self) -> int:
+        return len(self.tenants)
+
+    def __iter__(self) -> Iterator[Tenant]:
+        return iter(self.tenants)
+
+    def add(self, tenant: Tenant):
+        self.tenants.append(tenant)
+        self.revision = next(_revisions)
+
+    def extend(self, tenants: Iterable[Tenant]):
+        self.tenants.extend(tenants)
+        self.revision = next(_revisions)
+
+    def clear(self):
+        self.tenants.clear()
+        self.revision = next(_revisions)
+
+    def grouped(self) -> Dict[str, List[Tenant]]:
+        """グループごとのテナント（元データの順）"""
+        groups: Dict[str, List[Tenant]] = {}
+        for tenant in self.tenants:
+            groups.setdefault(tenant.group, []).append(tenant)
+        return groups
+
+    def filter_by_weather(self, weather: Optional[str]) -> List[Tenant]:
+        """天気分類に適したテナントを抽出"""
+        mask = weather_match_mask(weather)
+        return [tenant for tenant in self.tenants if tenant.weather_mask & mask]
+
+    def to_mapping(self) -> Dict[str, List[Dict]]:
+        """TAKESHIBA_TENANTS 形式に変換（互換用。呼び出しごとに作成し保持しない）"""
+        return {group: [tenant.to_dict() for tenant in tenants] for group, tenants in self.grouped().items()}
+
+def load_tenants(path: str, store: Optional[TenantStore] = None) -> TenantStore:
+    """JSON/CSVファイル（またはそれらを含むディレクトリ）からテナントを読み込み
+
+    - JSON: {グループ: [テナント]} 形式、または "group" を含むテナントのリスト
+    - CSV: group,name,category,floor,weather_preference,description[,property] 列
+      （weather_preference は ; 区切り）
+    ディレクトリの場合はファイル名を物件名として全ファイルを読み込む。
+    """
+    store = store if store is not None else TenantStore()
+    target = Path(path)
+
+    if target.is_dir():
+        for child in sorted(target.iterdir()):
+            if child.suffix.lower() in (".json", ".csv"):
+                _load_file(child, store, property_name=child.stem)
+        return store
+
+    _load_file(target, store, property_name="")
+    return store
+
+def _load_file(path: Path, store: TenantStore, property_name: str):
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            store.extend(TenantStore.from_mapping(data, property_name=property_name))
+        else:
+            store.extend(Tenant.from_dict(record, property_name=property_name) for record in data)
+    elif suffix == ".csv":
+        with open(path, encoding="utf-8", newline="") as f:
+            store.extend(Tenant.from_dict(row, property_name=property_name) for row in csv.DictReader(f))
+    else:
+        raise ValueError(f"未対応のテナントファイル形式です: {path}")
+
+@lru_cache(maxsize=None)
+def get_default_store() -> TenantStore:
+    """既定のテナントストア（TENANT_DATA_PATH があればそこから読み込み）"""
+    path = os.getenv("TENANT_DATA_PATH")
+    if path:
+        return load_tenants(path)
+    return TenantStore.from_mapping(TAKESHIBA_TENANTS)
+
+def get_default_tenants() -> Dict[str, List[Dict]]:
+    """既定のテナントデータ（TAKESHIBA_TENANTS 形式。互換用で、整形・指紋の計算は get_default_store() のレコードから行う）"""
+    if os.getenv("TENANT_DATA_PATH"):
+        return get_default_store().to_mapping()
+    return TAKESHIBA_TENANTS
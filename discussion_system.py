@@ -0,0 +1,315 @@
+"""4方式のマルチエージェントレコメンドシステムに共通する、エージェントの貸し借り・議論の実行・結果の記録"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+# .env の読み込み（utils の各設定より先に import する）
+from config import get_weather_service
+from utils.agent_pool import AGENT_POOL, collect_agents, reset_agents
+from utils.discussion import agent_spoke, extract_final_recommendation
+from utils.fast_path import FAST_PATH
+from utils.history_compaction import create_history_compactor
+from utils.instrumentation import METRICS, DiscussionRecorder, track_speaker_selection
+from utils.llm_cache import LLM_CACHE
+from utils.request_cache import REQUEST_CACHE
+from utils.streaming import AsyncTokenStream, TokenStreamer, stream_tokens
+from utils.termination import DiscussionTerminator
+from utils.tenant_context import render_relevant_tenant_context, render_tenant_context
+
+class DiscussionSystem:
+    """各方式のシステムの基底クラス
+
+    サブクラスはエージェントの構築（setup_agents）と議論の設定（discussion_agents / discuss）、
+    表示する文言（クラス属性）だけを定義する。
+    """
+
+    # DiscussionRecorder・REQUEST_CACHE で使う方式名
+    mode = ""
+    # 最終提案を出す統合役エージェントの属性名
+    final_agent_attr = ""
+    # 要望を尋ねる前に表示する案内
+    request_banner = ""
+    # 会議の開始・終了時に表示する文言と区切り線の幅
+    start_banner = "エージェント会議を開始します..."
+    end_banner = "会議が終了しました。"
+    rule_width = 60
+    # base_context の見出しと、テナント情報の後に続く議論の指示
+    context_title = "【会議テーマ】竹芝ポートシティでのおすすめ提案"
+    context_instructions = ""
+
+    def __init__(
+        self,
+        defer_setup: bool = False,
+        tenant_top_k: Optional[int] = None,
+        use_fast_path: Optional[bool] = None,
+    ):
+        self.agents_ready = False
+        # 共有プールから借りているエージェント一式（属性名 -> エージェント）
+        self.pooled_agents = {}
+        self.setup_stats = None
+        self.stream_metrics = None
+        self.round_stats = None
+        self.compaction_stats = None
+        self.metrics = None
+        # 会話履歴の圧縮（HISTORY_COMPACTION=0 で無効）
+        self.history_compactor = create_history_compactor()
+        if not defer_setup:
+            self.ensure_agents()
+        self.weather_info = None
+        self.user_request = None
+        # 0の場合は全テナントをプロンプトに含める
+        self.tenant_top_k = tenant_top_k if tenant_top_k is not None else int(os.getenv("TENANT_TOP_K", "0"))
+        # 単純な要望をLLMを使わずに即答するか
+        self.use_fast_path = use_fast_path if use_fast_path is not None else os.getenv("FAST_PATH_ENABLED", "0") == "1"
+
+    @property
+    def final_agent(self):
+        """最終提案を出す統合役エージェント"""
+        return getattr(self, self.final_agent_attr)
+
+    def ensure_agents(self):
+        """エージェントを用意（共有プールから借り、借りている一式は前回の会話履歴を消去して使い回す）"""
+        started = time.perf_counter()
+        reused = self.agents_ready
+        if self.agents_ready:
+            reset_agents(self.pooled_agents.values())
+        else:
+            self.pooled_agents, reused = AGENT_POOL.acquire(type(self).__name__, self._build_agents)
+            vars(self).update(self.pooled_agents)
+            self.agents_ready = True
+        elapsed = time.perf_counter() - started
+        # 初回（コールドスタート）と直近の議論ごとの準備時間
+        if self.setup_stats is None:
+            self.setup_stats = {"cold_start_seconds": elapsed, "cold_start_reused": reused, "setups": 0}
+        self.setup_stats["setups"] += 1
+        self.setup_stats["setup_seconds"] = elapsed
+        self.setup_stats["reused"] = reused
+
+    def release_agents(self):
+        """借りているエージェントを会話履歴を消去してプールに返す"""
+        if not self.agents_ready:
+            return
+        AGENT_POOL.release(type(self).__name__, self.pooled_agents)
+        for name in self.pooled_agents:
+            delattr(self, name)
+        self.pooled_agents = {}
+        self.agents_ready = False
+
+    def _build_agents(self):
+        self.setup_agents()
+        return collect_agents(self)
+
+    def setup_agents(self):
+        """エージェントをセットアップ（サブクラスで定義）"""
+        raise NotImplementedError
+
+    def get_weather_info(self):
+        """現在の天気情報を取得"""
+        return get_weather_service().get_current_weather()
+
+    async def aget_weather_info(self):
+        """現在の天気情報を非同期で取得"""
+        return await get_weather_service().aget_current_weather()
+
+    def get_user_request(self):
+        """ユーザーからの要望を取得"""
+        print(self.request_banner)
+
+        # デモモード用の環境変数チェック
+        demo_request = os.getenv("DEMO_REQUEST")
+        if demo_request:
+            print(f"\n[デモモード] ユーザー要望: {demo_request}")
+            return demo_request
+
+        user_input = input("\nあなたのご要望をお聞かせください: ")
+        return user_input
+
+    def format_tenant_data(self):
+        """テナントデータをエージェント用にフォーマット"""
+        if self.tenant_top_k:
+            # 天気と要望に合う上位K件だけをプロンプトに含める
+            return render_relevant_tenant_context(
+                self.weather_info["weather"], self.user_request, self.tenant_top_k
+            )
+        return render_tenant_context()
+
+    def start_discussion(self, on_token=None):
+        """マルチエージェント議論を開始"""
+
+        # 1. 天気情報取得
+        self.weather_info = self.get_weather_info()
+
+        # 2. ユーザー要望取得
+        self.user_request = self.get_user_request()
+
+        self.ensure_agents()
+        return self._run_discussion(on_token)
+
+    async def astart_discussion(self, on_token=None):
+        """マルチエージェント議論を非同期で開始（天気取得・要望入力・エージェント構築を並行実行）"""
+
+        # 1. 天気情報取得をバックグラウンドで開始
+        weather_task = asyncio.create_task(self.aget_weather_info())
+
+        # 2. 天気取得と並行して、ユーザー要望の取得とエージェント構築を行う
+        self.user_request, _ = await asyncio.gather(
+            asyncio.to_thread(self.get_user_request),
+            asyncio.to_thread(self.ensure_agents),
+        )
+
+        # 3. base_contextを組み立てる直前で天気情報を待つ
+        self.weather_info = await weather_task
+        return await asyncio.to_thread(self._run_discussion, on_token)
+
+    async def astream_discussion(self):
+        """議論を実行し、各エージェントの発言を (エージェント名, トークン) として生成順に返す"""
+        tokens = AsyncTokenStream()
+        task = asyncio.create_task(self.astart_discussion(on_token=tokens))
+        task.add_done_callback(lambda _: tokens.close())
+        async for item in tokens:
+            yield item
+        # 議論中の例外を呼び出し元に伝える
+        await task
+
+    def run_request(self, user_request, weather_info=None, on_token=None):
+        """要望を引数で受け取って議論を実行し、最終提案を返す（weather_info を省略すると天気情報を取得）"""
+        self.weather_info = weather_info if weather_info is not None else self.get_weather_info()
+        self.user_request = user_request
+        self.ensure_agents()
+        return self._run_discussion(on_token)
+
+    def discussion_agents(self) -> List:
+        """議論に参加するエージェント（最後が統合役。サブクラスで定義）"""
+        raise NotImplementedError
+
+    def discuss(self, agents: List, base_context: str, streamer: Optional[TokenStreamer]) -> List[Dict]:
+        """エージェントに議論させ、発言リストを返す（サブクラスで定義）"""
+        raise NotImplementedError
+
+    def print_stats(self):
+        """方式ごとの統計を会議の終了時に表示（必要なサブクラスで定義）"""
+
+    def _run_discussion(self, on_token=None):
+        """天気情報と要望を基にグループチャットを実行し、最終提案を返す（on_token には発言がトークン単位で渡される）"""
+
+        # 単純な要望や類似した要望の提案があれば、エージェント会議を省略
+        answer = self._reuse_answer(on_token)
+        if answer:
+            return answer
+
+        print("\n" + "=" * self.rule_width)
+        print(self.start_banner)
+        print("=" * self.rule_width)
+
+        # 3. 基本情報をまとめる
+        base_context = self._base_context()
+
+        # 4. 方式ごとに議論
+        agents = self.discussion_agents()
+
+        # 古い発言を要点に圧縮し、1回のLLM呼び出しのプロンプトを予算内に収める
+        if self.history_compactor is not None:
+            self.history_compactor.attach(agents)
+            self.history_compactor.reset_stats()
+
+        # 会議開始（on_token が指定されていれば、各エージェントの発言をトークン単位で通知）
+        # LLM呼び出しをエージェントごとに計測
+        recorder = DiscussionRecorder(self.mode)
+        with recorder.activate(), stream_tokens(on_token, agents, final_agent=self.final_agent.name) as streamer:
+            messages = self.discuss(agents, base_context, streamer)
+        if streamer is not None:
+            self.stream_metrics = streamer.get_metrics()
+        if self.history_compactor is not None:
+            self.compaction_stats = self.history_compactor.get_stats()
+        self.metrics = METRICS.record(recorder)
+
+        recommendation = extract_final_recommendation(messages, self.final_agent.name)
+        # 統合役が発言しなかった場合は専門家の発言を返すだけで、最終提案としてはキャッシュしない
+        if recommendation and REQUEST_CACHE is not None and agent_spoke(messages, self.final_agent.name):
+            REQUEST_CACHE.store(self.mode, self.user_request, self.weather_info, recommendation)
+
+        print("\n" + "=" * self.rule_width)
+        print(self.end_banner)
+        print("=" * self.rule_width)
+        if streamer is not None and self.stream_metrics["time_to_first_token"] is not None:
+            print(f"最初のトークンまで: {self.stream_metrics['time_to_first_token']:.2f}秒")
+        if self.round_stats:
+            print(f"ラウンド: {self.round_stats['rounds_used']}/{self.round_stats['rounds_allowed']}（終了理由: {self.round_stats['stop_reason']}）")
+        if self.compaction_stats and self.compaction_stats["calls"]:
+            print(
+                f"プロンプトトークン: {self.compaction_stats['prompt_tokens_before']} → "
+                f"{self.compaction_stats['prompt_tokens_after']}（{self.compaction_stats['calls']}回の呼び出し）"
+            )
+        self.print_stats()
+        print(recorder.format_breakdown())
+
+        return recommendation
+
+    def _reuse_answer(self, on_token=None) -> Optional[str]:
+        """ファストパスの即答か、同じ天気条件で類似した要望へのキャッシュ済みの提案（どちらもなければ None）"""
+        # 単純な要望はエージェント会議を省略して即答
+        if self.use_fast_path:
+            quick_answer = FAST_PATH.recommend(self.user_request, self.weather_info)
+            if quick_answer:
+                print("\n" + quick_answer)
+                if on_token:
+                    on_token(self.final_agent.name, quick_answer)
+                print(f"\n[ファストパス] エージェント会議を省略しました（ファストパス処理率: {FAST_PATH.served_ratio():.0%}）")
+                return quick_answer
+
+        # 同じ天気条件で類似した要望の提案があれば、エージェント会議を省略して再利用
+        if REQUEST_CACHE is not None:
+            cached = REQUEST_CACHE.lookup(self.mode, self.user_request, self.weather_info)
+            if cached:
+                print("\n[キャッシュ] 類似した要望への提案を再利用します\n")
+                print(cached)
+                if on_token:
+                    on_token(self.final_agent.name, cached)
+                return cached
+        return None
+
+    def _base_context(self) -> str:
+        return f"""
+{self.context_title}
+
+【現在の天気情報】
+- 天気: {self.weather_info['description']}
+- 気温: {self.weather_info['temperature']}°C
+- 湿度: {self.weather_info['humidity']}%
+
+【ユーザーからの要望】
+{self.user_request}
+
+【利用可能なテナント情報】
+{self.format_tenant_data()}
+
+{self.context_instructions}"""
+
+    def _run_groupchat(self, agents: List, base_context: str, llm_config: Dict, manager_message: str, **groupchat_options) -> List[Dict]:
+        """GroupChat で議論し、発言リストを返す（統合役の発言や繰り返しで早期終了し、ラウンド数を round_stats に記録）"""
+        import autogen
+
+        groupchat = autogen.GroupChat(agents=agents, messages=[], **groupchat_options)
+
+        # 統合役が提案を出し終えた時点や、同じ内容の繰り返しで議論を打ち切る
+        terminator = DiscussionTerminator(groupchat, final_agent=self.final_agent.name)
+        groupchat.speaker_selection_method = terminator.route(groupchat.speaker_selection_method)
+        track_speaker_selection(groupchat)
+
+        manager = autogen.GroupChatManager(
+            groupchat=groupchat,
+            llm_config=llm_config,
+            is_termination_msg=terminator,
+            system_message=manager_message,
+        )
+
+        self.user_proxy.initiate_chat(
+            manager,
+            message=base_context,
+            clear_history=True,
+            cache=LLM_CACHE  # 全エージェントで共有するレスポンスキャッシュ
+        )
+        self.round_stats = terminator.get_stats()
+        return groupchat.messages
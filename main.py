@@ -1,38 +1,39 @@
 """AutoGenを使った竹芝ポートシティマルチエージェントレコメンドシステム"""
 
-import os
-import autogen
-from dotenv import load_dotenv
-from data.takeshiba_tenants import TAKESHIBA_TENANTS
-from utils.weather_service import WeatherService
-
-# 環境変数を読み込み
-load_dotenv()
-
-# LLM設定
-config_list = [
-    {
-        "model": "gpt-4o",
-        "api_key": os.getenv("OPENAI_API_KEY"),
-    }
-]
+# .env の読み込み（utils の各設定より先に import する）
+from config import build_llm_config
+from discussion_system import DiscussionSystem
+from utils.termination import round_budget
+
+# LLM設定（autogen は議論を始める時点で読み込む）
+llm_config = build_llm_config(temperature=0.7)
+
+class TakeshibaMultiAgentSystem(DiscussionSystem):
+    mode = "multi_agent"
+    final_agent_attr = "recommend_agent"
+    request_banner = """
+=== 竹芝ポートシティ マルチエージェント レコメンドシステム ===
 
-llm_config = {
-    "config_list": config_list,
-    "temperature": 0.7,
-}
+こんにちは！今日はどのようなことをお手伝いできますか？
+例：
+- 「美味しいランチを食べたい」
+- 「雨の日でも楽しめる場所を探している」
+- 「ショッピングを楽しみたい」
+- 「映画やエンターテイメントに興味がある」
+- 「カフェでゆっくりしたい」
+"""
+    end_banner = "会議が終了しました。ありがとうございました！"
+    rule_width = 50
+    context_instructions = "上記の情報を基に、各専門分野の観点から提案をお願いします。\n"
 
-# 天気サービス初期化
-weather_service = WeatherService()
+    # 方式ごとの名前でも呼び出せるようにする
+    start_multi_agent_discussion = DiscussionSystem.start_discussion
+    astart_multi_agent_discussion = DiscussionSystem.astart_discussion
+    astream_multi_agent_discussion = DiscussionSystem.astream_discussion
 
-class TakeshibaMultiAgentSystem:
-    def __init__(self):
-        self.setup_agents()
-        self.weather_info = None
-        self.user_request = None
-    
     def setup_agents(self):
         """エージェントをセットアップ"""
+        import autogen
         
         # ユーザープロキシエージェント（司会者）
         self.user_proxy = autogen.UserProxyAgent(
@@ -130,116 +131,29 @@ class TakeshibaMultiAgentSystem:
 最終的に、具体的で実行しやすい推薦プランを日本語で親しみやすく提示してください。
 """)
 
-    def get_weather_info(self):
-        """現在の天気情報を取得"""
-        return weather_service.get_current_weather()
-
-    def get_user_request(self):
-        """ユーザーからの要望を取得"""
-        print("""
-=== 竹芝ポートシティ マルチエージェント レコメンドシステム ===
-
-こんにちは！今日はどのようなことをお手伝いできますか？
-例：
-- 「美味しいランチを食べたい」
-- 「雨の日でも楽しめる場所を探している」
-- 「ショッピングを楽しみたい」
-- 「映画やエンターテイメントに興味がある」
-- 「カフェでゆっくりしたい」
-""")
-        
-        # デモモード用の環境変数チェック
-        demo_request = os.getenv("DEMO_REQUEST")
-        if demo_request:
-            print(f"\n[デモモード] ユーザー要望: {demo_request}")
-            return demo_request
-        
-        user_input = input("\nあなたのご要望をお聞かせください: ")
-        return user_input
-
-    def format_tenant_data(self):
-        """テナントデータをエージェント用にフォーマット"""
-        formatted_data = "=== 竹芝ポートシティ テナント情報 ===\n\n"
-        
-        for category, tenants in TAKESHIBA_TENANTS.items():
-            formatted_data += f"【{category}】\n"
-            for tenant in tenants:
-                weather_pref = tenant.get("weather_preference", [])
-                weather_info = f" (適した天気: {', '.join(weather_pref)})" if weather_pref else ""
-                formatted_data += f"- {tenant['name']} ({tenant['floor']}){weather_info}\n"
-                formatted_data += f"  {tenant['description']}\n"
-            formatted_data += "\n"
-        
-        return formatted_data
-
-    def start_multi_agent_discussion(self):
-        """マルチエージェント議論を開始"""
-        
-        # 1. 天気情報取得
-        self.weather_info = self.get_weather_info()
-        
-        # 2. ユーザー要望取得
-        self.user_request = self.get_user_request()
-        
-        print("\n" + "="*50)
-        print("エージェント会議を開始します...")
-        print("="*50)
-        
-        # 3. 基本情報をまとめる
-        base_context = f"""
-【会議テーマ】竹芝ポートシティでのおすすめ提案
-
-【現在の天気情報】
-- 天気: {self.weather_info['description']}
-- 気温: {self.weather_info['temperature']}°C
-- 湿度: {self.weather_info['humidity']}%
-
-【ユーザーからの要望】
-{self.user_request}
-
-【利用可能なテナント情報】
-{self.format_tenant_data()}
-
-上記の情報を基に、各専門分野の観点から提案をお願いします。
-"""
-        
-        # 4. グループチャットでマルチエージェント議論
-        agents = [
+    def discussion_agents(self):
+        return [
             self.weather_agent,
             self.tenant_agent, 
             self.shopping_agent,
             self.entertainment_agent,
             self.recommend_agent
         ]
-        
+
+    def discuss(self, agents, base_context, streamer):
         # グループチャット設定
-        groupchat = autogen.GroupChat(
-            agents=agents,
-            messages=[],
-            max_round=10,
-            speaker_selection_method="round_robin"
-        )
-        
-        manager = autogen.GroupChatManager(
-            groupchat=groupchat,
-            llm_config=llm_config,
-            system_message="""
+        return self._run_groupchat(
+            agents,
+            base_context,
+            llm_config,
+            max_round=round_budget(self.user_request, min_rounds=len(agents) + 1, max_rounds=10),  # 要望の複雑さに応じて調整
+            speaker_selection_method="round_robin",
+            manager_message="""
 あなたは竹芝ポートシティレコメンド会議の進行管理者です。
 各エージェントが順番に発言し、最終的に総合レコメンドエージェントがまとめを行うよう進行してください。
 会議は効率的に進め、ユーザーにとって価値ある提案となるよう調整してください。
-"""
+""",
         )
-        
-        # 会議開始
-        self.user_proxy.initiate_chat(
-            manager,
-            message=base_context,
-            clear_history=True
-        )
-        
-        print("\n" + "="*50)
-        print("会議が終了しました。ありがとうございました！")
-        print("="*50)
 
 def main():
     """メイン関数"""
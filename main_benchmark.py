@@ -0,0 +1,428 @@
+"""3つのGroupChat方式のベンチマーク - 所要時間とトークン数の比較
+
+固定の要望 × 天気シナリオを Round Robin / Selector / Swarm の各方式で実行し、
+方式ごとに所要時間の p50/p95、LLM呼び出し回数、入力/出力トークン数、スピーカー選択のオーバーヘッドを
+JSONで出力する。既定ではプロセス内のモックLLM（utils.mock_llm）を使うため、APIキーやネットワークは不要。
+
+    python main_benchmark.py --iterations 3 --output bench.json
+    python main_benchmark.py --baseline bench.json --max-regression 0.1
+    python main_benchmark.py --startup --output startup.json   # 比較CLIのメニュー表示までの時間
+    python main_benchmark.py --load-url http://127.0.0.1:8080 --concurrency 8 --total 64   # 常駐サーバーへの負荷試験
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# .env の読み込み（utils の各設定より先に import する）
+import config
+from utils.instrumentation import percentile
+
+# 固定の要望（意図の数・長さが異なるもの）
+BENCHMARK_REQUESTS = [
+    "美味しいランチを食べたい",
+    "ショッピングを楽しみたい",
+    "雨でも楽しめる映画やゲームで遊びたい",
+    "ゆっくりカフェで休憩してから、洋服や雑貨を見て回り、夜は海の見えるレストランで食事したい",
+]
+
+# 天気シナリオ（WeatherService.get_current_weather と同じ形式）
+WEATHER_SCENARIOS = {
+    "sunny": {"weather": "sunny", "temperature": 24.0, "description": "晴天", "humidity": 45},
+    "rainy": {"weather": "rainy", "temperature": 17.0, "description": "雨", "humidity": 90},
+    "cold": {"weather": "cold", "temperature": 2.0, "description": "雪", "humidity": 70},
+}
+
+# 方式名 -> (モジュール, クラス)
+SYSTEMS = {
+    "round_robin": ("main_round_robin", "TakeshibaRoundRobinSystem"),
+    "selector": ("main_selector", "TakeshibaSelectorSystem"),
+    "swarm": ("main_swarm", "TakeshibaSwarmSystem"),
+}
+
+# 起動時間の計測で実行するコード（比較CLIのメニュー表示まで）
+STARTUP_SNIPPET = "import main_comparison; main_comparison.GroupChatComparison()"
+
+# 起動時に読み込まれていないことを確認する重いモジュール
+HEAVY_MODULES = ["autogen", "openai", "requests"]
+
+# ベースラインとの比較で、増えると悪化とみなす指標
+REGRESSION_METRICS = ["p50_seconds", "p95_seconds", "mean_llm_calls", "mean_prompt_tokens", "mean_completion_tokens"]
+
+class GroupChatBenchmark:
+    def __init__(self, modes: List[str], iterations: int = 1, verbose: bool = False):
+        self.modes = modes
+        self.iterations = iterations
+        self.verbose = verbose
+
+    def run(self) -> Dict:
+        """全方式を実行し、方式ごとの集計を返す"""
+        results = {
+            "config": {
+                "iterations": self.iterations,
+                "requests": BENCHMARK_REQUESTS,
+                "weather": list(WEATHER_SCENARIOS),
+                "mock_llm": os.getenv("MOCK_LLM") == "1",
+                "mock_latency": float(os.getenv("MOCK_LLM_LATENCY", "0.2")),
+                "mock_tokens_per_second": float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "200")),
+            },
+            "modes": {},
+        }
+        for mode in self.modes:
+            print(f"[{mode}] 実行中...", file=sys.stderr)
+            results["modes"][mode] = self.run_mode(mode)
+        return results
+
+    def run_mode(self, mode: str) -> Dict:
+        """1つの方式を 要望 × 天気 × 繰り返し回数 だけ実行して集計"""
+        module_name, class_name = SYSTEMS[mode]
+        started = time.perf_counter()
+        system_class = getattr(__import__(module_name), class_name)
+        import_seconds = time.perf_counter() - started
+
+        # コールドスタート: システムの構築とエージェントの初回構築
+        started = time.perf_counter()
+        system = system_class(use_fast_path=False)
+        cold_start_seconds = time.perf_counter() - started
+
+        runs = []
+        for _ in range(self.iterations):
+            for weather_name, weather in WEATHER_SCENARIOS.items():
+                for request in BENCHMARK_REQUESTS:
+                    runs.append(self._run_once(system, request, weather_name, weather))
+
+        # ウォームスタート: 返却したエージェントをプールから借りる新しいインスタンス
+        system.release_agents()
+        started = time.perf_counter()
+        system_class(use_fast_path=False).release_agents()
+        warm_start_seconds = time.perf_counter() - started
+
+        summary = self._summarize(runs)
+        summary["startup"] = {
+            "import_seconds": round(import_seconds, 4),
+            "cold_start_seconds": round(cold_start_seconds, 4),
+            "warm_start_seconds": round(warm_start_seconds, 4),
+            "mean_setup_seconds": round(statistics.mean(run["setup_seconds"] for run in runs), 6),
+        }
+        return summary
+
+    def _run_once(self, system, request: str, weather_name: str, weather: Dict) -> Dict:
+        system.metrics = None
+        output = io.StringIO()
+        started = time.perf_counter()
+        # 議論の表示は捨てる（--verbose で表示）
+        with contextlib.redirect_stdout(sys.stdout if self.verbose else output):
+            system.run_request(request, dict(weather))
+        wall = time.perf_counter() - started
+
+        summary = system.metrics or {}
+        selection = summary.get("speaker_selection", {})
+        return {
+            "request": request,
+            "weather": weather_name,
+            "seconds": wall,
+            "llm_calls": summary.get("llm_calls", 0),
+            "prompt_tokens": summary.get("prompt_tokens", 0),
+            "completion_tokens": summary.get("completion_tokens", 0),
+            "selection_count": selection.get("count", 0),
+            "selection_seconds": selection.get("seconds", 0.0),
+            "selection_llm_calls": selection.get("llm_calls", 0),
+            "setup_seconds": system.setup_stats["setup_seconds"],
+        }
+
+    def _summarize(self, runs: List[Dict]) -> Dict:
+        seconds = [run["seconds"] for run in runs]
+        total_seconds = sum(seconds)
+        selection_seconds = sum(run["selection_seconds"] for run in runs)
+
+        def mean(key):
+            return round(statistics.mean(run[key] for run in runs), 2)
+
+        return {
+            "runs": len(runs),
+            "p50_seconds": round(percentile(seconds, 50), 4),
+            "p95_seconds": round(percentile(seconds, 95), 4),
+            "mean_llm_calls": mean("llm_calls"),
+            "mean_prompt_tokens": mean("prompt_tokens"),
+            "mean_completion_tokens": mean("completion_tokens"),
+            "total_prompt_tokens": sum(run["prompt_tokens"] for run in runs),
+            "total_completion_tokens": sum(run["completion_tokens"] for run in runs),
+            "speaker_selection": {
+                "mean_count": mean("selection_count"),
+                "mean_llm_calls": mean("selection_llm_calls"),
+                "mean_seconds": round(selection_seconds / len(runs), 4),
+                "share_of_wall_time": round(selection_seconds / total_seconds, 4) if total_seconds else 0.0,
+            },
+            "per_run": runs,
+        }
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """python -X importtime の出力を (モジュール, 自身の時間, 累積時間, 階層) の一覧に変換"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name[1:]
+        entries.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return entries
+
+def measure_startup(runs: int = 5, top: int = 10) -> Dict:
+    """比較CLIのメニュー表示までの時間を別プロセスで計測（python -X importtime）"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    walls = []
+    imports: List[Dict] = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SNIPPET],
+            cwd=cwd, capture_output=True, text=True, check=True,
+        )
+        walls.append(time.perf_counter() - started)
+        imports = parse_importtime(process.stderr)
+
+    loaded = {entry["module"] for entry in imports}
+    # 起動時に直接読み込まれたモジュール（階層0）と、その直下（階層1）
+    top_level = sorted((entry for entry in imports if entry["depth"] <= 1), key=lambda entry: -entry["cumulative_ms"])
+    return {
+        "runs": runs,
+        "p50_seconds": round(percentile(walls, 50), 4),
+        "min_seconds": round(min(walls), 4),
+        "import_ms": round(sum(entry["self_ms"] for entry in imports), 1),
+        "heavy_modules_loaded": {module: module in loaded for module in HEAVY_MODULES},
+        "top_imports": [
+            {"module": entry["module"], "cumulative_ms": entry["cumulative_ms"]} for entry in top_level[:top]
+        ],
+    }
+
+def _post_json(url: str, payload: Dict, timeout: float):
+    """JSONをPOSTし (ステータス, 応答) を返す（HTTPエラーも応答として扱う）"""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+def run_load_test(base_url: str, modes: List[str], concurrency: int = 8, total: int = 64, timeout: float = 300.0) -> Dict:
+    """常駐サーバー（main_server.py）に要望 × 天気 × 方式の組み合わせを同時に送り、レイテンシと処理量を計測"""
+    base_url = base_url.rstrip("/")
+    cases = [
+        (mode, request, weather)
+        for request in BENCHMARK_REQUESTS
+        for weather in WEATHER_SCENARIOS.values()
+        for mode in modes
+    ]
+
+    def send(index: int):
+        mode, request, weather = cases[index % len(cases)]
+        started = time.perf_counter()
+        try:
+            status, body = _post_json(f"{base_url}/recommend/{mode}", {"request": request, "weather": weather}, timeout)
+        except OSError as e:
+            status, body = 0, {"error": str(e)}
+        return mode, status, time.perf_counter() - started, body
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        responses = list(executor.map(send, range(total)))
+    wall_seconds = time.perf_counter() - started
+
+    statuses = Counter(str(status) for _, status, _, _ in responses)
+    ok = [seconds for _, status, seconds, _ in responses if status == 200]
+    modes_summary = {}
+    for mode in modes:
+        seconds = [elapsed for name, status, elapsed, _ in responses if name == mode and status == 200]
+        modes_summary[mode] = {
+            "ok": len(seconds),
+            "p50_seconds": round(percentile(seconds, 50), 3) if seconds else None,
+            "p95_seconds": round(percentile(seconds, 95), 3) if seconds else None,
+        }
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=timeout) as response:
+        server_stats = json.loads(response.read())
+    return {
+        "url": base_url,
+        "concurrency": concurrency,
+        "total": total,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(len(ok) / wall_seconds, 3) if wall_seconds else 0.0,
+        "statuses": dict(statuses),
+        "p50_seconds": round(percentile(ok, 50), 3) if ok else None,
+        "p95_seconds": round(percentile(ok, 95), 3) if ok else None,
+        "p99_seconds": round(percentile(ok, 99), 3) if ok else None,
+        "modes": modes_summary,
+        "server": server_stats,
+    }
+
+def compare_to_baseline(results: Dict, baseline: Dict) -> Dict:
+    """方式・指標ごとのベースラインからの変化率（正の値は悪化）"""
+    comparison = {}
+    for mode, current in results["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if not previous:
+            continue
+        comparison[mode] = {}
+        for metric in REGRESSION_METRICS:
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            comparison[mode][metric] = {"baseline": before, "current": after, "change": round(change, 4)}
+    if results.get("startup") and baseline.get("startup"):
+        before, after = baseline["startup"]["p50_seconds"], results["startup"]["p50_seconds"]
+        comparison["startup"] = {
+            "p50_seconds": {"baseline": before, "current": after, "change": round((after - before) / before, 4)},
+        }
+    return comparison
+
+def print_report(results: Dict, comparison: Optional[Dict] = None):
+    """方式ごとの結果の表"""
+    if results.get("startup"):
+        print_startup_report(results["startup"])
+    if results.get("load_test"):
+        print_load_report(results["load_test"])
+    if not results["modes"]:
+        print_comparison(comparison)
+        return
+
+    print("\n" + "=" * 100)
+    print(f"{'方式':<12}{'p50(秒)':>10}{'p95(秒)':>10}{'LLM呼出':>10}{'入力トークン':>14}{'出力トークン':>14}{'選択回数':>10}{'選択LLM':>10}{'選択時間比':>12}")
+    print("-" * 100)
+    for mode, summary in results["modes"].items():
+        selection = summary["speaker_selection"]
+        print(
+            f"{mode:<12}{summary['p50_seconds']:>10.3f}{summary['p95_seconds']:>10.3f}{summary['mean_llm_calls']:>10.1f}"
+            f"{summary['mean_prompt_tokens']:>14.0f}{summary['mean_completion_tokens']:>14.0f}"
+            f"{selection['mean_count']:>10.1f}{selection['mean_llm_calls']:>10.1f}{selection['share_of_wall_time']:>12.1%}"
+        )
+    print("=" * 100)
+    for mode, summary in results["modes"].items():
+        startup = summary["startup"]
+        print(
+            f"{mode}: 起動 {startup['import_seconds']:.2f}秒（import） + {startup['cold_start_seconds']:.3f}秒（エージェント構築） / "
+            f"プールから再利用 {startup['warm_start_seconds']:.4f}秒 / 議論ごとの準備 {startup['mean_setup_seconds'] * 1000:.2f}ミリ秒"
+        )
+
+    print_comparison(comparison)
+
+def print_startup_report(startup: Dict):
+    """比較CLIの起動時間と、時間のかかったimport"""
+    print("\n" + "=" * 60)
+    print(f"比較CLIのメニュー表示まで: p50 {startup['p50_seconds']:.3f}秒 / 最短 {startup['min_seconds']:.3f}秒（{startup['runs']}回）")
+    loaded = [module for module, flag in startup["heavy_modules_loaded"].items() if flag]
+    print(f"起動時に読み込まれた重いモジュール: {', '.join(loaded) or 'なし'}")
+    print("-" * 60)
+    for entry in startup["top_imports"]:
+        print(f"{entry['module']:<40}{entry['cumulative_ms']:>12.1f} ms")
+    print("=" * 60)
+
+def print_load_report(load: Dict):
+    """負荷試験の結果"""
+    def seconds(value):
+        return f"{value:.3f}秒" if value is not None else "-"
+
+    print("\n" + "=" * 60)
+    print(f"負荷試験: {load['url']}（同時 {load['concurrency']} / 計 {load['total']} 件）")
+    print(f"所要 {load['wall_seconds']:.2f}秒 / 処理量 {load['throughput_per_second']:.2f}件/秒 / ステータス {load['statuses']}")
+    print(f"レイテンシ: p50 {seconds(load['p50_seconds'])} / p95 {seconds(load['p95_seconds'])} / p99 {seconds(load['p99_seconds'])}")
+    print("-" * 60)
+    for mode, summary in load["modes"].items():
+        print(f"{mode:<12}成功 {summary['ok']:>4}件  p50 {seconds(summary['p50_seconds'])}  p95 {seconds(summary['p95_seconds'])}")
+    pool = load["server"]["agent_pool"]
+    print(f"サーバー: エージェント構築 {pool['builds']}回 / 再利用率 {pool['reuse_rate']:.0%}")
+    print("=" * 60)
+
+def print_comparison(comparison: Optional[Dict]):
+    if comparison:
+        print("\nベースラインとの比較（+は悪化）:")
+        for mode, metrics in comparison.items():
+            changes = " / ".join(f"{metric} {entry['change']:+.1%}" for metric, entry in metrics.items())
+            print(f"  {mode}: {changes}")
+
+def find_regressions(comparison: Dict, max_regression: float) -> List[str]:
+    """許容値を超えて悪化した「方式.指標」の一覧"""
+    return [
+        f"{mode}.{metric}"
+        for mode, metrics in comparison.items()
+        for metric, entry in metrics.items()
+        if entry["change"] > max_regression
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="3つのGroupChat方式のベンチマーク")
+    parser.add_argument("--modes", default=",".join(SYSTEMS), help="実行する方式（カンマ区切り）")
+    parser.add_argument("--iterations", type=int, default=1, help="要望 × 天気の組み合わせを繰り返す回数")
+    parser.add_argument("--output", help="結果のJSONを書き出すファイル（未指定時は標準出力）")
+    parser.add_argument("--baseline", help="比較するベースラインのJSONファイル")
+    parser.add_argument("--max-regression", type=float, default=None, help="ベースラインからの悪化がこの割合を超えたら終了コード1")
+    parser.add_argument("--live", action="store_true", help="モックLLMではなく実際のLLM（OPENAI_API_KEY）を使う")
+    parser.add_argument("--verbose", action="store_true", help="議論の内容を表示")
+    parser.add_argument("--startup", action="store_true", help="議論は実行せず、比較CLIの起動時間だけを計測")
+    parser.add_argument("--startup-runs", type=int, default=5, help="起動時間を計測する回数")
+    parser.add_argument("--load-url", help="議論は実行せず、このURLの常駐サーバー（main_server.py）に負荷をかける")
+    parser.add_argument("--concurrency", type=int, default=8, help="負荷試験で同時に送る要求の数")
+    parser.add_argument("--total", type=int, default=64, help="負荷試験で送る要求の総数")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in SYSTEMS]
+    if unknown:
+        parser.error(f"未知の方式: {', '.join(unknown)}")
+
+    # 各方式のモジュールを読み込む前に設定する（キャッシュ・ファストパスは計測を歪めるため既定で無効）
+    if not args.live:
+        os.environ["MOCK_LLM"] = "1"
+    os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+    os.environ.setdefault("REQUEST_CACHE_ENABLED", "0")
+    os.environ.setdefault("LLM_DETERMINISTIC", "1")
+
+    if args.load_url:
+        load = run_load_test(args.load_url, modes, concurrency=args.concurrency, total=args.total)
+        results = {"config": {"url": args.load_url}, "modes": {}, "load_test": load}
+    elif args.startup:
+        results = {"config": {"snippet": STARTUP_SNIPPET}, "modes": {}, "startup": measure_startup(args.startup_runs)}
+    else:
+        results = GroupChatBenchmark(modes, iterations=args.iterations, verbose=args.verbose).run()
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparison = compare_to_baseline(results, json.load(f))
+        results["baseline_comparison"] = comparison
+
+    print_report(results, comparison)
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+        print(f"\n結果を {args.output} に書き出しました。")
+    else:
+        print(payload)
+
+    if comparison and args.max_regression is not None:
+        regressions = find_regressions(comparison, args.max_regression)
+        if regressions:
+            print(f"\nベースラインから {args.max_regression:.0%} を超えて悪化: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
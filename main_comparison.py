@@ -1,24 +1,63 @@
 """3つのGroupChat方式比較システム - 竹芝ポートシティレコメンドシステム"""
 
-import os
+import contextvars
+import importlib
+import io
 import sys
-from dotenv import load_dotenv
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 
-# 各方式のインポート
-from main_round_robin import TakeshibaRoundRobinSystem
-from main_selector import TakeshibaSelectorSystem  
-from main_swarm import TakeshibaSwarmSystem
+# .env の読み込み（各方式のモジュールは選ばれた時点で読み込む）
+from config import get_weather_service
+from utils.output_capture import separate_outputs, set_context_output
 
-# 環境変数を読み込み
-load_dotenv()
+# エラー時に表示する議論の出力の行数（末尾から）
+ERROR_TRANSCRIPT_LINES = 20
+
+# 方式名と表示名
+MODE_LABELS = {
+    "round_robin": "Round Robin",
+    "selector": "Selector",
+    "swarm": "Swarm",
+}
+
+class LazySystems(Mapping):
+    """方式名 -> システムの対応表。モジュールの読み込みとシステム・エージェントの構築は最初に使われた時点で行う"""
+
+    def __init__(self, factories):
+        # 方式名 -> (モジュール名, クラス名)
+        self._factories = factories
+        self._instances = {}
+        self._lock = threading.Lock()
+        # 方式ごとのシステム構築にかかった時間（秒）
+        self.construct_seconds = {}
+
+    def __getitem__(self, mode):
+        with self._lock:
+            if mode not in self._instances:
+                started = time.perf_counter()
+                module_name, class_name = self._factories[mode]
+                system_class = getattr(importlib.import_module(module_name), class_name)
+                self._instances[mode] = system_class(defer_setup=True)
+                self.construct_seconds[mode] = time.perf_counter() - started
+            return self._instances[mode]
+
+    def __iter__(self):
+        return iter(self._factories)
+
+    def __len__(self):
+        return len(self._factories)
 
 class GroupChatComparison:
     def __init__(self):
-        self.systems = {
-            "round_robin": TakeshibaRoundRobinSystem(),
-            "selector": TakeshibaSelectorSystem(),
-            "swarm": TakeshibaSwarmSystem()
-        }
+        self.systems = LazySystems({
+            "round_robin": ("main_round_robin", "TakeshibaRoundRobinSystem"),
+            "selector": ("main_selector", "TakeshibaSelectorSystem"),
+            "swarm": ("main_swarm", "TakeshibaSwarmSystem")
+        })
     
     def show_comparison_menu(self):
         """比較メニューを表示"""
@@ -56,7 +95,8 @@ class GroupChatComparison:
 2. Selector方式を試す  
 3. Swarm方式を試す
 4. 全方式を連続実行（同じ要望で比較）
-5. 終了
+5. 全方式を同時実行（同じ要望で並行比較）
+6. 終了
 
 番号を入力: """)
                 
@@ -82,11 +122,14 @@ class GroupChatComparison:
                     self.run_all_methods_comparison()
                     
                 elif choice == "5":
+                    self.run_concurrent_comparison()
+                    
+                elif choice == "6":
                     print("\nシステムを終了します。お疲れ様でした！")
                     break
                     
                 else:
-                    print("\n無効な選択です。1-5の番号を入力してください。")
+                    print("\n無効な選択です。1-6の番号を入力してください。")
                     
             except KeyboardInterrupt:
                 print("\n\nシステムを終了します。")
@@ -105,9 +148,6 @@ class GroupChatComparison:
         # 共通の要望を取得
         user_request = input("比較用のユーザー要望を入力してください: ")
         
-        # 環境変数に設定（各システムがこれを使用）
-        os.environ["DEMO_REQUEST"] = user_request
-        
         print(f"\n要望「{user_request}」で3つの方式を連続実行します...\n")
         
         # 1. Round Robin方式
@@ -115,7 +155,7 @@ class GroupChatComparison:
         print("【1/3】Round Robin方式での実行")
         print("="*80)
         try:
-            self.systems["round_robin"].start_round_robin_discussion()
+            self.systems["round_robin"].run_request(user_request)
         except Exception as e:
             print(f"Round Robin方式でエラー: {e}")
         
@@ -126,7 +166,7 @@ class GroupChatComparison:
         print("【2/3】Selector方式での実行")
         print("="*80)
         try:
-            self.systems["selector"].start_selector_discussion()
+            self.systems["selector"].run_request(user_request)
         except Exception as e:
             print(f"Selector方式でエラー: {e}")
         
@@ -137,7 +177,7 @@ class GroupChatComparison:
         print("【3/3】Swarm方式での実行")
         print("="*80)
         try:
-            self.systems["swarm"].start_swarm_discussion()
+            self.systems["swarm"].run_request(user_request)
         except Exception as e:
             print(f"Swarm方式でエラー: {e}")
         
@@ -153,9 +193,81 @@ class GroupChatComparison:
 どの方式が最も良い提案を生成したかご確認ください。
 """)
         
-        # 環境変数をクリア
-        if "DEMO_REQUEST" in os.environ:
-            del os.environ["DEMO_REQUEST"]
+    def run_concurrent_comparison(self, user_request: Optional[str] = None) -> Dict[str, Dict]:
+        """全方式で同じ要望を同時に処理し、最終提案と所要時間を並べて表示"""
+        print("""
+=== 全方式並行比較モード ===
+同じユーザー要望を3つの方式で同時に処理し、結果を並べて比較します。
+""")
+        
+        if user_request is None:
+            user_request = input("比較用のユーザー要望を入力してください: ")
+        
+        # 天気情報は1回だけ取得し、全方式に同じものを渡す
+        weather_info = get_weather_service().get_current_weather()
+        
+        print(f"\n要望「{user_request}」で3つの方式を同時に実行します...\n")
+        started = time.perf_counter()
+        with separate_outputs(), ThreadPoolExecutor(max_workers=len(self.systems)) as executor:
+            futures = {
+                mode: executor.submit(
+                    contextvars.copy_context().run, self._run_isolated, mode, user_request, weather_info
+                )
+                for mode in self.systems
+            }
+            results = {mode: future.result() for mode, future in futures.items()}
+        total_seconds = time.perf_counter() - started
+        
+        self.print_side_by_side(user_request, results, total_seconds)
+        return results
+    
+    def _run_isolated(self, mode: str, user_request: str, weather_info: Dict) -> Dict:
+        """1つの方式を実行し、議論の出力を他の方式と分けて記録する"""
+        system = self.systems[mode]
+        system.metrics = None
+        output = io.StringIO()
+        set_context_output(output)
+        started = time.perf_counter()
+        try:
+            recommendation, error = system.run_request(user_request, weather_info), None
+        except Exception as e:
+            recommendation, error = None, str(e)
+        return {
+            "recommendation": recommendation,
+            "error": error,
+            "seconds": time.perf_counter() - started,
+            "setup_seconds": (system.setup_stats or {}).get("setup_seconds"),
+            "metrics": system.metrics,
+            "transcript": output.getvalue(),
+        }
+    
+    def print_side_by_side(self, user_request: str, results: Dict[str, Dict], total_seconds: float):
+        """方式ごとの所要時間・LLM呼び出し・トークン数と最終提案を並べて表示"""
+        print("\n" + "="*80)
+        print(f"並行比較の結果 - 要望「{user_request}」")
+        print("="*80)
+        for mode, result in results.items():
+            metrics = result["metrics"] or {}
+            status = f"エラー: {result['error']}" if result["error"] else "完了"
+            print(
+                f"{MODE_LABELS[mode]:<12} {result['seconds']:6.1f}秒（うち準備 {result['setup_seconds'] or 0:.2f}秒） / LLM呼び出し {metrics.get('llm_calls', 0)}回 / "
+                f"入力 {metrics.get('prompt_tokens', 0)} + 出力 {metrics.get('completion_tokens', 0)} トークン / {status}"
+            )
+        slowest = max(result["seconds"] for result in results.values())
+        sequential = sum(result["seconds"] for result in results.values())
+        print(f"\n合計 {total_seconds:.1f}秒（最も遅い方式 {slowest:.1f}秒 / 順番に実行した場合の目安 {sequential:.1f}秒）")
+        
+        for mode, result in results.items():
+            print("\n" + "-"*80)
+            print(f"【{MODE_LABELS[mode]}方式の最終提案】")
+            print("-"*80)
+            print(result["recommendation"] or f"（提案なし: {result['error']}）")
+            if result["error"] and result["transcript"]:
+                # 失敗した方式は、議論がどこまで進んだかを出力の末尾で確認できるようにする
+                tail = result["transcript"].rstrip().splitlines()[-ERROR_TRANSCRIPT_LINES:]
+                print(f"\n（議論の出力の末尾{len(tail)}行）")
+                print("\n".join(tail))
+        print("="*80)
 
 def main():
     """メイン関数"""
@@ -163,7 +275,11 @@ def main():
     
     try:
         comparison_system = GroupChatComparison()
-        comparison_system.run_comparison()
+        # 要望を引数で渡すと、メニューを出さずに全方式を並行比較
+        if len(sys.argv) > 1:
+            comparison_system.run_concurrent_comparison(" ".join(sys.argv[1:]))
+        else:
+            comparison_system.run_comparison()
         
     except KeyboardInterrupt:
         print("\n\nシステムを終了します。")
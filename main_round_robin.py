@@ -1,38 +1,55 @@
 """Round Robin方式 - 竹芝ポートシティマルチエージェントレコメンドシステム"""
 
 import os
-import autogen
-from dotenv import load_dotenv
-from data.takeshiba_tenants import TAKESHIBA_TENANTS
-from utils.weather_service import WeatherService
+from typing import Optional
 
-# 環境変数を読み込み
-load_dotenv()
+# .env の読み込み（utils の各設定より先に import する）
+from config import build_llm_config
+from discussion_system import DiscussionSystem
+from utils.speaker_selection import gate_specialists
 
-# LLM設定
-config_list = [
-    {
-        "model": "gpt-4o",
-        "api_key": os.getenv("OPENAI_API_KEY"),
-    }
-]
+# LLM設定（autogen は議論を始める時点で読み込む）
+llm_config = build_llm_config(temperature=0.7)
 
-llm_config = {
-    "config_list": config_list,
-    "temperature": 0.7,
-}
+class TakeshibaRoundRobinSystem(DiscussionSystem):
+    mode = "round_robin"
+    final_agent_attr = "coordinator_agent"
+    request_banner = """
+=== Round Robin方式 - 竹芝ポートシティ レコメンドシステム ===
 
-# 天気サービス初期化
-weather_service = WeatherService()
+順番に各専門家が発言し、段階的に提案を構築します。
+発言順序: 天気分析 → 施設情報 → ショッピング → エンタメ → 総合コーディネート
+
+今日はどのようなことをお手伝いできますか？
+"""
+    start_banner = "Round Robin方式エージェント会議を開始します...\n発言順序: 天気→施設→ショッピング→エンタメ→総合"
+    end_banner = "Round Robin会議が終了しました。"
+    context_title = "【Round Robin会議】竹芝ポートシティでのおすすめ提案"
+    context_instructions = """===== Round Robin議論開始 =====
+各エージェントは順番に発言してください。前のエージェントの発言を受けて、
+段階的に提案を発展させてください。
+"""
+
+    # 方式ごとの名前でも呼び出せるようにする
+    start_round_robin_discussion = DiscussionSystem.start_discussion
+    astart_round_robin_discussion = DiscussionSystem.astart_discussion
+    astream_round_robin_discussion = DiscussionSystem.astream_discussion
+
+    def __init__(
+        self,
+        defer_setup: bool = False,
+        tenant_top_k: Optional[int] = None,
+        use_fast_path: Optional[bool] = None,
+        relevance_gating: Optional[bool] = None,
+    ):
+        self.gating_stats = None
+        # 要望に関係しない専門エージェントの発言を省略するか（天気分析と総合コーディネーターは常に発言）
+        self.relevance_gating = relevance_gating if relevance_gating is not None else os.getenv("ROUND_ROBIN_GATING", "1") == "1"
+        super().__init__(defer_setup, tenant_top_k, use_fast_path)
 
-class TakeshibaRoundRobinSystem:
-    def __init__(self):
-        self.setup_agents()
-        self.weather_info = None
-        self.user_request = None
-    
     def setup_agents(self):
         """Round Robin方式用エージェントをセットアップ"""
+        import autogen
         
         # ユーザープロキシエージェント（司会者）
         self.user_proxy = autogen.UserProxyAgent(
@@ -130,116 +147,44 @@ class TakeshibaRoundRobinSystem:
 必ず発言の最後に「TERMINATE」を付けて会議を終了してください。
 """)
 
-    def get_weather_info(self):
-        """現在の天気情報を取得"""
-        return weather_service.get_current_weather()
-
-    def get_user_request(self):
-        """ユーザーからの要望を取得"""
-        print("""
-=== Round Robin方式 - 竹芝ポートシティ レコメンドシステム ===
-
-順番に各専門家が発言し、段階的に提案を構築します。
-発言順序: 天気分析 → 施設情報 → ショッピング → エンタメ → 総合コーディネート
-
-今日はどのようなことをお手伝いできますか？
-""")
-        
-        # デモモード用の環境変数チェック
-        demo_request = os.getenv("DEMO_REQUEST")
-        if demo_request:
-            print(f"\n[デモモード] ユーザー要望: {demo_request}")
-            return demo_request
-        
-        user_input = input("\nあなたのご要望をお聞かせください: ")
-        return user_input
-
-    def format_tenant_data(self):
-        """テナントデータをエージェント用にフォーマット"""
-        formatted_data = "=== 竹芝ポートシティ テナント情報 ===\n\n"
-        
-        for category, tenants in TAKESHIBA_TENANTS.items():
-            formatted_data += f"【{category}】\n"
-            for tenant in tenants:
-                weather_pref = tenant.get("weather_preference", [])
-                weather_info = f" (適した天気: {', '.join(weather_pref)})" if weather_pref else ""
-                formatted_data += f"- {tenant['name']} ({tenant['floor']}){weather_info}\n"
-                formatted_data += f"  {tenant['description']}\n"
-            formatted_data += "\n"
-        
-        return formatted_data
-
-    def start_round_robin_discussion(self):
-        """Round Robin方式でマルチエージェント議論を開始"""
-        
-        # 1. 天気情報取得
-        self.weather_info = self.get_weather_info()
-        
-        # 2. ユーザー要望取得
-        self.user_request = self.get_user_request()
-        
-        print("\n" + "="*60)
-        print("Round Robin方式エージェント会議を開始します...")
-        print("発言順序: 天気→施設→ショッピング→エンタメ→総合")
-        print("="*60)
-        
-        # 3. 基本情報をまとめる
-        base_context = f"""
-【Round Robin会議】竹芝ポートシティでのおすすめ提案
-
-【現在の天気情報】
-- 天気: {self.weather_info['description']}
-- 気温: {self.weather_info['temperature']}°C
-- 湿度: {self.weather_info['humidity']}%
-
-【ユーザーからの要望】
-{self.user_request}
-
-【利用可能なテナント情報】
-{self.format_tenant_data()}
-
-===== Round Robin議論開始 =====
-各エージェントは順番に発言してください。前のエージェントの発言を受けて、
-段階的に提案を発展させてください。
-"""
-        
-        # 4. Round Robin形式のグループチャット
-        agents = [
-            self.weather_agent,
-            self.facility_agent, 
-            self.shopping_agent,
-            self.entertainment_agent,
-            self.coordinator_agent
+    def discussion_agents(self):
+        # Round Robin形式のグループチャット（専門エージェントは担当する意図とともに順番に並べる）
+        specialists = [
+            (self.facility_agent, {"gourmet", "relaxation"}),
+            (self.shopping_agent, {"shopping"}),
+            (self.entertainment_agent, {"entertainment"}),
         ]
-        
+        if self.relevance_gating:
+            active, skipped = gate_specialists(self.user_request, specialists)
+        else:
+            active, skipped = [agent for agent, _ in specialists], []
+        self.gating_stats = {
+            "skipped_agents": [agent.name for agent in skipped],
+            "turns_avoided": len(skipped),
+        }
+        if skipped:
+            print(f"[関連度判定] 要望に関係しないため省略: {', '.join(agent.name for agent in skipped)}")
+        
+        return [self.weather_agent, *active, self.coordinator_agent]
+
+    def discuss(self, agents, base_context, streamer):
         # Round Robin設定
-        groupchat = autogen.GroupChat(
-            agents=agents,
-            messages=[],
-            max_round=6,  # 各エージェント1回ずつ + 余裕
-            speaker_selection_method="round_robin"  # 明示的にRound Robin指定
-        )
-        
-        manager = autogen.GroupChatManager(
-            groupchat=groupchat,
-            llm_config=llm_config,
-            system_message="""
+        return self._run_groupchat(
+            agents,
+            base_context,
+            llm_config,
+            max_round=len(agents) + 1,  # 各エージェント1回ずつ + 最初の依頼
+            speaker_selection_method="round_robin",  # 明示的にRound Robin指定
+            manager_message="""
 あなたはRound Robin形式の会議進行管理者です。
 エージェントが順番に発言し、段階的に提案を構築するよう進行してください。
 各エージェントは前の発言を踏まえて、自分の専門分野から貢献してください。
-"""
-        )
-        
-        # 会議開始
-        self.user_proxy.initiate_chat(
-            manager,
-            message=base_context,
-            clear_history=True
+""",
         )
-        
-        print("\n" + "="*60)
-        print("Round Robin会議が終了しました。")
-        print("="*60)
+
+    def print_stats(self):
+        if self.gating_stats["turns_avoided"]:
+            print(f"省略したLLMターン: {self.gating_stats['turns_avoided']}回")
 
 def main():
     """メイン関数"""
@@ -1,38 +1,62 @@
 """Selector方式 - 竹芝ポートシティマルチエージェントレコメンドシステム"""
 
 import os
-import autogen
-from dotenv import load_dotenv
-from data.takeshiba_tenants import TAKESHIBA_TENANTS
-from utils.weather_service import WeatherService
+from typing import Optional
 
-# 環境変数を読み込み
-load_dotenv()
+# .env の読み込み（utils の各設定より先に import する）
+from config import build_llm_config
+from discussion_system import DiscussionSystem
+from utils.speaker_selection import IntentSpeakerSelector
+from utils.termination import round_budget
 
-# LLM設定
-config_list = [
-    {
-        "model": "gpt-4o",
-        "api_key": os.getenv("OPENAI_API_KEY"),
-    }
-]
+# LLM設定（autogen は議論を始める時点で読み込む）
+llm_config = build_llm_config(temperature=0.7)
 
-llm_config = {
-    "config_list": config_list,
-    "temperature": 0.7,
-}
+class TakeshibaSelectorSystem(DiscussionSystem):
+    mode = "selector"
+    final_agent_attr = "lifestyle_concierge"
+    request_banner = """
+=== Selector方式 - 竹芝ポートシティ レコメンドシステム ===
 
-# 天気サービス初期化
-weather_service = WeatherService()
+AIが文脈に応じて最適な専門家を自動選択します。
+利用可能な専門家:
+- 天気コンサルタント (天候分析)
+- グルメ・カフェ専門家 (食事・カフェ)
+- ショッピングアドバイザー (買い物)
+- エンターテイメントプロデューサー (娯楽)
+- リラクゼーション専門家 (休憩・癒し)
+- ライフスタイルコンシェルジュ (総合統合)
+
+今日はどのようなことをお手伝いできますか？
+"""
+    start_banner = "Selector方式エージェント会議を開始します...\nAIが文脈に応じて最適な専門家を自動選択します"
+    end_banner = "Selector方式会議が終了しました。"
+    context_title = "【Selector方式会議】竹芝ポートシティでのおすすめ提案"
+    context_instructions = """===== Selector議論開始 =====
+ユーザーの要望と文脈に応じて、最適な専門家が自動選択されます。
+関連する専門家が議論し、最終的にライフスタイルコンシェルジュがまとめます。
+"""
+
+    # 方式ごとの名前でも呼び出せるようにする
+    start_selector_discussion = DiscussionSystem.start_discussion
+    astart_selector_discussion = DiscussionSystem.astart_discussion
+    astream_selector_discussion = DiscussionSystem.astream_discussion
+
+    def __init__(
+        self,
+        defer_setup: bool = False,
+        tenant_top_k: Optional[int] = None,
+        use_fast_path: Optional[bool] = None,
+        local_selection: Optional[bool] = None,
+    ):
+        self.selection_stats = None
+        # 要望の意図分類で発言者を選び、スピーカー選択のLLM呼び出しを省くか（曖昧な場合のみLLMで選択）
+        self.local_selection = local_selection if local_selection is not None else os.getenv("SELECTOR_LOCAL_SELECTION", "1") == "1"
+        super().__init__(defer_setup, tenant_top_k, use_fast_path)
 
-class TakeshibaSelectorSystem:
-    def __init__(self):
-        self.setup_agents()
-        self.weather_info = None
-        self.user_request = None
-    
     def setup_agents(self):
         """Selector方式用エージェントをセットアップ"""
+        import autogen
         
         # ユーザープロキシエージェント
         self.user_proxy = autogen.UserProxyAgent(
@@ -164,87 +188,9 @@ class TakeshibaSelectorSystem:
 - 静かで落ち着いた過ごし方の提案が必要な時
 """)
 
-    def get_weather_info(self):
-        """現在の天気情報を取得"""
-        return weather_service.get_current_weather()
-
-    def get_user_request(self):
-        """ユーザーからの要望を取得"""
-        print("""
-=== Selector方式 - 竹芝ポートシティ レコメンドシステム ===
-
-AIが文脈に応じて最適な専門家を自動選択します。
-利用可能な専門家:
-- 天気コンサルタント (天候分析)
-- グルメ・カフェ専門家 (食事・カフェ)
-- ショッピングアドバイザー (買い物)
-- エンターテイメントプロデューサー (娯楽)
-- リラクゼーション専門家 (休憩・癒し)
-- ライフスタイルコンシェルジュ (総合統合)
-
-今日はどのようなことをお手伝いできますか？
-""")
-        
-        # デモモード用の環境変数チェック
-        demo_request = os.getenv("DEMO_REQUEST")
-        if demo_request:
-            print(f"\n[デモモード] ユーザー要望: {demo_request}")
-            return demo_request
-        
-        user_input = input("\nあなたのご要望をお聞かせください: ")
-        return user_input
-
-    def format_tenant_data(self):
-        """テナントデータをエージェント用にフォーマット"""
-        formatted_data = "=== 竹芝ポートシティ テナント情報 ===\n\n"
-        
-        for category, tenants in TAKESHIBA_TENANTS.items():
-            formatted_data += f"【{category}】\n"
-            for tenant in tenants:
-                weather_pref = tenant.get("weather_preference", [])
-                weather_info = f" (適した天気: {', '.join(weather_pref)})" if weather_pref else ""
-                formatted_data += f"- {tenant['name']} ({tenant['floor']}){weather_info}\n"
-                formatted_data += f"  {tenant['description']}\n"
-            formatted_data += "\n"
-        
-        return formatted_data
-
-    def start_selector_discussion(self):
-        """Selector方式でマルチエージェント議論を開始"""
-        
-        # 1. 天気情報取得
-        self.weather_info = self.get_weather_info()
-        
-        # 2. ユーザー要望取得
-        self.user_request = self.get_user_request()
-        
-        print("\n" + "="*60)
-        print("Selector方式エージェント会議を開始します...")
-        print("AIが文脈に応じて最適な専門家を自動選択します")
-        print("="*60)
-        
-        # 3. 基本情報をまとめる
-        base_context = f"""
-【Selector方式会議】竹芝ポートシティでのおすすめ提案
-
-【現在の天気情報】
-- 天気: {self.weather_info['description']}
-- 気温: {self.weather_info['temperature']}°C
-- 湿度: {self.weather_info['humidity']}%
-
-【ユーザーからの要望】
-{self.user_request}
-
-【利用可能なテナント情報】
-{self.format_tenant_data()}
-
-===== Selector議論開始 =====
-ユーザーの要望と文脈に応じて、最適な専門家が自動選択されます。
-関連する専門家が議論し、最終的にライフスタイルコンシェルジュがまとめます。
-"""
-        
-        # 4. Selector形式のグループチャット
-        agents = [
+    def discussion_agents(self):
+        # Selector形式のグループチャット
+        return [
             self.weather_consultant,
             self.gourmet_specialist,
             self.shopping_advisor,
@@ -252,19 +198,30 @@ AIが文脈に応じて最適な専門家を自動選択します。
             self.relaxation_expert,
             self.lifestyle_concierge
         ]
+
+    def discuss(self, agents, base_context, streamer):
+        # 要望の意図から発言者を選び、判断できない場合だけAIが選択
+        selector = IntentSpeakerSelector(
+            routes={
+                "weather": self.weather_consultant,
+                "gourmet": self.gourmet_specialist,
+                "shopping": self.shopping_advisor,
+                "entertainment": self.entertainment_producer,
+                "relaxation": self.relaxation_expert,
+            },
+            final_agent=self.lifestyle_concierge,
+            request=self.user_request,
+            weather=self.weather_info.get("weather"),
+        ) if self.local_selection else None
         
         # Selector設定（AutoGenがコンテキストに基づいて選択）
-        groupchat = autogen.GroupChat(
-            agents=agents,
-            messages=[],
-            max_round=8,  # 十分な議論回数
-            speaker_selection_method="auto"  # AIが自動選択
-        )
-        
-        manager = autogen.GroupChatManager(
-            groupchat=groupchat,
-            llm_config=llm_config,
-            system_message="""
+        messages = self._run_groupchat(
+            agents,
+            base_context,
+            llm_config,
+            max_round=round_budget(self.user_request, min_rounds=len(agents) + 1, max_rounds=8),  # 要望の複雑さに応じて調整
+            speaker_selection_method=selector or "auto",  # AIが自動選択
+            manager_message="""
 あなたはSelector方式の会議進行管理者です。
 ユーザーの要望と議論の文脈に応じて、最も適切な専門家を選択してください。
 
@@ -275,19 +232,17 @@ AIが文脈に応じて最適な専門家を自動選択します。
 - 最終的な統合にはライフスタイルコンシェルジュを選択
 
 効率的で価値ある議論となるよう、適切なエージェント選択を行ってください。
-"""
+""",
         )
-        
-        # 会議開始
-        self.user_proxy.initiate_chat(
-            manager,
-            message=base_context,
-            clear_history=True
-        )
-        
-        print("\n" + "="*60)
-        print("Selector方式会議が終了しました。")
-        print("="*60)
+        self.selection_stats = selector.get_stats() if selector is not None else None
+        return messages
+
+    def print_stats(self):
+        if self.selection_stats:
+            print(
+                f"スピーカー選択: ローカル {self.selection_stats['local']}回 / LLM {self.selection_stats['llm']}回"
+                f"（LLM呼び出しを{self.selection_stats['saved_llm_calls']}回削減）"
+            )
 
 def main():
     """メイン関数"""
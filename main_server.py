@@ -0,0 +1,377 @@
+"""竹芝ポートシティ レコメンドAPIサーバー（ASGI）
+
+3つのGroupChat方式をHTTPのエンドポイントとして常駐させる。エージェント（共有プール）・天気キャッシュ・
+テナント索引はプロセス内で使い回し、議論は上限付きのワーカースレッドで実行する。
+空きワーカーがない間の依頼は待ち行列に入れ、待ち行列も満杯なら 503、所定の時間内に終わらなければ 504 を返す。
+
+    POST /recommend/{round_robin|selector|swarm}   {"request": "ランチを食べたい", "weather": {...}}  # weather は省略可
+        weather: {"weather": "rainy", "description": "雨", "temperature": 18, "humidity": 80}
+    GET  /health    死活監視
+    GET  /stats     待ち行列の長さ・方式ごとのレイテンシ・プール/キャッシュの状況（JSON）
+    GET  /metrics   Prometheus のテキスト形式
+
+    python main_server.py --port 8080
+    python main_server.py --host 0.0.0.0 --port 8080   # コンテナ内など、他のホストから受け付ける場合
+    MOCK_LLM=1 python main_server.py                  # モックLLMで起動（負荷試験用）
+    python main_benchmark.py --load-url http://127.0.0.1:8080 --concurrency 8 --total 64
+"""
+
+import argparse
+import asyncio
+import contextvars
+import importlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+# .env の読み込み（utils の各設定より先に import する）
+from config import get_weather_service
+from utils.agent_pool import AGENT_POOL
+from utils.instrumentation import METRICS, percentile
+from utils.output_capture import separate_outputs, set_context_output
+from utils.tenant_index import get_tenant_index
+
+# 方式名 -> (モジュール, クラス)
+SYSTEMS = {
+    "round_robin": ("main_round_robin", "TakeshibaRoundRobinSystem"),
+    "selector": ("main_selector", "TakeshibaSelectorSystem"),
+    "swarm": ("main_swarm", "TakeshibaSwarmSystem"),
+}
+
+# レイテンシの集計に使う直近の件数
+LATENCY_WINDOW = 1000
+
+# 受け付ける要求ボディの上限（バイト）
+MAX_BODY_BYTES = 64 * 1024
+
+# 要求で weather を指定する場合の必須項目（項目 -> 型）
+WEATHER_FIELDS = {
+    "weather": (str,),
+    "description": (str,),
+    "temperature": (int, float),
+    "humidity": (int, float),
+}
+
+class RecommendationService:
+    """上限付きのワーカースレッドで議論を実行し、待ち行列の長さとレイテンシを集計する"""
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queue: int = 16,
+        timeout: float = 120.0,
+        log_discussions: bool = False,
+    ):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.log_discussions = log_discussions
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="discussion")
+        self._classes: Dict[str, type] = {}
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        # (方式, 結果) -> 件数
+        self.counters: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.latencies: Dict[str, deque] = {mode: deque(maxlen=LATENCY_WINDOW) for mode in SYSTEMS}
+        self.queue_waits: Dict[str, deque] = {mode: deque(maxlen=LATENCY_WINDOW) for mode in SYSTEMS}
+        self.started_at = time.time()
+        # 同時に実行される議論の数だけ、構築済みのエージェント一式をプールに残す
+        AGENT_POOL.max_idle = max(AGENT_POOL.max_idle, self.workers)
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self.queued
+
+    def system_class(self, mode: str) -> type:
+        """方式のクラス（モジュールは最初に使う時に読み込む）"""
+        if mode not in self._classes:
+            module_name, class_name = SYSTEMS[mode]
+            self._classes[mode] = getattr(importlib.import_module(module_name), class_name)
+        return self._classes[mode]
+
+    def warmup(self, modes=None):
+        """各方式のモジュール読み込み・エージェント構築・テナント検索索引の読み込み・天気の取得を先に済ませる"""
+        started = time.perf_counter()
+        for mode in modes or SYSTEMS:
+            system = self.system_class(mode)()
+            system.release_agents()
+        get_tenant_index().search_engine
+        get_weather_service().get_current_weather()
+        print(f"ウォームアップ完了（{time.perf_counter() - started:.2f}秒）")
+
+    async def recommend(self, mode: str, user_request: str, weather_info: Optional[Dict] = None) -> Tuple[int, Dict]:
+        """議論を実行し (HTTPステータス, 応答) を返す"""
+        received = time.perf_counter()
+        if weather_info is None:
+            weather_info = await get_weather_service().aget_current_weather()
+
+        with self._lock:
+            if self.queued + self.active >= self.workers + self.max_queue:
+                self.counters[(mode, "rejected")] += 1
+                return 503, {"error": "混雑しています。しばらくしてから再度お試しください。", "queue_depth": self.queued}
+            self.queued += 1
+
+        future = self.executor.submit(contextvars.copy_context().run, self._run, mode, user_request, weather_info, time.perf_counter())
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # 実行前に打ち切った依頼は待ち行列から外す（実行中の議論は止められないため、終わるまでワーカーを使う）
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+            self._record(mode, "timeout")
+            return 504, {"error": f"{self.timeout:g}秒以内に提案を作成できませんでした。"}
+        except Exception as e:
+            self._record(mode, "error")
+            return 500, {"error": f"議論中にエラーが発生しました: {e}"}
+
+        seconds = time.perf_counter() - received
+        self._record(mode, "ok", seconds, result["queue_seconds"])
+        return 200, {"mode": mode, "seconds": round(seconds, 3), **result}
+
+    def _run(self, mode: str, user_request: str, weather_info: Dict, enqueued: float) -> Dict:
+        """ワーカースレッドで1件の議論を実行（エージェントは共有プールから借りて返す）"""
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            # 議論の経過は既定で捨てる（SERVER_LOG_DISCUSSIONS=1 でサーバーの標準出力に出す）
+            if not self.log_discussions:
+                set_context_output(io.StringIO())
+            system = self.system_class(mode)(defer_setup=True)
+            try:
+                recommendation = system.run_request(user_request, weather_info)
+            finally:
+                system.release_agents()
+            metrics = system.metrics or {}
+            return {
+                "recommendation": recommendation,
+                "weather": weather_info,
+                "queue_seconds": round(started - enqueued, 3),
+                "run_seconds": round(time.perf_counter() - started, 3),
+                "llm_calls": metrics.get("llm_calls"),
+                "agents_reused": (system.setup_stats or {}).get("reused"),
+            }
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _record(self, mode: str, outcome: str, seconds: Optional[float] = None, queue_seconds: Optional[float] = None):
+        with self._lock:
+            self.counters[(mode, outcome)] += 1
+            if seconds is not None:
+                self.latencies[mode].append(seconds)
+                self.queue_waits[mode].append(queue_seconds)
+
+    def get_stats(self) -> Dict:
+        """待ち行列・方式ごとのレイテンシ・エージェントプール・天気キャッシュの状況"""
+        with self._lock:
+            counters = dict(self.counters)
+            latencies = {mode: list(values) for mode, values in self.latencies.items()}
+            queue_waits = {mode: list(values) for mode, values in self.queue_waits.items()}
+            queued, active = self.queued, self.active
+
+        modes = {}
+        for mode in SYSTEMS:
+            values = latencies[mode]
+            modes[mode] = {
+                "requests": {outcome: count for (name, outcome), count in counters.items() if name == mode},
+                "latency_seconds": {
+                    f"p{q}": round(percentile(values, q), 3) if values else None for q in (50, 95, 99)
+                },
+                "queue_wait_p95_seconds": round(percentile(queue_waits[mode], 95), 3) if queue_waits[mode] else None,
+            }
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+            "queue_depth": queued,
+            "active": active,
+            "modes": modes,
+            "agent_pool": AGENT_POOL.get_stats(),
+            "weather_cache": get_weather_service().get_cache_stats(),
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus のテキスト形式（サーバーの指標 + 議論ごとのLLM利用量）"""
+        stats = self.get_stats()
+        lines = [
+            "# TYPE takeshiba_server_queue_depth gauge",
+            f"takeshiba_server_queue_depth {stats['queue_depth']}",
+            "# TYPE takeshiba_server_active_requests gauge",
+            f"takeshiba_server_active_requests {stats['active']}",
+            "# TYPE takeshiba_server_workers gauge",
+            f"takeshiba_server_workers {stats['workers']}",
+            "# TYPE takeshiba_server_requests_total counter",
+        ]
+        for mode, entry in stats["modes"].items():
+            for outcome, count in sorted(entry["requests"].items()):
+                lines.append(f'takeshiba_server_requests_total{{mode="{mode}",outcome="{outcome}"}} {count}')
+        lines.append("# TYPE takeshiba_server_latency_seconds summary")
+        for mode, entry in stats["modes"].items():
+            for name, value in entry["latency_seconds"].items():
+                if value is not None:
+                    quantile = int(name[1:]) / 100
+                    lines.append(f'takeshiba_server_latency_seconds{{mode="{mode}",quantile="{quantile:g}"}} {value}')
+        return "\n".join(lines) + "\n" + METRICS.to_prometheus()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def create_service_from_env() -> RecommendationService:
+    """環境変数（SERVER_WORKERS / SERVER_MAX_QUEUE / SERVER_REQUEST_TIMEOUT / SERVER_LOG_DISCUSSIONS）から作成"""
+    return RecommendationService(
+        workers=int(os.getenv("SERVER_WORKERS", "4")),
+        max_queue=int(os.getenv("SERVER_MAX_QUEUE", "16")),
+        timeout=float(os.getenv("SERVER_REQUEST_TIMEOUT", "120")),
+        log_discussions=os.getenv("SERVER_LOG_DISCUSSIONS", "0") == "1",
+    )
+
+class RecommendationApp:
+    """フレームワークを使わない最小限のASGIアプリ（uvicorn などで起動）"""
+
+    def __init__(self, service: Optional[RecommendationService] = None, warmup: Optional[bool] = None):
+        self.service = service
+        self.warmup = warmup if warmup is not None else os.getenv("SERVER_WARMUP", "1") == "1"
+        self._output = separate_outputs()
+
+    def get_service(self) -> RecommendationService:
+        if self.service is None:
+            self.service = create_service_from_env()
+        return self.service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            status, payload, content_type = await self._dispatch(scope, receive)
+            await _send(send, status, payload, content_type)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                service = self.get_service()
+                # 議論の経過をスレッドごとに振り分けるため、常駐中は標準出力を差し替えたままにする
+                self._output.__enter__()
+                if self.warmup:
+                    try:
+                        await asyncio.get_running_loop().run_in_executor(service.executor, service.warmup)
+                    except Exception as e:
+                        print(f"ウォームアップに失敗しました: {e}")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.get_service().shutdown()
+                self._output.__exit__(None, None, None)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, scope, receive) -> Tuple[int, object, str]:
+        service = self.get_service()
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+
+        if path == "/health":
+            return 200, {"status": "ok", "queue_depth": service.queue_depth}, "application/json"
+        if path == "/stats":
+            return 200, service.get_stats(), "application/json"
+        if path == "/metrics":
+            return 200, service.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+
+        if not path.startswith("/recommend/"):
+            return 404, {"error": f"見つかりません: {path}"}, "application/json"
+        mode = path[len("/recommend/"):]
+        if mode not in SYSTEMS:
+            return 404, {"error": f"未知の方式: {mode}（{', '.join(SYSTEMS)} のいずれか）"}, "application/json"
+        if method != "POST":
+            return 405, {"error": "POST で送信してください。"}, "application/json"
+
+        body = await _read_body(receive)
+        if body is None:
+            return 413, {"error": f"要求ボディは {MAX_BODY_BYTES} バイトまでです。"}, "application/json"
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "JSON を解析できませんでした。"}, "application/json"
+        user_request = data.get("request") if isinstance(data, dict) else None
+        if not isinstance(user_request, str) or not user_request.strip():
+            return 400, {"error": "request に要望を指定してください。"}, "application/json"
+        weather_info = data.get("weather")
+        if weather_info is not None:
+            error = _validate_weather(weather_info)
+            if error:
+                return 400, {"error": error}, "application/json"
+
+        status, payload = await service.recommend(mode, user_request.strip(), weather_info)
+        return status, payload, "application/json"
+
+def _validate_weather(weather_info) -> Optional[str]:
+    """要求で指定された天気情報の誤り（問題なければ None）"""
+    if not isinstance(weather_info, dict):
+        return "weather はオブジェクトで指定してください。"
+    missing = [field for field in WEATHER_FIELDS if field not in weather_info]
+    if missing:
+        return f"weather に {', '.join(missing)} を指定してください。"
+    for field, types in WEATHER_FIELDS.items():
+        value = weather_info[field]
+        # bool は int の一種なので数値として扱わない
+        if isinstance(value, bool) or not isinstance(value, types):
+            kind = "文字列" if types == (str,) else "数値"
+            return f"weather の {field} は{kind}で指定してください。"
+    return None
+
+async def _read_body(receive) -> Optional[bytes]:
+    """要求ボディを読み込む（上限を超えたら None）"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+async def _send(send, status: int, payload, content_type: str):
+    if isinstance(payload, str):
+        body = payload.encode("utf-8")
+    else:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        content_type = "application/json; charset=utf-8"
+    headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    if status == 503:
+        headers.append((b"retry-after", b"5"))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+# uvicorn main_server:app で起動する場合のアプリ
+app = RecommendationApp()
+
+def main():
+    parser = argparse.ArgumentParser(description="竹芝ポートシティ レコメンドAPIサーバー")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"), help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8080")), help="待ち受けるポート")
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn がインストールされていません: pip install uvicorn")
+        sys.exit(1)
+
+    print(f"🏙️ 竹芝ポートシティ レコメンドAPI: http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,65 @@
 """Swarm方式 - 竹芝ポートシティマルチエージェントレコメンドシステム"""
 
 import os
-import autogen
-from dotenv import load_dotenv
-from data.takeshiba_tenants import TAKESHIBA_TENANTS
-from utils.weather_service import WeatherService
-
-# 環境変数を読み込み
-load_dotenv()
-
-# LLM設定
-config_list = [
-    {
-        "model": "gpt-4o",
-        "api_key": os.getenv("OPENAI_API_KEY"),
-    }
-]
-
-llm_config = {
-    "config_list": config_list,
-    "temperature": 0.7,
-}
-
-# 天気サービス初期化
-weather_service = WeatherService()
-
-class TakeshibaSwarmSystem:
-    def __init__(self):
-        self.setup_agents()
-        self.weather_info = None
-        self.user_request = None
-    
+from typing import Optional
+
+# .env の読み込み（utils の各設定より先に import する）
+from config import build_llm_config
+from discussion_system import DiscussionSystem
+from utils.llm_cache import LLM_CACHE
+from utils.parallel_swarm import ParallelSwarm
+from utils.termination import round_budget
+
+# LLM設定（autogen は議論を始める時点で読み込む）
+llm_config = build_llm_config(temperature=0.7)
+
+class TakeshibaSwarmSystem(DiscussionSystem):
+    mode = "swarm"
+    final_agent_attr = "master_synthesizer"
+    request_banner = """
+=== Swarm方式 - 竹芝ポートシティ レコメンドシステム ===
+
+複数のエージェントが並行して独立分析し、最終的に統合します。
+Swarmエージェント:
+- アクティブ体験リサーチャー (活動的・体験重視)
+- リラクゼーション・キュレーター (癒し・安らぎ重視)
+- トレンド・イノベーター (最新・革新重視)
+- 実用性・エフィシエンシー専門家 (効率・実用重視)
+- 文化・グルメ探求者 (文化・美食重視)
+
+今日はどのようなことをお手伝いできますか？
+"""
+    start_banner = "Swarm方式エージェント会議を開始します...\n複数エージェントが並行して独立分析し、最終統合を行います"
+    end_banner = "Swarm方式会議が終了しました。"
+    context_title = "【Swarm方式会議】竹芝ポートシティでのおすすめ提案"
+    context_instructions = """===== Swarm並行分析開始 =====
+各Swarmエージェントは独立して分析し、それぞれの専門視点から提案を作成してください。
+他のエージェントの発言に影響されず、自分の専門分野に特化した最適解を提示してください。
+最終的にマスター・シンセサイザーが全ての提案を統合します。
+"""
+
+    # 方式ごとの名前でも呼び出せるようにする
+    start_swarm_discussion = DiscussionSystem.start_discussion
+    astart_swarm_discussion = DiscussionSystem.astart_discussion
+    astream_swarm_discussion = DiscussionSystem.astream_discussion
+
+    def __init__(
+        self,
+        defer_setup: bool = False,
+        tenant_top_k: Optional[int] = None,
+        use_fast_path: Optional[bool] = None,
+        parallel: Optional[bool] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        self.swarm_stats = None
+        # 各エージェントを並行実行するか（0の場合は従来のGroupChatで順番に発言）
+        self.parallel = parallel if parallel is not None else os.getenv("SWARM_PARALLEL", "1") == "1"
+        self.max_concurrency = max_concurrency or int(os.getenv("SWARM_MAX_CONCURRENCY", "5"))
+        super().__init__(defer_setup, tenant_top_k, use_fast_path)
+
     def setup_agents(self):
         """Swarm方式用エージェントをセットアップ"""
+        import autogen
         
         # ユーザープロキシエージェント
         self.user_proxy = autogen.UserProxyAgent(
@@ -182,87 +209,9 @@ Swarmアプローチ:
 必ず最後に「TERMINATE」を付けて議論を終了してください。
 """)
 
-    def get_weather_info(self):
-        """現在の天気情報を取得"""
-        return weather_service.get_current_weather()
-
-    def get_user_request(self):
-        """ユーザーからの要望を取得"""
-        print("""
-=== Swarm方式 - 竹芝ポートシティ レコメンドシステム ===
-
-複数のエージェントが並行して独立分析し、最終的に統合します。
-Swarmエージェント:
-- アクティブ体験リサーチャー (活動的・体験重視)
-- リラクゼーション・キュレーター (癒し・安らぎ重視)
-- トレンド・イノベーター (最新・革新重視)
-- 実用性・エフィシエンシー専門家 (効率・実用重視)
-- 文化・グルメ探求者 (文化・美食重視)
-
-今日はどのようなことをお手伝いできますか？
-""")
-        
-        # デモモード用の環境変数チェック
-        demo_request = os.getenv("DEMO_REQUEST")
-        if demo_request:
-            print(f"\n[デモモード] ユーザー要望: {demo_request}")
-            return demo_request
-        
-        user_input = input("\nあなたのご要望をお聞かせください: ")
-        return user_input
-
-    def format_tenant_data(self):
-        """テナントデータをエージェント用にフォーマット"""
-        formatted_data = "=== 竹芝ポートシティ テナント情報 ===\n\n"
-        
-        for category, tenants in TAKESHIBA_TENANTS.items():
-            formatted_data += f"【{category}】\n"
-            for tenant in tenants:
-                weather_pref = tenant.get("weather_preference", [])
-                weather_info = f" (適した天気: {', '.join(weather_pref)})" if weather_pref else ""
-                formatted_data += f"- {tenant['name']} ({tenant['floor']}){weather_info}\n"
-                formatted_data += f"  {tenant['description']}\n"
-            formatted_data += "\n"
-        
-        return formatted_data
-
-    def start_swarm_discussion(self):
-        """Swarm方式でマルチエージェント議論を開始"""
-        
-        # 1. 天気情報取得
-        self.weather_info = self.get_weather_info()
-        
-        # 2. ユーザー要望取得
-        self.user_request = self.get_user_request()
-        
-        print("\n" + "="*60)
-        print("Swarm方式エージェント会議を開始します...")
-        print("複数エージェントが並行して独立分析し、最終統合を行います")
-        print("="*60)
-        
-        # 3. 基本情報をまとめる
-        base_context = f"""
-【Swarm方式会議】竹芝ポートシティでのおすすめ提案
-
-【現在の天気情報】
-- 天気: {self.weather_info['description']}
-- 気温: {self.weather_info['temperature']}°C
-- 湿度: {self.weather_info['humidity']}%
-
-【ユーザーからの要望】
-{self.user_request}
-
-【利用可能なテナント情報】
-{self.format_tenant_data()}
-
-===== Swarm並行分析開始 =====
-各Swarmエージェントは独立して分析し、それぞれの専門視点から提案を作成してください。
-他のエージェントの発言に影響されず、自分の専門分野に特化した最適解を提示してください。
-最終的にマスター・シンセサイザーが全ての提案を統合します。
-"""
-        
-        # 4. Swarm形式のグループチャット
-        agents = [
+    def discussion_agents(self):
+        # Swarmエージェント（最後が統合役）
+        return [
             self.active_researcher,
             self.relaxation_curator,
             self.trend_innovator,
@@ -270,20 +219,33 @@ Swarmエージェント:
             self.culture_gourmet_explorer,
             self.master_synthesizer
         ]
-        
-        # Swarm設定（最大自由度で並行議論）
-        groupchat = autogen.GroupChat(
-            agents=agents,
-            messages=[],
-            max_round=12,  # 各エージェントが十分に発言できる回数
-            speaker_selection_method="auto",  # 自由な発言順序
-            allow_repeat_speaker=True  # 同じエージェントの複数回発言を許可
+
+    def discuss(self, agents, base_context, streamer):
+        if not self.parallel:
+            return self._run_swarm_groupchat(agents, base_context)
+        # 5エージェントに同時に依頼し、集まった提案をマスター・シンセサイザーが一度だけ統合
+        self.round_stats = None
+        swarm = ParallelSwarm(agents[:-1], self.master_synthesizer, max_concurrency=self.max_concurrency)
+        messages = swarm.run(
+            base_context,
+            self.user_proxy,
+            cache=LLM_CACHE,  # 全エージェントで共有するレスポンスキャッシュ
+            on_turn_end=streamer.end_turn if streamer is not None else None,
         )
-        
-        manager = autogen.GroupChatManager(
-            groupchat=groupchat,
-            llm_config=llm_config,
-            system_message="""
+        self.swarm_stats = swarm.stats
+        return messages
+
+    def _run_swarm_groupchat(self, agents, base_context):
+        """従来のGroupChat（スピーカー自動選択で順番に発言）で議論し、発言リストを返す"""
+        # Swarm設定（最大自由度で議論）
+        return self._run_groupchat(
+            agents,
+            base_context,
+            llm_config,
+            max_round=round_budget(self.user_request, min_rounds=len(agents) + 1, max_rounds=12),  # 要望の複雑さに応じて調整
+            speaker_selection_method="auto",  # 自由な発言順序
+            allow_repeat_speaker=True,  # 同じエージェントの複数回発言を許可
+            manager_message="""
 あなたはSwarm方式の会議進行管理者です。
 各Swarmエージェントが独立して分析し、自由に議論できるよう調整してください。
 
@@ -294,19 +256,12 @@ Swarm進行方針:
 - 最終的にマスター・シンセサイザーによる統合を実現
 
 自由で創造的な議論環境を提供し、多角的な提案の生成を支援してください。
-"""
+""",
         )
-        
-        # 会議開始
-        self.user_proxy.initiate_chat(
-            manager,
-            message=base_context,
-            clear_history=True
-        )
-        
-        print("\n" + "="*60)
-        print("Swarm方式会議が終了しました。")
-        print("="*60)
+
+    def print_stats(self):
+        if self.parallel and self.swarm_stats:
+            print(f"並行分析: {self.swarm_stats['fan_out_seconds']:.1f}秒 / 統合: {self.swarm_stats['synthesis_seconds']:.1f}秒")
 
 def main():
     """メイン関数"""
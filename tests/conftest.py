@@ -0,0 +1,6 @@
+"""テストからリポジトリ直下のモジュール（utils / data）を import できるようにする"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+"""CircuitBreaker の状態遷移"""
+
+from utils.circuit_breaker import CircuitBreaker
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["opened"] == 1
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_probe_only_after_reset_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    assert not breaker.try_begin_probe()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.try_begin_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 試行中は2回目の試行を許可しない
+    assert not breaker.try_begin_probe()
+
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["probes"] == 1
+
+def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.try_begin_probe()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["opened"] == 2
+
+def test_opens_on_latency_percentile():
+    breaker = CircuitBreaker(latency_threshold=1.0, min_samples=5, window_size=5)
+    for _ in range(4):
+        breaker.record_success(2.0)
+    # サンプルが min_samples に満たない間は開かない
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_success(2.0)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.latency_percentile_value() == 2.0
+
+def test_recovery_clears_slow_latency_window():
+    breaker = CircuitBreaker(latency_threshold=1.0, min_samples=2, window_size=5, reset_timeout=0)
+    breaker.record_success(5.0)
+    breaker.record_success(5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.try_begin_probe()
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.latency_percentile_value() == 0.1
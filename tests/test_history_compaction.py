@@ -0,0 +1,67 @@
+"""HistoryCompactor のテナント一覧の切り詰め（_fit_static）と発言の抜粋"""
+
+from data.tenant_store import Tenant, TenantStore
+from utils.history_compaction import TRUNCATED_MARK, HistoryCompactor, TenantNameMatcher, message_tokens
+from utils.tenant_context import _render, find_tenant_block, tenant_names_in
+
+INSTRUCTIONS = "\n上記の情報を基に、各専門分野の観点から提案をお願いします。\n"
+
+def make_context(count=40):
+    store = TenantStore(
+        Tenant(f"テナント{i:02d}", "カフェ", "restaurants", f"{i % 5 + 1}F", f"説明文{i:02d}" * 5, ["rainy"])
+        for i in range(count)
+    )
+    return "【ユーザーからの要望】\nランチ\n\n" + _render(store.grouped()) + INSTRUCTIONS
+
+def test_fit_static_keeps_messages_within_budget():
+    messages = [{"role": "user", "content": make_context()}]
+    compactor = HistoryCompactor(token_budget=message_tokens(messages) + 10)
+    assert compactor._fit_static(messages) is messages
+
+def test_fit_static_trims_only_whole_tenants():
+    context = make_context()
+    messages = [{"role": "user", "content": context}, {"role": "assistant", "name": "専門家", "content": "提案"}]
+    budget = message_tokens(messages) // 2
+    fitted = HistoryCompactor(token_budget=budget)._fit_static(messages)
+
+    content = fitted[0]["content"]
+    assert message_tokens(fitted) <= budget
+    assert fitted[1] is messages[1]
+    # 要望と議論の指示は残し、テナント一覧だけを末尾から削る
+    assert content.startswith("【ユーザーからの要望】\nランチ")
+    assert TRUNCATED_MARK in content and content.endswith(INSTRUCTIONS)
+    kept = tenant_names_in(content)
+    assert 0 < len(kept) < 40
+    assert kept == tenant_names_in(context)[:len(kept)]
+    # 残したテナントは名前と説明の2行がそろっている
+    start, end = find_tenant_block(content)
+    assert content[start:end].rstrip("\n").splitlines()[-1].startswith("  説明文")
+
+def test_fit_static_drops_whole_list_when_budget_is_tiny():
+    messages = [{"role": "user", "content": make_context()}]
+    fitted = HistoryCompactor(token_budget=1)._fit_static(messages)
+    assert tenant_names_in(fitted[0]["content"]) == []
+    assert TRUNCATED_MARK in fitted[0]["content"] and fitted[0]["content"].endswith(INSTRUCTIONS)
+
+def test_fit_static_ignores_messages_without_tenant_list():
+    messages = [{"role": "user", "content": "テナント一覧のない依頼" * 100}]
+    assert HistoryCompactor(token_budget=1)._fit_static(messages) is messages
+
+def test_summaries_use_tenants_from_context_and_are_bounded():
+    context = make_context(count=3)
+    compactor = HistoryCompactor(token_budget=100000, keep_recent=1, max_summaries=2)
+    turns = [
+        {"role": "assistant", "name": f"専門家{i}", "content": f"テナント01とテナント99に行く案{i}\n- テナント02で休憩"}
+        for i in range(4)
+    ]
+    compacted = compactor.apply_transform([{"role": "user", "content": context}] + turns)
+
+    assert "言及したテナント: テナント01、テナント02" in compacted[1]["content"]
+    # 一覧にないテナントは照合しない
+    assert "テナント99" not in compacted[1]["content"].splitlines()[1]
+    assert compacted[-1] is turns[-1]
+    assert len(compactor._summaries) == 2
+
+def test_name_matcher_prefers_longer_names_in_order():
+    matcher = TenantNameMatcher(["カフェ", "カフェ・オーシャンビュー", "映画館"])
+    assert matcher.find("映画館のあとカフェ・オーシャンビューへ") == ["映画館", "カフェ・オーシャンビュー", "カフェ"]
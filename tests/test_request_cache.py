@@ -0,0 +1,57 @@
+"""RecommendationCache の類似度判定と区画分け"""
+
+import pytest
+
+from utils.request_cache import RecommendationCache, char_trigrams, normalize_request_text, similarity
+
+RAINY = {"weather": "rainy", "description": "雨", "temperature": 18, "humidity": 80}
+
+@pytest.fixture
+def cache():
+    return RecommendationCache(threshold=0.5, ttl=3600)
+
+def test_normalize_removes_symbols_and_polite_suffix():
+    assert normalize_request_text("美味しいランチを食べたいです！") == normalize_request_text("美味しいランチを食べたい")
+
+def test_similarity():
+    grams = char_trigrams("美味しいランチを食べたい")
+    assert similarity(grams, grams) == 1.0
+    assert similarity(grams, frozenset()) == 0.0
+    assert 0.0 < similarity(grams, char_trigrams("美味しいランチが食べたい")) < 1.0
+
+def test_exact_and_similar_requests_hit(cache):
+    cache.store("selector", "美味しいランチを食べたい", RAINY, "提案A")
+    assert cache.lookup("selector", "美味しいランチを食べたいです", RAINY) == "提案A"
+    assert cache.lookup("selector", "とても美味しいランチを食べたい", RAINY) == "提案A"
+    stats = cache.get_stats()
+    assert stats["hits"] == 2 and stats["exact_hits"] == 1
+
+def test_different_intent_keywords_miss(cache):
+    cache.store("selector", "和食のランチを食べたい", RAINY, "和食の提案")
+    assert cache.lookup("selector", "洋食のランチを食べたい", RAINY) is None
+
+def test_dissimilar_request_misses(cache):
+    cache.store("selector", "美味しいランチを食べたい", RAINY, "提案A")
+    assert cache.lookup("selector", "ランチ", RAINY) is None
+
+def test_partitioned_by_mode_weather_and_temperature(cache):
+    cache.store("selector", "美味しいランチを食べたい", RAINY, "提案A")
+    assert cache.lookup("swarm", "美味しいランチを食べたい", RAINY) is None
+    assert cache.lookup("selector", "美味しいランチを食べたい", dict(RAINY, weather="sunny")) is None
+    assert cache.lookup("selector", "美味しいランチを食べたい", dict(RAINY, temperature=30)) is None
+    # 同じ気温帯（既定は5度刻み）なら同じ区画
+    assert cache.lookup("selector", "美味しいランチを食べたい", dict(RAINY, temperature=16)) == "提案A"
+
+def test_expired_entries_miss():
+    cache = RecommendationCache(ttl=0)
+    cache.store("selector", "美味しいランチを食べたい", RAINY, "提案A")
+    assert cache.lookup("selector", "美味しいランチを食べたい", RAINY) is None
+
+def test_partition_evicts_least_recently_used():
+    cache = RecommendationCache(max_entries_per_partition=2)
+    cache.store("selector", "ランチ", RAINY, "1")
+    cache.store("selector", "映画", RAINY, "2")
+    assert cache.lookup("selector", "ランチ", RAINY) == "1"
+    cache.store("selector", "買い物", RAINY, "3")
+    assert cache.lookup("selector", "映画", RAINY) is None
+    assert cache.get_stats()["entries"] == 2
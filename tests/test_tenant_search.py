@@ -0,0 +1,60 @@
+"""TenantSearchEngine の構築・保存・読み込み"""
+
+from data.tenant_store import Tenant, TenantStore
+from utils.tenant_search import TenantSearchEngine
+
+EXTRA_TERMS = {"restaurants": ["ランチ", "食事"]}
+
+def make_store():
+    return TenantStore([
+        Tenant("カフェ・オーシャンビュー", "カフェ", "restaurants", "3F", "海を眺めながらコーヒーを楽しめるカフェ", ["sunny"]),
+        Tenant("和食処 海鮮", "和食", "restaurants", "1F", "新鮮な魚介を使った定食", ["rainy"]),
+        Tenant("シネマコンプレックス", "映画館", "entertainment", "5F", "最新作を上映する映画館", ["rainy", "cloudy"]),
+    ])
+
+def test_search_ranks_matching_tenant_first():
+    engine = TenantSearchEngine.build(make_store(), EXTRA_TERMS)
+    assert engine.doc_count == 3
+    assert engine.search("映画を見たい", top_k=1)[0][0] == 2
+    # グループの追加語でも引き当てられる
+    assert {doc_id for doc_id, _ in engine.search("ランチ")} == {0, 1}
+
+def test_save_and_load_round_trip(tmp_path):
+    store = make_store()
+    engine = TenantSearchEngine.build(store, EXTRA_TERMS, k1=1.5, b=0.5)
+    path = str(tmp_path / "index.json")
+    engine.save(path)
+
+    loaded = TenantSearchEngine.load(path)
+    assert (loaded.k1, loaded.b, loaded.max_postings_per_term) == (1.5, 0.5, engine.max_postings_per_term)
+    assert loaded.fingerprint == engine.fingerprint
+    assert [doc_id for doc_id, _ in loaded.search("海のカフェ")] == [doc_id for doc_id, _ in engine.search("海のカフェ")]
+    # 一時ファイルは残らない
+    assert [p.name for p in tmp_path.iterdir()] == ["index.json"]
+
+def test_build_or_load_reuses_matching_index(tmp_path):
+    store = make_store()
+    path = str(tmp_path / "index.json")
+    built = TenantSearchEngine.build_or_load(store, path, EXTRA_TERMS)
+    loaded = TenantSearchEngine.build_or_load(store, path, EXTRA_TERMS)
+    assert loaded.fingerprint == built.fingerprint
+    assert loaded.postings.keys() == built.postings.keys()
+
+def test_build_or_load_rebuilds_when_data_or_parameters_change(tmp_path):
+    store = make_store()
+    path = str(tmp_path / "index.json")
+    original = TenantSearchEngine.build_or_load(store, path, EXTRA_TERMS)
+
+    rebuilt = TenantSearchEngine.build_or_load(store, path, EXTRA_TERMS, k1=2.0)
+    assert rebuilt.k1 == 2.0
+    assert rebuilt.fingerprint != original.fingerprint
+
+    store.add(Tenant("展望デッキ", "展望", "entertainment", "RF", "東京湾を一望できるデッキ", ["sunny"]))
+    grown = TenantSearchEngine.build_or_load(store, path, EXTRA_TERMS, k1=2.0)
+    assert grown.doc_count == 4
+
+def test_load_rejects_other_formats(tmp_path):
+    path = tmp_path / "index.json"
+    path.write_text('{"format": 1}', encoding="utf-8")
+    engine = TenantSearchEngine.build_or_load(make_store(), str(path))
+    assert engine.doc_count == 3
@@ -0,0 +1,77 @@
+"""round_budget と DiscussionTerminator"""
+
+from utils.termination import MIN_PLAN_LENGTH, DiscussionTerminator, request_complexity, round_budget
+
+class FakeGroupChat:
+    """DiscussionTerminator が参照する GroupChat の属性だけを持つ代役"""
+
+    def __init__(self, max_round=10):
+        self.messages = [{"name": "司会者", "content": "依頼文"}]
+        self.max_round = max_round
+
+    def agent_by_name(self, name):
+        return name
+
+    def say(self, name, content):
+        self.messages.append({"name": name, "content": content})
+        return self.messages[-1]
+
+def test_round_budget_stays_within_bounds():
+    assert round_budget("", min_rounds=4, max_rounds=8) == 4
+    long_request = "ランチを食べて、買い物をして、映画を見て、カフェでゆっくりしたい。" * 5
+    assert request_complexity(long_request) == 1.0
+    assert round_budget(long_request, min_rounds=4, max_rounds=8) == 8
+
+def test_round_budget_grows_with_topics():
+    simple = round_budget("ランチ", min_rounds=4, max_rounds=10)
+    mixed = round_budget("ランチと買い物と映画", min_rounds=4, max_rounds=10)
+    assert 4 <= simple < mixed <= 10
+
+def test_stops_on_terminate_mark():
+    groupchat = FakeGroupChat()
+    terminator = DiscussionTerminator(groupchat, final_agent="統合役")
+    message = groupchat.say("専門家", "以上です。TERMINATE")
+    assert terminator(message)
+    assert terminator.get_stats()["stop_reason"] == "terminate"
+
+def test_stops_on_complete_plan_from_final_agent():
+    groupchat = FakeGroupChat()
+    terminator = DiscussionTerminator(groupchat, final_agent="統合役")
+    plan = "プラン" * MIN_PLAN_LENGTH
+
+    assert not terminator(groupchat.say("専門家", plan))
+    assert not terminator(groupchat.say("統合役", plan + "でよろしいですか？"))
+    assert terminator(groupchat.say("統合役", plan))
+    assert terminator.get_stats()["stop_reason"] == "final_plan"
+
+def test_stalled_discussion_routes_to_final_agent():
+    groupchat = FakeGroupChat()
+    terminator = DiscussionTerminator(groupchat, final_agent="統合役", repeat_limit=2)
+    select = terminator.route(lambda last_speaker, groupchat: "専門家")
+
+    terminator(groupchat.messages[0])
+    for _ in range(3):
+        # 同じ発言の繰り返しは、統合役の発言前なら終了させずに統合役へ回す
+        assert not terminator(groupchat.say("専門家", "雨の日は屋内のカフェがおすすめです"))
+    assert terminator.stalled
+    assert select(None, groupchat) == "統合役"
+    assert terminator.get_stats()["skipped_to_final"]
+
+def test_last_round_goes_to_final_agent():
+    groupchat = FakeGroupChat(max_round=4)
+    terminator = DiscussionTerminator(groupchat, final_agent="統合役")
+    select = terminator.route(lambda last_speaker, groupchat: "専門家")
+
+    assert select(None, groupchat) == "専門家"
+    groupchat.say("専門家", "一つ目の提案")
+    assert select(None, groupchat) == "専門家"
+    groupchat.say("専門家", "二つ目の提案")
+    # 発言数が max_round - 1 になったら、統合役が未発言なら統合役を選ぶ
+    assert select(None, groupchat) == "統合役"
+
+def test_last_round_keeps_selection_when_final_agent_spoke():
+    groupchat = FakeGroupChat(max_round=3)
+    terminator = DiscussionTerminator(groupchat, final_agent="統合役")
+    select = terminator.route("round_robin")
+    groupchat.say("統合役", "途中のまとめ")
+    assert select(None, groupchat) == "round_robin"
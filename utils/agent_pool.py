@@ -0,0 +1,76 @@
+"""構築済みエージェントの再利用プール
+
+各システムの setup_agents は大きなシステムメッセージを持つエージェントを6〜7体構築する。
+長時間動くプロセスでは、構築済みの一式を会話履歴を消去したうえで使い回し、議論ごとの再構築を避ける。
+同時に実行される議論どうしが同じエージェントを共有しないよう、一式ずつ貸し出して返却を受ける。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Tuple
+
+if TYPE_CHECKING:
+    from autogen import ConversableAgent
+
+AgentSet = Dict[str, "ConversableAgent"]
+
+def collect_agents(owner) -> AgentSet:
+    """オブジェクトの属性のうちエージェントであるもの（属性名 -> エージェント）"""
+    from autogen import ConversableAgent
+    return {name: value for name, value in vars(owner).items() if isinstance(value, ConversableAgent)}
+
+def reset_agents(agents: Iterable[ConversableAgent]):
+    """会話履歴・自動返信回数・利用量の集計を消去"""
+    for agent in agents:
+        agent.reset()
+
+class AgentPool:
+    """キー（システムの種類）ごとに、空いているエージェント一式を貸し出す"""
+
+    def __init__(self, max_idle: int = 4):
+        self.max_idle = max_idle
+        self._idle: Dict[str, List[AgentSet]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.stats = {"builds": 0, "reuses": 0, "build_seconds": 0.0, "releases": 0, "discarded": 0}
+
+    def acquire(self, key: str, factory: Callable[[], AgentSet]) -> Tuple[AgentSet, bool]:
+        """空いている一式を返す。なければ factory で構築（戻り値は (一式, 再利用したか)）"""
+        with self._lock:
+            if self._idle[key]:
+                self.stats["reuses"] += 1
+                return self._idle[key].pop(), True
+        started = time.perf_counter()
+        agents = factory()
+        with self._lock:
+            self.stats["builds"] += 1
+            self.stats["build_seconds"] += time.perf_counter() - started
+        return agents, False
+
+    def release(self, key: str, agents: AgentSet):
+        """会話履歴を消去してプールに戻す（空きが max_idle 件を超える分は捨てる）"""
+        reset_agents(agents.values())
+        with self._lock:
+            self.stats["releases"] += 1
+            if len(self._idle[key]) < self.max_idle:
+                self._idle[key].append(agents)
+            else:
+                self.stats["discarded"] += 1
+
+    def idle_count(self, key: str) -> int:
+        with self._lock:
+            return len(self._idle[key])
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["idle"] = {key: len(sets) for key, sets in self._idle.items() if sets}
+        acquired = stats["builds"] + stats["reuses"]
+        stats["reuse_rate"] = stats["reuses"] / acquired if acquired else 0.0
+        return stats
+
+# 全システムで共有するプール（AGENT_POOL_MAX_IDLE=0 で再利用しない）
+AGENT_POOL = AgentPool(max_idle=int(os.getenv("AGENT_POOL_MAX_IDLE", "4")))
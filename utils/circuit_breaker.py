@@ -0,0 +1,111 @@
+"""外部API呼び出し用のサーキットブレーカー"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+class CircuitOpenError(RuntimeError):
+    """回路が開いているため呼び出しを行わなかったことを示す例外"""
+
+
+class CircuitBreaker:
+    """連続失敗または高レイテンシで回路を開き、一定時間後に1回だけ試行を許可する"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        latency_threshold: Optional[float] = None,
+        latency_percentile: float = 0.95,
+        window_size: int = 20,
+        min_samples: int = 5,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_threshold = latency_threshold
+        self.latency_percentile = latency_percentile
+        self.min_samples = min_samples
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._latencies = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "probes": 0}
+
+    @property
+    def state(self) -> str:
+        """現在の状態"""
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """通常の呼び出しを許可するか（閉じている時のみ）"""
+        with self._lock:
+            return self._state == self.CLOSED
+
+    def try_begin_probe(self) -> bool:
+        """開いてから reset_timeout 経過していれば、試行（half-open）を1回だけ許可"""
+        with self._lock:
+            if self._state != self.OPEN or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._state = self.HALF_OPEN
+            self.stats["probes"] += 1
+            return True
+
+    def record_success(self, latency: float):
+        """成功を記録（レイテンシのパーセンタイルが閾値を超えたら開く）"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                # 回復: 過去の遅いサンプルで即座に再オープンしないよう窓をリセット
+                self._state = self.CLOSED
+                self._latencies.clear()
+            self._failures = 0
+            self._latencies.append(latency)
+
+            if self._state == self.CLOSED and self._latency_exceeded():
+                self._open()
+
+    def record_failure(self):
+        """失敗を記録"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def latency_percentile_value(self) -> Optional[float]:
+        """直近ウィンドウのレイテンシパーセンタイル"""
+        with self._lock:
+            return self._percentile()
+
+    def snapshot(self) -> Dict:
+        """状態のスナップショットを取得"""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "latency_percentile": self._percentile(),
+                **self.stats,
+            }
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.stats["opened"] += 1
+
+    def _latency_exceeded(self) -> bool:
+        if self.latency_threshold is None or len(self._latencies) < self.min_samples:
+            return False
+        return self._percentile() > self.latency_threshold
+
+    def _percentile(self) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.latency_percentile * len(ordered)))
+        return ordered[index]
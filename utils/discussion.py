@@ -0,0 +1,26 @@
+"""GroupChatの結果を扱う共通処理"""
+
+from typing import Dict, List, Optional
+
+TERMINATE_MARK = "TERMINATE"
+
+def strip_terminate(content: str) -> str:
+    """発言末尾の終了マーカーを取り除く"""
+    content = (content or "").rstrip()
+    if content.endswith(TERMINATE_MARK):
+        content = content[: -len(TERMINATE_MARK)].rstrip()
+    return content
+
+def agent_spoke(messages: List[Dict], agent_name: str) -> bool:
+    """agent_name のエージェントが内容のある発言をしたか"""
+    return any(message.get("name") == agent_name and message.get("content") for message in messages)
+
+def extract_final_recommendation(messages: List[Dict], agent_name: str) -> Optional[str]:
+    """最終提案（統合役エージェントの最後の発言、なければ最後の発言）を取り出す"""
+    for message in reversed(messages):
+        if message.get("name") == agent_name and message.get("content"):
+            return strip_terminate(message["content"])
+    for message in reversed(messages[1:]):
+        if message.get("content"):
+            return strip_terminate(message["content"])
+    return None
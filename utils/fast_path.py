@@ -0,0 +1,144 @@
+"""単純な要望にLLMを使わず即答するルールベースのレコメンド"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from data.tenant_store import Tenant, weather_match_mask
+from utils.intent import classify_intent, normalize_request
+from utils.tenant_index import TenantIndex, get_tenant_index
+
+# 意図ごとに対象となるテナント（グループまたはカテゴリ）
+INTENT_TARGETS: Dict[str, Dict[str, Set[str]]] = {
+    "gourmet": {"groups": {"restaurants"}, "categories": {"書店・カフェ"}},
+    "shopping": {"groups": {"shops"}, "categories": set()},
+    "entertainment": {"groups": {"entertainment"}, "categories": set()},
+    "relaxation": {"groups": set(), "categories": {"カフェ", "書店・カフェ", "映画館"}},
+}
+
+WEATHER_LABELS = {"sunny": "晴れ", "cloudy": "曇り", "rainy": "雨", "cold": "寒い日"}
+
+# これより長い要望は複合的とみなして信頼度を下げる
+SIMPLE_REQUEST_LENGTH = 20
+
+# 要望文に出てくる天気の言葉と天気分類（「雨の日に行ける所」は今の天気ではなく雨の日向けを探す）
+REQUEST_WEATHER_KEYWORDS: Dict[str, List[str]] = {
+    "rainy": ["雨", "屋内"],
+    "sunny": ["晴れ", "屋外"],
+    "cold": ["寒い", "雪"],
+    "cloudy": ["曇り"],
+}
+
+# 天気の意図だけで何をしたいかが分からない要望の信頼度（既定の閾値ではエージェント会議に回す）
+WEATHER_ONLY_CONFIDENCE = 0.5
+
+def requested_weather(request: str) -> Optional[str]:
+    """要望文が指定している天気分類（なし、または複数の天気が混在する場合は None）"""
+    text = normalize_request(request)
+    found = {weather for weather, keywords in REQUEST_WEATHER_KEYWORDS.items() if any(k in text for k in keywords)}
+    return found.pop() if len(found) == 1 else None
+
+class FastPathRecommender:
+    """天気分類とキーワード意図からテナントを採点し、信頼度が閾値以上なら定型文で回答する"""
+
+    def __init__(self, index: Optional[TenantIndex] = None, threshold: float = 0.75, top_k: int = 3):
+        self._index = index
+        self.threshold = threshold
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self.stats = {"total": 0, "served": 0}
+
+    @property
+    def index(self) -> TenantIndex:
+        """対象のテナント索引（未指定なら共有の索引）"""
+        return self._index if self._index is not None else get_tenant_index()
+
+    def recommend(self, request: str, weather_info: Dict) -> Optional[str]:
+        """即答できればレコメンド文を、できなければ None を返す（要望文が天気を指定していればその天気を優先）"""
+        weather = requested_weather(request)
+        tenants, confidence = self.rank(request, weather or weather_info.get("weather"))
+        served = bool(tenants) and confidence >= self.threshold
+        with self._lock:
+            self.stats["total"] += 1
+            if served:
+                self.stats["served"] += 1
+        if not served:
+            return None
+        return self._render(request, weather_info, tenants, weather)
+
+    def rank(self, request: str, weather: Optional[str]) -> Tuple[List[Tenant], float]:
+        """候補テナントと信頼度（0〜1）を算出"""
+        intents = classify_intent(request)
+        if not intents:
+            return [], 0.0
+
+        # 全ての意図を同時に満たすテナントがあれば、意図は矛盾していない
+        candidates: Optional[Set[int]] = None
+        for intent in intents:
+            targets = self._targets(intent)
+            if targets is None:
+                continue
+            candidates = targets if candidates is None else candidates & targets
+        weather_only = candidates is None
+        if weather_only:
+            # 天気に関する意図だけの場合は全テナントが対象
+            candidates = set(range(len(self.index.tenants)))
+
+        if candidates:
+            confidence = WEATHER_ONLY_CONFIDENCE if weather_only else 1.0
+        else:
+            # 意図が分かれている場合は、最も強い意図の割合を信頼度とする
+            top_intent = max(intents, key=intents.get)
+            confidence = intents[top_intent] / sum(intents.values())
+            candidates = self._targets(top_intent) or set()
+
+        length = len(normalize_request(request))
+        if length > SIMPLE_REQUEST_LENGTH:
+            confidence *= SIMPLE_REQUEST_LENGTH / length
+
+        # 天気に合うテナントを優先し、なければ信頼度を下げる
+        mask = weather_match_mask(weather)
+        suited = [i for i in candidates if self.index.tenants[i].weather_mask & mask]
+        if not suited:
+            confidence *= 0.5
+            suited = list(candidates)
+
+        relevance = dict(self.index.search_engine.search(request, top_k=50))
+        suited.sort(key=lambda i: (-relevance.get(i, 0.0), i))
+        return [self.index.tenants[i] for i in suited[:self.top_k]], confidence
+
+    def served_ratio(self) -> float:
+        """ファストパスで回答したリクエストの割合"""
+        with self._lock:
+            return self.stats["served"] / self.stats["total"] if self.stats["total"] else 0.0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["served_ratio"] = stats["served"] / stats["total"] if stats["total"] else 0.0
+        return stats
+
+    def _targets(self, intent: str) -> Optional[Set[int]]:
+        target = INTENT_TARGETS.get(intent)
+        if target is None:
+            return None
+        ids = {i for group in target["groups"] for i in self.index.by_group.get(group, ())}
+        ids |= {i for category in target["categories"] for i in self.index.by_category.get(category, ())}
+        return ids
+
+    def _render(self, request: str, weather_info: Dict, tenants: List[Tenant], requested: Optional[str] = None) -> str:
+        weather_label = weather_info.get("description") or WEATHER_LABELS.get(weather_info.get("weather"), "")
+        lines = [
+            f"【クイックレコメンド】（天気: {weather_label} / 気温: {weather_info.get('temperature')}°C）",
+            f"ご要望「{request}」に合わせて、竹芝ポートシティのおすすめをご案内します。",
+            "",
+        ]
+        for rank, tenant in enumerate(tenants, start=1):
+            lines.append(f"{rank}. {tenant.name}（{tenant.floor}・{tenant.category}）")
+            lines.append(f"   {tenant.description}")
+        lines.append("")
+        basis = f"ご要望の天気（{WEATHER_LABELS.get(requested, requested)}）" if requested else "今日の天気"
+        lines.append(f"{basis}に合う施設を優先して選んでいます。より詳しいプランをご希望の場合は、専門エージェントの会議もご利用ください。")
+        return "\n".join(lines)
+
+# 全システムで共有するインスタンス
+FAST_PATH = FastPathRecommender(threshold=float(os.getenv("FAST_PATH_THRESHOLD", "0.75")))
@@ -0,0 +1,273 @@
+"""GroupChatの会話履歴を要点に圧縮し、1回のLLM呼び出しあたりのトークン数を予算内に収める"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+from utils.tenant_context import find_tenant_block, tenant_names_in
+
+if TYPE_CHECKING:
+    from autogen import ConversableAgent
+
+# 箇条書き・番号付きの行を「プランの項目」とみなす
+_PLAN_ITEM = re.compile(r"^\s*(?:[-*・•●◆■]|\d+[.)．）]|[①-⑳])\s*(.+)$")
+
+# メッセージごとのロール・名前などの固定分
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# テナント一覧を切り詰めたときの目印
+TRUNCATED_MARK = "（以下のテナントは省略）\n"
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # 符号化表を取得できない環境では概算で数える
+        return None
+
+def estimate_tokens(text: str) -> int:
+    """テキストのトークン数（tiktoken が使えなければ ASCII 4文字=1、それ以外1文字=1 で概算）"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+class TenantNameMatcher:
+    """発言中に出てくるテナント名を探す
+
+    発言の各位置から、テナント名にある長さの文字列だけを切り出して集合で引く
+    （手間は発言の長さ×名前の長さの種類に比例し、テナント数にはよらない）。
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._names = {name for name in names if name}
+        # 同じ位置から始まる名前は長いものを先に照合する
+        self._lengths = sorted({len(name) for name in self._names}, reverse=True)
+
+    def find(self, content: str) -> List[str]:
+        """content に含まれるテナント名（出てきた順）"""
+        found: Dict[str, None] = {}
+        for i in range(len(content)):
+            for length in self._lengths:
+                candidate = content[i:i + length]
+                if len(candidate) == length and candidate in self._names:
+                    found.setdefault(candidate)
+        return list(found)
+
+def message_tokens(messages: List[Dict]) -> int:
+    """メッセージ列のプロンプトトークン数"""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        total += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content if isinstance(content, str) else "")
+    return total
+
+class HistoryCompactor:
+    """autogen の MessageTransform として、LLMに渡す直前の会話履歴を圧縮する
+
+    - 最初のメッセージ（天気・要望・テナント一覧などの固定コンテキスト）はそのまま1回だけ残す
+    - 直近 keep_recent 件の発言はそのまま残す
+    - それより古い発言は「言及したテナント」と「プランの項目」の抜粋に置き換える
+      （テナント名の既定は、固定コンテキストのテナント一覧に載っているテナント）
+    - それでも token_budget を超える場合は古い抜粋から削り、最後に固定コンテキスト中のテナント一覧を末尾から削る
+      （天気・要望・議論の指示は削らない）
+    """
+
+    def __init__(
+        self,
+        tenant_names: Optional[Iterable[str]] = None,
+        token_budget: int = 6000,
+        keep_recent: int = 2,
+        max_plan_items: int = 5,
+        max_item_chars: int = 60,
+        max_summaries: int = 256,
+    ):
+        self.tenant_names = TenantNameMatcher(tenant_names) if tenant_names is not None else None
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.max_plan_items = max_plan_items
+        self.max_item_chars = max_item_chars
+        self._lock = threading.Lock()
+        self._calls: List[Tuple[int, int]] = []
+        self.max_summaries = max_summaries
+        # 発言内容 -> 抜粋（古いものから捨てるLRU）
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        # 直近の固定コンテキストとそのテナント一覧から作った照合器
+        self._context_names: Optional[Tuple[str, TenantNameMatcher]] = None
+
+    def apply_transform(self, messages: List[Dict]) -> List[Dict]:
+        before = message_tokens(messages)
+        compacted = self._compact(messages)
+        with self._lock:
+            self._calls.append((before, message_tokens(compacted)))
+        return compacted
+
+    def get_logs(self, pre_transform_messages: List[Dict], post_transform_messages: List[Dict]) -> Tuple[str, bool]:
+        before, after = message_tokens(pre_transform_messages), message_tokens(post_transform_messages)
+        if after < before:
+            return f"会話履歴を圧縮しました: {before} → {after} トークン", True
+        return "会話履歴は圧縮されませんでした", False
+
+    def attach(self, agents: Iterable[ConversableAgent]):
+        """エージェントの圧縮処理をこのインスタンスにする
+
+        フックの登録はエージェントごとに一度だけ行い、呼び出し時点で割り当てられている圧縮処理に委ねる
+        （プールで使い回すエージェントが別のシステムに貸し出されても、フックが重複しない）。
+        """
+        from autogen.agentchat.contrib.capabilities.transform_messages import TransformMessages
+
+        for agent in agents:
+            if getattr(agent, "_history_compactor", None) is None:
+                TransformMessages(transforms=[_AssignedCompactor(agent)], verbose=False).add_to_agent(agent)
+            agent._history_compactor = self
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls.clear()
+
+    def get_stats(self) -> Dict:
+        """LLM呼び出しごとの圧縮前後のプロンプトトークン数"""
+        with self._lock:
+            calls = list(self._calls)
+        before = sum(b for b, _ in calls)
+        after = sum(a for _, a in calls)
+        return {
+            "calls": len(calls),
+            "per_call": [{"before": b, "after": a} for b, a in calls],
+            "prompt_tokens_before": before,
+            "prompt_tokens_after": after,
+            "reduction": 1 - after / before if before else 0.0,
+        }
+
+    def summarize(self, message: Dict, tenant_names: Optional[TenantNameMatcher] = None) -> str:
+        """発言を、言及したテナントとプランの項目の抜粋に置き換えた文字列"""
+        content = message.get("content") or ""
+        with self._lock:
+            cached = self._summaries.get(content)
+            if cached is not None:
+                self._summaries.move_to_end(content)
+                return cached
+
+        matcher = tenant_names or self.tenant_names
+        tenants = matcher.find(content) if matcher is not None else []
+        items = []
+        for line in content.splitlines():
+            match = _PLAN_ITEM.match(line)
+            if match:
+                items.append(match.group(1).strip()[:self.max_item_chars])
+            if len(items) >= self.max_plan_items:
+                break
+        if not items:
+            # 箇条書きがなければ冒頭の一文を残す
+            first = content.strip().split("\n", 1)[0]
+            items = [first[:self.max_item_chars]] if first else []
+
+        lines = [f"【{message.get('name') or message.get('role')}の発言の要点】"]
+        if tenants:
+            lines.append(f"言及したテナント: {'、'.join(tenants)}")
+        lines.extend(f"- {item}" for item in items)
+        summary = "\n".join(lines)
+        with self._lock:
+            self._summaries[content] = summary
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def _names_for(self, first: Dict) -> Optional[TenantNameMatcher]:
+        """抜粋で照合するテナント名（指定がなければ固定コンテキストのテナント一覧から作る）"""
+        if self.tenant_names is not None:
+            return self.tenant_names
+        content = first.get("content")
+        if not isinstance(content, str):
+            return None
+        context = self._context_names
+        if context is None or context[0] != content:
+            context = (content, TenantNameMatcher(tenant_names_in(content)))
+            with self._lock:
+                # テナント一覧が変わったら、以前の一覧で作った抜粋は使わない
+                self._summaries.clear()
+                self._context_names = context
+        return context[1]
+
+    def _compact(self, messages: List[Dict]) -> List[Dict]:
+        if len(messages) <= self.keep_recent + 1:
+            return self._fit_static(messages)
+
+        split = len(messages) - self.keep_recent
+        head, middle, recent = messages[:1], messages[1:split], messages[split:]
+        names = self._names_for(head[0])
+        summaries = [
+            dict(message, content=self.summarize(message, names)) if isinstance(message.get("content"), str) else message
+            for message in middle
+        ]
+        compacted = head + summaries + recent
+
+        # 予算を超える場合は古い抜粋から削る
+        while message_tokens(compacted) > self.token_budget and summaries:
+            summaries.pop(0)
+            compacted = head + summaries + recent
+        return self._fit_static(compacted)
+
+    def _fit_static(self, messages: List[Dict]) -> List[Dict]:
+        # 固定コンテキストのうちテナント一覧だけを末尾のテナントから削って予算に収める
+        overflow = message_tokens(messages) - self.token_budget
+        first = messages[0] if messages else None
+        if overflow <= 0 or first is None or not isinstance(first.get("content"), str):
+            return messages
+        content = first["content"]
+        span = find_tenant_block(content)
+        if span is None:
+            return messages
+        rest = messages[1:]
+        head, tail = content[:span[0]], content[span[1]:]
+        lines = content[span[0]:span[1]].splitlines(keepends=True)
+        # テナント名と説明の行の間や、カテゴリ見出しの直後では切らない
+        cuts = [
+            i for i, line in enumerate(lines)
+            if not line.startswith("  ") and not (i and lines[i - 1].startswith("【"))
+        ] + [len(lines)]
+
+        def fitted(cut: int) -> List[Dict]:
+            kept = "".join(lines[:cut]) + (TRUNCATED_MARK if cut < len(lines) else "")
+            return [dict(first, content=head + kept + tail)] + rest
+
+        # 予算に収まる最大の切り位置を二分探索（全て削っても超える場合はテナント一覧なしで返す）
+        low, high = 0, len(cuts) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if message_tokens(fitted(cuts[middle])) <= self.token_budget:
+                low = middle
+            else:
+                high = middle - 1
+        return fitted(cuts[low])
+
+class _AssignedCompactor:
+    """エージェントに現在割り当てられている HistoryCompactor に処理を委ねる MessageTransform"""
+
+    def __init__(self, agent: ConversableAgent):
+        self.agent = agent
+
+    def apply_transform(self, messages: List[Dict]) -> List[Dict]:
+        return self.agent._history_compactor.apply_transform(messages)
+
+    def get_logs(self, pre_transform_messages: List[Dict], post_transform_messages: List[Dict]) -> Tuple[str, bool]:
+        return self.agent._history_compactor.get_logs(pre_transform_messages, post_transform_messages)
+
+def create_history_compactor(tenant_names: Optional[Iterable[str]] = None) -> Optional[HistoryCompactor]:
+    """環境変数の設定から圧縮処理を作成（HISTORY_COMPACTION=0 で無効、テナント名の既定は固定コンテキストのテナント一覧）"""
+    if os.getenv("HISTORY_COMPACTION", "1") != "1":
+        return None
+    return HistoryCompactor(
+        tenant_names=tenant_names,
+        token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "6000")),
+        keep_recent=int(os.getenv("HISTORY_KEEP_RECENT", "2")),
+    )
@@ -0,0 +1,260 @@
+"""エージェントごとのLLM呼び出しの計測（トークン数・所要時間・最初のトークンまでの時間・キャッシュヒット）
+
+OpenAIWrapper.create をラップし、DiscussionRecorder.activate() の中で行われた全てのLLM呼び出し
+（各エージェントとGroupChatManagerのスピーカー選択）を記録する。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from autogen import GroupChat
+
+# スピーカー選択中のLLM呼び出しをまとめる名前
+SPEAKER_SELECTION = "(スピーカー選択)"
+
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+_current_recorder: ContextVar[Optional["DiscussionRecorder"]] = ContextVar("discussion_recorder", default=None)
+_in_selection: ContextVar[bool] = ContextVar("in_speaker_selection", default=False)
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """線形補間によるパーセンタイル（q は 0〜100）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class _FirstTokenProbe:
+    """LLM呼び出し中だけ IOStream を差し替え、ストリーミングの最初のチャンクの時刻を記録する"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.first_token_at: Optional[float] = None
+
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        if self.first_token_at is None and end == "" and _ANSI_ESCAPE.sub("", sep.join(str(obj) for obj in objects)):
+            self.first_token_at = time.perf_counter()
+        self.inner.print(*objects, sep=sep, end=end, flush=flush)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return self.inner.input(prompt, password=password)
+
+class DiscussionRecorder:
+    """1回の議論で行われたLLM呼び出しとスピーカー選択の記録"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.discussion_id = uuid.uuid4().hex[:12]
+        self.calls: List[Dict] = []
+        self.selection_count = 0
+        self.selection_seconds = 0.0
+        self.started_at: Optional[float] = None
+        self.elapsed: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """with ブロック内のLLM呼び出しをこの議論の記録とする"""
+        install()
+        token = _current_recorder.set(self)
+        self.started_at = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.elapsed = time.perf_counter() - self.started_at
+            _current_recorder.reset(token)
+
+    def record_call(self, record: Dict):
+        with self._lock:
+            self.calls.append(record)
+
+    def record_selection(self, seconds: float):
+        with self._lock:
+            self.selection_count += 1
+            self.selection_seconds += seconds
+
+    def summary(self) -> Dict:
+        """エージェント別の内訳を含む議論のまとめ"""
+        with self._lock:
+            calls = list(self.calls)
+        agents: Dict[str, Dict] = defaultdict(lambda: {
+            "calls": 0, "cache_hits": 0, "seconds": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "ttft": [],
+        })
+        for call in calls:
+            entry = agents[call["agent"]]
+            entry["calls"] += 1
+            entry["cache_hits"] += int(call["cache_hit"])
+            entry["seconds"] += call["latency"]
+            entry["prompt_tokens"] += call["prompt_tokens"]
+            entry["completion_tokens"] += call["completion_tokens"]
+            entry["cost"] += call["cost"]
+            entry["ttft"].append(call["ttft"])
+        for entry in agents.values():
+            ttfts = entry.pop("ttft")
+            entry["avg_ttft"] = round(sum(ttfts) / len(ttfts), 3) if ttfts else None
+            entry["seconds"] = round(entry["seconds"], 3)
+
+        selection = agents.get(SPEAKER_SELECTION, {})
+        return {
+            "discussion_id": self.discussion_id,
+            "mode": self.mode,
+            "elapsed": round(self.elapsed, 3) if self.elapsed is not None else None,
+            "llm_calls": len(calls),
+            "cache_hits": sum(int(call["cache_hit"]) for call in calls),
+            "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in calls),
+            "cost": sum(call["cost"] for call in calls),
+            "speaker_selection": {
+                "count": self.selection_count,
+                "seconds": round(self.selection_seconds, 3),
+                "llm_calls": selection.get("calls", 0),
+            },
+            "agents": dict(agents),
+        }
+
+    def format_breakdown(self) -> str:
+        """エージェント別の所要時間の表示用テキスト"""
+        summary = self.summary()
+        rows = sorted(summary["agents"].items(), key=lambda item: -item[1]["seconds"])
+        lines = [f"LLM呼び出し: {summary['llm_calls']}回（キャッシュヒット {summary['cache_hits']}回） / 合計 {summary['elapsed']}秒"]
+        for name, entry in rows:
+            lines.append(
+                f"  {name}: {entry['seconds']:.2f}秒 / {entry['calls']}回 / "
+                f"入力 {entry['prompt_tokens']} + 出力 {entry['completion_tokens']} トークン"
+            )
+        return "\n".join(lines)
+
+class MetricsRegistry:
+    """全議論の集計（Prometheus形式の出力）とJSON Linesへの書き出し"""
+
+    def __init__(self, jsonl_path: Optional[str] = None):
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self.counters: Dict[tuple, float] = defaultdict(float)
+        self.discussions: Dict[str, int] = defaultdict(int)
+
+    def record(self, recorder: DiscussionRecorder):
+        """議論の記録を集計に加え、設定されていればJSON Linesに追記"""
+        summary = recorder.summary()
+        with self._lock:
+            self.discussions[recorder.mode] += 1
+            for call in recorder.calls:
+                labels = (recorder.mode, call["agent"])
+                self.counters[("llm_calls_total",) + labels] += 1
+                self.counters[("llm_cache_hits_total",) + labels] += int(call["cache_hit"])
+                self.counters[("llm_seconds_total",) + labels] += call["latency"]
+                self.counters[("llm_prompt_tokens_total",) + labels] += call["prompt_tokens"]
+                self.counters[("llm_completion_tokens_total",) + labels] += call["completion_tokens"]
+                self.counters[("llm_cost_total",) + labels] += call["cost"]
+            self.counters[("speaker_selection_seconds_total", recorder.mode, "")] += recorder.selection_seconds
+            self.counters[("speaker_selection_total", recorder.mode, "")] += recorder.selection_count
+        if self.jsonl_path:
+            self.export_jsonl(recorder, self.jsonl_path)
+        return summary
+
+    def export_jsonl(self, recorder: DiscussionRecorder, path: str):
+        """各LLM呼び出しと議論のまとめを1行1件のJSONで追記"""
+        with self._lock, open(path, "a", encoding="utf-8") as f:
+            for call in recorder.calls:
+                f.write(json.dumps({"type": "llm_call", "discussion_id": recorder.discussion_id, "mode": recorder.mode, **call}, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"type": "discussion", **recorder.summary()}, ensure_ascii=False) + "\n")
+
+    def to_prometheus(self) -> str:
+        """Prometheus のテキスト形式"""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            discussions = sorted(self.discussions.items())
+        current = None
+        for (name, mode, agent), value in counters:
+            if name != current:
+                lines.append(f"# TYPE takeshiba_{name} counter")
+                current = name
+            labels = f'mode="{mode}"' + (f',agent="{_escape_label(agent)}"' if agent else "")
+            lines.append(f"takeshiba_{name}{{{labels}}} {value:g}")
+        lines.append("# TYPE takeshiba_discussions_total counter")
+        for mode, count in discussions:
+            lines.append(f'takeshiba_discussions_total{{mode="{mode}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def track_speaker_selection(groupchat: GroupChat):
+    """実行中の議論の記録に、このGroupChatのスピーカー選択の回数と所要時間を加える"""
+    select_speaker = groupchat.select_speaker
+
+    def timed_select_speaker(last_speaker, selector):
+        recorder = _current_recorder.get()
+        token = _in_selection.set(True)
+        started = time.perf_counter()
+        try:
+            return select_speaker(last_speaker, selector)
+        finally:
+            _in_selection.reset(token)
+            if recorder is not None:
+                recorder.record_selection(time.perf_counter() - started)
+
+    groupchat.select_speaker = timed_select_speaker
+
+_install_lock = threading.Lock()
+
+def install():
+    """OpenAIWrapper.create に計測処理を組み込む（一度だけ）"""
+    from autogen import OpenAIWrapper
+    from autogen.io import IOStream
+
+    with _install_lock:
+        if getattr(OpenAIWrapper.create, "_instrumented", False):
+            return
+        original_create = OpenAIWrapper.create
+
+        def create(self, **config):
+            recorder = _current_recorder.get()
+            if recorder is None:
+                return original_create(self, **config)
+
+            agent = config.get("agent")
+            name = SPEAKER_SELECTION if _in_selection.get() else getattr(agent, "name", "unknown")
+            usage_before = dict(self.actual_usage_summary or {})
+            probe = _FirstTokenProbe(IOStream.get_default())
+            started = time.perf_counter()
+            with IOStream.set_default(probe):
+                response = original_create(self, **config)
+            latency = time.perf_counter() - started
+
+            usage = getattr(response, "usage", None)
+            recorder.record_call({
+                "agent": name,
+                "latency": round(latency, 4),
+                # ストリーミングでなければ応答全体が届いた時点が最初のトークン
+                "ttft": round((probe.first_token_at or started + latency) - started, 4),
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+                "cost": getattr(response, "cost", 0) or 0,
+                # キャッシュから返した応答では実際の利用量が増えない
+                "cache_hit": dict(self.actual_usage_summary or {}) == usage_before,
+                "ts": time.time(),
+            })
+            return response
+
+        create._instrumented = True
+        OpenAIWrapper.create = create
+
+# 全システムで共有する集計（METRICS_JSONL_PATH を設定すると議論ごとに追記）
+METRICS = MetricsRegistry(jsonl_path=os.getenv("METRICS_JSONL_PATH") or None)
@@ -0,0 +1,50 @@
+"""要望文のキーワードによる簡易意図分類（LLM不要）"""
+
+import unicodedata
+from typing import Dict, FrozenSet, List
+
+# 意図ごとのキーワード
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "gourmet": [
+        "ランチ", "ディナー", "食事", "食べ", "グルメ", "レストラン", "カフェ", "コーヒー",
+        "ラーメン", "和食", "フレンチ", "海鮮", "美味しい", "おいしい", "ごはん", "スイーツ", "飲み",
+    ],
+    "shopping": [
+        "ショッピング", "買い物", "買いたい", "服", "ファッション", "雑貨", "お土産", "ギフト",
+        "プレゼント", "スポーツ用品", "アウトドア", "本屋", "書店",
+    ],
+    "entertainment": [
+        "映画", "ゲーム", "エンタメ", "エンターテイメント", "遊び", "遊ぶ", "アミューズメント",
+        "体験", "イベント", "展望", "観光", "景色", "絶景",
+    ],
+    "relaxation": [
+        "ゆっくり", "のんびり", "リラックス", "癒し", "癒され", "休憩", "くつろ", "静か", "読書", "落ち着",
+    ],
+    "weather": [
+        "雨", "晴れ", "天気", "寒い", "暑い", "曇り", "雪", "屋内", "屋外",
+    ],
+}
+
+def normalize_request(text: str) -> str:
+    """全角・半角や大文字小文字の揺れを吸収"""
+    return unicodedata.normalize("NFKC", text or "").lower().strip()
+
+def classify_intent(text: str) -> Dict[str, int]:
+    """意図ごとのキーワード一致数（一致のない意図は含めない）"""
+    text = normalize_request(text)
+    scores: Dict[str, int] = {}
+    for intent, keywords in INTENT_KEYWORDS.items():
+        hits = sum(1 for keyword in keywords if keyword in text)
+        if hits:
+            scores[intent] = hits
+    return scores
+
+def request_keywords(text: str) -> FrozenSet[str]:
+    """要望文に含まれる意図キーワードの集合"""
+    text = normalize_request(text)
+    return frozenset(keyword for keywords in INTENT_KEYWORDS.values() for keyword in keywords if keyword in text)
+
+def primary_intents(text: str) -> List[str]:
+    """一致数の多い順に意図を並べたリスト"""
+    scores = classify_intent(text)
+    return sorted(scores, key=lambda intent: -scores[intent])
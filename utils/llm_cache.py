@@ -0,0 +1,211 @@
+"""全エージェントで共有するLLMレスポンスのディスクキャッシュ"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# autogen 既定のディスクキャッシュ（.cache/{cache_seed}）は使わず、キャッシュは LLM_CACHE に一本化する
+# （llm_config の cache_seed に設定。LLM_CACHE_ENABLED=0 で全てのキャッシュが無効になる）
+AUTOGEN_CACHE_SEED = None
+
+# 既定の保存先（実行時のカレントディレクトリではなく data ディレクトリ）
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", ".llm_cache.sqlite3"
+)
+
+# autogen が応答に後から付ける実行時の属性（保存しない）
+RUNTIME_ATTRIBUTES = {"message_retrieval_function", "config_id", "pass_filter"}
+
+# ヒット時の最終アクセス時刻は、この件数たまるか書き込み時にまとめて反映する
+TOUCH_BATCH_SIZE = 64
+
+# キャッシュキーに含める生成パラメータ（それ以外はレスポンスに影響しないものとして無視）
+KEY_PARAMS = ("model", "temperature", "top_p", "max_tokens", "seed", "response_format", "tools", "functions")
+
+def _normalize_content(content: Any) -> Any:
+    # 空白の揺れ（改行・インデント・末尾の空白）でキャッシュを外さない
+    if isinstance(content, str):
+        return " ".join(content.split())
+    if isinstance(content, list):
+        return [_normalize_content(part) for part in content]
+    if isinstance(content, dict):
+        return {k: _normalize_content(v) for k, v in sorted(content.items())}
+    return content
+
+def encode_response(value: Any) -> Optional[str]:
+    """応答をJSON文字列に変換（ChatCompletion は pydantic のダンプ、JSONにできない値は None）"""
+    if hasattr(value, "model_dump"):
+        data = value.model_dump(mode="json", exclude=RUNTIME_ATTRIBUTES)
+        return json.dumps({"type": "chat_completion", "data": data}, ensure_ascii=False)
+    try:
+        return json.dumps({"type": "json", "data": value}, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+
+def decode_response(text: str) -> Any:
+    """encode_response の逆変換（JSONのみを扱い、保存内容でコードが実行されることはない）"""
+    payload = json.loads(text)
+    if payload["type"] == "chat_completion":
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(payload["data"])
+    return payload["data"]
+
+def normalized_key(raw_key: str) -> str:
+    """autogen が生成したキー（リクエストパラメータのJSON）を正規化してハッシュ化"""
+    try:
+        params = json.loads(raw_key)
+    except (TypeError, ValueError):
+        return hashlib.sha256(str(raw_key).encode("utf-8")).hexdigest()
+
+    messages = [
+        {
+            "role": message.get("role"),
+            "name": message.get("name"),
+            "content": _normalize_content(message.get("content")),
+        }
+        for message in params.get("messages", [])
+    ]
+    payload = {"messages": messages, **{k: params[k] for k in KEY_PARAMS if k in params}}
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """autogen の AbstractCache プロトコル互換の、件数上限付きLRUディスクキャッシュ（SQLite）
+
+    initiate_chat(..., cache=LLM_CACHE) で渡すと、GroupChat内の全エージェントが共有する。
+    ヒットのたびにコミット（fsync）して並行する議論を直列化しないよう、最終アクセス時刻の更新はまとめて書き込む。
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # 未反映の最終アクセス時刻（キー -> 時刻）
+        self._touched: Dict[str, float] = {}
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        digest = normalized_key(key)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (digest,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return default
+            self._touched[digest] = time.time()
+            if len(self._touched) >= TOUCH_BATCH_SIZE:
+                self._flush_touched(conn)
+                conn.commit()
+            self.stats["hits"] += 1
+        try:
+            return decode_response(row[0])
+        except Exception:
+            # 壊れたエントリはミス扱い
+            return default
+
+    def set(self, key: str, value: Any) -> None:
+        digest = normalized_key(key)
+        encoded = encode_response(value)
+        if encoded is None:
+            # JSONにできない応答はキャッシュしない
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, last_access) VALUES (?, ?, ?)",
+                (digest, encoded, time.time()),
+            )
+            self.stats["writes"] += 1
+            self._touched.pop(digest, None)
+            self._flush_touched(conn)
+            self._evict(conn)
+            conn.commit()
+
+    def close(self) -> None:
+        # autogen は呼び出しごとに with で開閉するため、共有接続はここでは閉じない
+        pass
+
+    def shutdown(self):
+        """接続を閉じる"""
+        with self._lock:
+            if self._conn is not None:
+                self._flush_touched(self._conn)
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    def clear(self):
+        """全エントリを削除"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+            self._touched.clear()
+
+    def __enter__(self) -> "LLMResponseCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def get_stats(self) -> Dict:
+        """ヒット率などの統計を取得"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # WAL では読み取りが書き込みを待たず、synchronous=NORMAL ではコミットごとの fsync を省ける
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        return self._conn
+
+    def _flush_touched(self, conn: sqlite3.Connection):
+        # ためておいた最終アクセス時刻を書き込む（コミットは呼び出し元で行う）
+        if self._touched:
+            conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self, conn: sqlite3.Connection):
+        # 上限を超えた分を最終アクセスの古い順に削除
+        count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.stats["evictions"] += overflow
+
+def create_llm_cache() -> Optional[LLMResponseCache]:
+    """環境変数の設定からキャッシュを作成（LLM_CACHE_ENABLED=0 で無効）"""
+    if os.getenv("LLM_CACHE_ENABLED", "1") != "1":
+        return None
+    return LLMResponseCache(
+        path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+    )
+
+# 全モジュールで共有するインスタンス
+LLM_CACHE = create_llm_cache()
+
+def llm_temperature(default: float = 0.7) -> float:
+    """決定的モード（LLM_DETERMINISTIC=1）では temperature を0にし、同じプロンプトに同じ応答を返す"""
+    return 0.0 if os.getenv("LLM_DETERMINISTIC", "0") == "1" else default
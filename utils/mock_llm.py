@@ -0,0 +1,306 @@
+"""オフライン負荷試験用の、OpenAI互換のモックLLMサーバー
+
+config_list の base_url をこのサーバーに向けると、APIキーやネットワークなしで全システムを最後まで実行できる。
+- 応答の遅延（平均・ばらつき）と生成速度（トークン/秒）を設定できる
+- スピーカー選択の依頼には候補の中からエージェント名を返す
+- システムメッセージで TERMINATE を求められたエージェントは、発言の最後に TERMINATE を付ける
+- スクリプト（キーワード -> 応答のリスト）で応答内容を指定できる
+
+単体で起動する場合: python -m utils.mock_llm --port 8000 --latency 0.5
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# スピーカー選択の依頼文（autogen の GroupChat.select_speaker_prompt_template）
+_SELECT_SPEAKER = re.compile(r"select the next role from \[(.*?)\]", re.DOTALL)
+# テナント一覧の行（utils.tenant_context の「- 名前 (フロア)」）
+_TENANT_LINE = re.compile(r"^- (.+?) \([^()\n]+\)", re.MULTILINE)
+
+def count_tokens(text: str) -> int:
+    """ASCII 4文字=1、それ以外1文字=1 の概算トークン数"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+class MockLLMServer:
+    """スレッドで動く OpenAI 互換の /v1/chat/completions サーバー"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.2,
+        jitter: float = 0.05,
+        tokens_per_second: float = 200.0,
+        response_chars: int = 240,
+        script: Optional[Dict[str, List[str]]] = None,
+        seed: int = 0,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.response_chars = response_chars
+        self.script = script or {}
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._script_positions: Dict[str, int] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.stats = {"requests": 0, "selection_requests": 0, "streamed": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        """バックグラウンドのスレッドで待ち受けを開始"""
+        if self._server is None:
+            self._server = ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+            self._server.daemon_threads = True
+            self.port = self._server.server_port
+            threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def serve_forever(self):
+        """フォアグラウンドで待ち受け（単体起動用）"""
+        self._server = ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+        self.port = self._server.server_port
+        print(f"モックLLMサーバーを起動しました: {self.base_url}")
+        self._server.serve_forever()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def complete(self, body: Dict) -> Dict:
+        """リクエストに対する応答内容と使用量（遅延は含まない）"""
+        messages = body.get("messages", [])
+        prompt_text = "\n".join(m.get("content") or "" for m in messages if isinstance(m.get("content"), str))
+        content, is_selection = self._respond(messages, prompt_text)
+        usage = {
+            "prompt_tokens": count_tokens(prompt_text),
+            "completion_tokens": count_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["selection_requests"] += int(is_selection)
+            self.stats["streamed"] += int(bool(body.get("stream")))
+            self.stats["prompt_tokens"] += usage["prompt_tokens"]
+            self.stats["completion_tokens"] += usage["completion_tokens"]
+        return {"content": content, "usage": usage}
+
+    def sample_latency(self) -> float:
+        """最初のトークンまでの遅延（正規分布、0未満は0）"""
+        with self._lock:
+            return max(0.0, self._rng.gauss(self.latency, self.jitter))
+
+    def _respond(self, messages: List[Dict], prompt_text: str):
+        match = _SELECT_SPEAKER.search(prompt_text)
+        if match:
+            return self._select_speaker(messages, match.group(1)), True
+
+        system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+        scripted = self._scripted(system)
+        if scripted is not None:
+            return scripted, False
+
+        content = self._generate(messages, prompt_text)
+        if "TERMINATE" in system:
+            content += "\n\nTERMINATE"
+        return content, False
+
+    def _select_speaker(self, messages: List[Dict], roles: str) -> str:
+        # これまでの発言数で候補を順番に選ぶ（同じ会話には同じ名前を返す）
+        names = [name.strip() for name in roles.split(",") if name.strip()]
+        turns = sum(1 for m in messages if m.get("role") in ("user", "assistant") and m.get("name"))
+        return names[turns % len(names)] if names else ""
+
+    def _scripted(self, system: str) -> Optional[str]:
+        for keyword, responses in self.script.items():
+            if keyword != "default" and keyword in system and responses:
+                return self._next_scripted(keyword, responses)
+        if self.script.get("default"):
+            return self._next_scripted("default", self.script["default"])
+        return None
+
+    def _next_scripted(self, keyword: str, responses: List[str]) -> str:
+        with self._lock:
+            position = self._script_positions.get(keyword, 0)
+            self._script_positions[keyword] = position + 1
+        return responses[position % len(responses)]
+
+    def _generate(self, messages: List[Dict], prompt_text: str) -> str:
+        # プロンプトから決まる乱数で、テナント名を含む箇条書きの提案を作る（同じプロンプトには同じ応答）
+        digest = hashlib.sha256(f"{self.seed}\x1f{prompt_text}".encode("utf-8")).digest()
+        rng = random.Random(int.from_bytes(digest[:8], "big"))
+        tenants = _TENANT_LINE.findall(prompt_text) or ["竹芝ポートシティ"]
+        lines = ["ご要望と天気を踏まえて、次のプランを提案します。"]
+        while sum(len(line) for line in lines) < self.response_chars:
+            tenant = rng.choice(tenants)
+            minutes = rng.choice([30, 45, 60, 90])
+            lines.append(f"- {tenant}で{minutes}分ほど過ごす（{rng.choice(['屋内で快適', '混雑が少ない時間帯', '天気に左右されない', '休憩にも最適'])}）")
+        return "\n".join(lines)
+
+def _handler_for(server: MockLLMServer):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("/health", "/v1/health"):
+                self._send_json(200, {"status": "ok", **server.get_stats()})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "invalid JSON"}})
+                return
+
+            result = server.complete(body)
+            time.sleep(server.sample_latency())
+            model = body.get("model", "mock")
+            if body.get("stream"):
+                self._stream(model, result["content"])
+            else:
+                # 生成速度に応じた時間をかけて応答全体を返す
+                time.sleep(result["usage"]["completion_tokens"] / server.tokens_per_second)
+                self._send_json(200, {
+                    "id": f"chatcmpl-mock-{time.time_ns()}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": result["content"]},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": result["usage"],
+                })
+
+        def _stream(self, model: str, content: str):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            chunk_chars = 4
+            for i in range(0, len(content), chunk_chars):
+                piece = content[i:i + chunk_chars]
+                self._write_event(model, {"content": piece}, None)
+                time.sleep(count_tokens(piece) / server.tokens_per_second)
+            self._write_event(model, {}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _write_event(self, model: str, delta: Dict, finish_reason: Optional[str]):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: Dict):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+def load_script(path: Optional[str]) -> Optional[Dict[str, List[str]]]:
+    """応答スクリプト（{"キーワード": ["応答", ...], "default": [...]} のJSON）を読み込み"""
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def create_mock_server_from_env() -> MockLLMServer:
+    """環境変数（MOCK_LLM_*）の設定からサーバーを作成"""
+    return MockLLMServer(
+        latency=float(os.getenv("MOCK_LLM_LATENCY", "0.2")),
+        jitter=float(os.getenv("MOCK_LLM_JITTER", "0.05")),
+        tokens_per_second=float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "200")),
+        script=load_script(os.getenv("MOCK_LLM_SCRIPT")),
+        seed=int(os.getenv("MOCK_LLM_SEED", "0")),
+    )
+
+_shared_server: Optional[MockLLMServer] = None
+_shared_lock = threading.Lock()
+
+def get_mock_server() -> MockLLMServer:
+    """プロセス内で共有するモックサーバー（初回呼び出し時に起動）"""
+    global _shared_server
+    with _shared_lock:
+        if _shared_server is None:
+            _shared_server = create_mock_server_from_env().start()
+        return _shared_server
+
+def configure_llm_backend(config_list: List[Dict]) -> List[Dict]:
+    """MOCK_LLM=1 ならプロセス内のモックサーバーに、LLM_BASE_URL があればその接続先に向ける"""
+    if os.getenv("MOCK_LLM", "0") == "1":
+        base_url, api_key = get_mock_server().base_url, "mock-key"
+    elif os.getenv("LLM_BASE_URL"):
+        base_url, api_key = os.getenv("LLM_BASE_URL"), None
+    else:
+        return config_list
+    for config in config_list:
+        config["base_url"] = base_url
+        if api_key is not None or not config.get("api_key"):
+            config["api_key"] = api_key or "mock-key"
+    return config_list
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI互換のモックLLMサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=float(os.getenv("MOCK_LLM_LATENCY", "0.2")), help="最初のトークンまでの平均遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=float(os.getenv("MOCK_LLM_JITTER", "0.05")), help="遅延の標準偏差（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "200")))
+    parser.add_argument("--script", default=os.getenv("MOCK_LLM_SCRIPT"), help="応答スクリプトのJSONファイル")
+    parser.add_argument("--seed", type=int, default=int(os.getenv("MOCK_LLM_SEED", "0")))
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        script=load_script(args.script),
+        seed=args.seed,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nモックLLMサーバーを停止します。")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""並行して実行される議論ごとに標準出力を振り分ける
+
+各システムは議論の経過を print / autogen の IOStream で標準出力に書き出す。
+separate_outputs() の中では sys.stdout を振り分け用のラッパーに差し替え、
+set_context_output() で出力先を指定したコンテキスト（スレッドに copy_context で引き継いだものを含む）の
+書き込みだけをその出力先に送る。出力先を指定していないコンテキストの書き込みはそのまま標準出力へ送る。
+"""
+
+import contextvars
+import sys
+from contextlib import contextmanager
+from typing import Optional, TextIO
+
+_output: contextvars.ContextVar[Optional[TextIO]] = contextvars.ContextVar("context_output", default=None)
+
+class ContextOutput:
+    """sys.stdout の代わりに置き、書き込みを実行中のコンテキストの出力先に振り分ける"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def write(self, text):
+        return (_output.get() or self.stream).write(text)
+
+    def flush(self):
+        (_output.get() or self.stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def set_context_output(stream: Optional[TextIO]):
+    """現在のコンテキストの出力先を設定（None で標準出力に戻す）"""
+    _output.set(stream)
+
+@contextmanager
+def separate_outputs():
+    """with ブロック内では、コンテキストごとの出力先に振り分ける（入れ子にしても差し替えは一度だけ）"""
+    if isinstance(sys.stdout, ContextOutput):
+        yield
+        return
+    original = sys.stdout
+    sys.stdout = ContextOutput(original)
+    try:
+        yield
+    finally:
+        sys.stdout = original
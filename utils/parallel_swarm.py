@@ -0,0 +1,125 @@
+"""Swarmエージェントを並行実行し、統合役が一度だけまとめる並列Swarmエンジン"""
+
+from __future__ import annotations
+
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from autogen import Agent, ConversableAgent
+
+# (エージェント名, 発言内容) を受け取るコールバック
+TurnCallback = Callable[[str, Optional[str]], None]
+
+def _content(reply) -> Optional[str]:
+    if isinstance(reply, dict):
+        return reply.get("content")
+    return reply
+
+class ParallelSwarm:
+    """同じ依頼文を各エージェントに同時に送り、集まった提案を統合役エージェントに一度だけ渡す
+
+    GroupChat と違いスピーカー選択のLLM呼び出しがなく、所要時間はおおよそ
+    「最も遅いエージェントの1ターン + 統合の1ターン」になる。
+    """
+
+    def __init__(self, workers: Sequence[ConversableAgent], synthesizer: ConversableAgent, max_concurrency: int = 5):
+        self.workers = list(workers)
+        self.synthesizer = synthesizer
+        self.max_concurrency = max(1, max_concurrency)
+        self.stats: Dict = {}
+
+    def run(
+        self,
+        message: str,
+        sender: Agent,
+        cache=None,
+        on_turn_end: Optional[TurnCallback] = None,
+    ) -> List[Dict]:
+        """議論を実行し、GroupChat.messages と同じ形式の発言リスト（最後が統合提案）を返す"""
+        agents = self.workers + [self.synthesizer]
+        previous_caches = [agent.client_cache for agent in agents]
+        for agent in agents:
+            agent.client_cache = cache
+        try:
+            started = time.perf_counter()
+            proposals, errors, durations = self._fan_out(message, sender, on_turn_end)
+            fan_out_seconds = time.perf_counter() - started
+
+            if not proposals:
+                raise RuntimeError(f"全てのSwarmエージェントの提案生成に失敗しました: {errors}")
+
+            started = time.perf_counter()
+            synthesis = self._reply(self.synthesizer, self._synthesis_prompt(message, proposals), sender)
+            synthesis_seconds = time.perf_counter() - started
+            if on_turn_end:
+                on_turn_end(self.synthesizer.name, synthesis)
+        finally:
+            for agent, previous in zip(agents, previous_caches):
+                agent.client_cache = previous
+
+        self.stats = {
+            "fan_out_seconds": round(fan_out_seconds, 3),
+            "synthesis_seconds": round(synthesis_seconds, 3),
+            "agent_seconds": durations,
+            "errors": errors,
+        }
+
+        messages = [{"role": "user", "name": sender.name, "content": message}]
+        messages += [{"role": "assistant", "name": name, "content": content} for name, content in proposals.items()]
+        messages.append({"role": "assistant", "name": self.synthesizer.name, "content": synthesis})
+        return messages
+
+    def _fan_out(self, message: str, sender: Agent, on_turn_end: Optional[TurnCallback]):
+        results: Dict[str, Optional[str]] = {}
+        errors: Dict[str, str] = {}
+        durations: Dict[str, float] = {}
+
+        def run_worker(agent: ConversableAgent):
+            started = time.perf_counter()
+            content = self._reply(agent, message, sender)
+            # ストリーミングの発言区切りはスレッドごとなので、生成したスレッドで通知する
+            if on_turn_end:
+                on_turn_end(agent.name, content)
+            return content, time.perf_counter() - started
+
+        executor = ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(self.workers)), thread_name_prefix="swarm")
+        try:
+            # ストリーミング出力先（IOStream）などのコンテキストを各スレッドに引き継ぐ
+            futures = {
+                executor.submit(contextvars.copy_context().run, run_worker, agent): agent
+                for agent in self.workers
+            }
+            for future in as_completed(futures):
+                agent = futures[future]
+                try:
+                    content, seconds = future.result()
+                except Exception as e:
+                    errors[agent.name] = str(e)
+                    print(f"\n[Swarm] {agent.name} の提案生成に失敗しました: {e}")
+                    continue
+                durations[agent.name] = round(seconds, 3)
+                results[agent.name] = content
+                print(f"\n{agent.name}（{seconds:.1f}秒）:\n{content}\n" + "-" * 60)
+        finally:
+            executor.shutdown(wait=True)
+
+        # 完了順ではなくエージェントの定義順に並べる（統合プロンプトを毎回同じにしてキャッシュを効かせる）
+        proposals = {agent.name: results[agent.name] for agent in self.workers if results.get(agent.name)}
+        return proposals, errors, durations
+
+    def _reply(self, agent: ConversableAgent, content: str, sender: Agent) -> str:
+        reply = agent.generate_reply(messages=[{"role": "user", "content": content}], sender=sender)
+        return _content(reply) or ""
+
+    def _synthesis_prompt(self, message: str, proposals: Dict[str, str]) -> str:
+        sections = "\n\n".join(f"【{name}の提案】\n{content}" for name, content in proposals.items())
+        return f"""{message}
+
+===== 各Swarmエージェントの独立提案 =====
+{sections}
+
+上記の提案を統合し、ユーザーへの最終提案を作成してください。
+"""
@@ -0,0 +1,142 @@
+"""類似した要望に対して最終提案を再利用するセマンティックキャッシュ"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+from utils.intent import request_keywords
+from utils.tenant_context import tenant_data_version
+
+# 意味を変えない丁寧語・語尾（末尾のみ除去）
+_POLITE_SUFFIXES = ("をお願いします", "お願いします", "ください", "です", "ます")
+_SKIP_CHARS = re.compile(r"[\s\W_]+", re.UNICODE)
+
+def normalize_request_text(text: str) -> str:
+    """NFKC正規化し、記号・空白・末尾の丁寧語を除去"""
+    text = _SKIP_CHARS.sub("", unicodedata.normalize("NFKC", text or "").lower())
+    for suffix in _POLITE_SUFFIXES:
+        if text.endswith(suffix) and len(text) > len(suffix):
+            text = text[: -len(suffix)]
+            break
+    return text
+
+def char_trigrams(text: str) -> FrozenSet[str]:
+    """文字trigramの集合（3文字未満は全体を1要素とする）"""
+    if len(text) < 3:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """trigram集合のJaccard係数"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class RecommendationCache:
+    """(方式, 天気分類, 気温帯, テナントデータ版) ごとに最終提案を保持し、要望文の類似度で引き当てる
+
+    「和食のランチ」と「洋食のランチ」のように一語だけ違う要望も文字n-gramでは似てしまうため、
+    完全一致以外は意図キーワードがすべて一致し、類似度が閾値を超える場合に限って再利用する。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        ttl: float = 3600.0,
+        max_entries_per_partition: int = 200,
+        temperature_bucket: float = 5.0,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries_per_partition = max_entries_per_partition
+        self.temperature_bucket = temperature_bucket
+        # 区画 -> 正規化済み要望 -> (trigram集合, 意図キーワード, 提案, 保存時刻)
+        self._partitions: Dict[Tuple, "OrderedDict[str, Tuple[FrozenSet[str], FrozenSet[str], str, float]]"] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "exact_hits": 0, "misses": 0, "stores": 0}
+
+    def lookup(self, mode: str, request: str, weather_info: Dict) -> Optional[str]:
+        """意図キーワードが同じで、類似度が閾値を超える要望に対する提案があれば返す"""
+        partition_key = self._partition_key(mode, weather_info)
+        normalized = normalize_request_text(request)
+        grams = char_trigrams(normalized)
+        keywords = request_keywords(request)
+        now = time.monotonic()
+
+        with self._lock:
+            partition = self._partitions.get(partition_key)
+            if not partition:
+                self.stats["misses"] += 1
+                return None
+
+            exact = partition.get(normalized)
+            if exact is not None and now - exact[3] < self.ttl:
+                partition.move_to_end(normalized)
+                self.stats["hits"] += 1
+                self.stats["exact_hits"] += 1
+                return exact[2]
+
+            best_score, best_key = 0.0, None
+            for key, (entry_grams, entry_keywords, _, stored_at) in partition.items():
+                if now - stored_at >= self.ttl or entry_keywords != keywords:
+                    continue
+                score = similarity(grams, entry_grams)
+                if score > best_score:
+                    best_score, best_key = score, key
+
+            if best_key is None or best_score <= self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            partition.move_to_end(best_key)
+            self.stats["hits"] += 1
+            return partition[best_key][2]
+
+    def store(self, mode: str, request: str, weather_info: Dict, recommendation: str):
+        """最終提案を保存"""
+        partition_key = self._partition_key(mode, weather_info)
+        normalized = normalize_request_text(request)
+        with self._lock:
+            partition = self._partitions.get(partition_key)
+            if partition is None:
+                # テナントデータの版が古い区画は二度と引き当てられないので捨てる
+                for key in [key for key in self._partitions if key[3] != partition_key[3]]:
+                    del self._partitions[key]
+                partition = self._partitions[partition_key] = OrderedDict()
+            partition[normalized] = (char_trigrams(normalized), request_keywords(request), recommendation, time.monotonic())
+            partition.move_to_end(normalized)
+            while len(partition) > self.max_entries_per_partition:
+                partition.popitem(last=False)
+            self.stats["stores"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = sum(len(p) for p in self._partitions.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _partition_key(self, mode: str, weather_info: Dict) -> Tuple:
+        temperature = weather_info.get("temperature")
+        bucket = int(temperature // self.temperature_bucket) if isinstance(temperature, (int, float)) else None
+        return (mode, weather_info.get("weather"), bucket, tenant_data_version())
+
+def create_request_cache() -> Optional[RecommendationCache]:
+    """環境変数の設定からキャッシュを作成（REQUEST_CACHE_ENABLED=0 で無効）"""
+    if os.getenv("REQUEST_CACHE_ENABLED", "1") != "1":
+        return None
+    return RecommendationCache(
+        threshold=float(os.getenv("REQUEST_CACHE_THRESHOLD", "0.9")),
+        ttl=float(os.getenv("REQUEST_CACHE_TTL", "3600")),
+    )
+
+# 全システムで共有するインスタンス
+REQUEST_CACHE = create_request_cache()
@@ -0,0 +1,108 @@
+"""要望の意図分類による次の発言者のローカル選択（GroupChat の speaker_selection_method 用）"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+from utils.intent import classify_intent
+
+if TYPE_CHECKING:
+    from autogen import Agent, GroupChat
+
+# 天気コンサルタントを必ず参加させる天気
+WEATHER_SENSITIVE = {"rainy", "cold"}
+
+class IntentSpeakerSelector:
+    """要望文（と直前の発言）のキーワード意図から発言者を決め、曖昧な場合だけLLM選択（"auto"）に任せる
+
+    1. 直前の発言が未発言の専門家を1人だけ名指ししていれば、その専門家
+    2. 要望の意図に対応する未発言の専門家（天気が関係する場合は天気の専門家が先）を一致数の多い順に
+    3. 関連する専門家が全員発言したら統合役
+    要望にも直前の発言にも意図が見つからない場合や、統合役の発言後も議論が続く場合は "auto" を返す。
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, Agent],
+        final_agent: Agent,
+        request: str,
+        weather: Optional[str] = None,
+    ):
+        self.routes = routes
+        self.final_agent = final_agent
+        self.request_intents = classify_intent(request)
+        self.weather = weather
+        self._lock = threading.Lock()
+        self.stats = {"local": 0, "llm": 0}
+
+    def __call__(self, last_speaker: Agent, groupchat: GroupChat) -> Union[Agent, str]:
+        selected = self.select(last_speaker, groupchat)
+        with self._lock:
+            self.stats["llm" if selected == "auto" else "local"] += 1
+        return selected
+
+    def select(self, last_speaker: Agent, groupchat: GroupChat) -> Union[Agent, str]:
+        """次の発言者（決められない場合は "auto"）"""
+        spoken = {message.get("name") for message in groupchat.messages}
+        if self.final_agent.name in spoken:
+            return "auto"
+
+        specialists = list(self.routes.values())
+        last_content = (groupchat.messages[-1].get("content") or "") if groupchat.messages else ""
+
+        # 直前の発言で名指しされた、まだ発言していない専門家
+        if last_speaker in specialists:
+            mentioned = [
+                agent for agent in specialists
+                if agent.name in last_content and agent.name not in spoken and agent is not last_speaker
+            ]
+            if len(mentioned) == 1:
+                return mentioned[0]
+
+        # 要望から意図が読み取れなければ、専門家の直前の発言から推定（テナント一覧を含む最初の依頼文は使わない）
+        intents = self.request_intents
+        if not intents and last_speaker in specialists:
+            intents = classify_intent(last_content)
+        if not intents:
+            return "auto"
+
+        queue = self._queue(intents)
+        for agent in queue:
+            if agent.name not in spoken:
+                return agent
+        return self.final_agent
+
+    def get_stats(self) -> Dict:
+        """ローカル選択の回数（＝削減できたスピーカー選択のLLM呼び出し数）とLLM選択の回数"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["saved_llm_calls"] = stats["local"]
+        return stats
+
+    def _queue(self, intents: Dict[str, int]) -> List[Agent]:
+        ordered = sorted(intents, key=lambda intent: -intents[intent])
+        if self.weather in WEATHER_SENSITIVE and "weather" not in ordered:
+            ordered.append("weather")
+        # 天気の分析は他の専門家の前提になるため最初に
+        if "weather" in ordered:
+            ordered.remove("weather")
+            ordered.insert(0, "weather")
+        return [self.routes[intent] for intent in ordered if intent in self.routes]
+
+def gate_specialists(
+    request: str,
+    specialists: Sequence[Tuple[Agent, Iterable[str]]],
+) -> Tuple[List[Agent], List[Agent]]:
+    """要望の意図に関係する専門家だけを元の順序のまま残し、(参加する専門家, 省略する専門家) を返す
+
+    specialists は (エージェント, 担当する意図) の並び。天気以外の意図が読み取れない要望では全員を残す。
+    """
+    intents: Set[str] = set(classify_intent(request)) - {"weather"}
+    if not intents:
+        return [agent for agent, _ in specialists], []
+
+    kept: List[Agent] = []
+    skipped: List[Agent] = []
+    for agent, topics in specialists:
+        (kept if intents & set(topics) else skipped).append(agent)
+    return kept, skipped
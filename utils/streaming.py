@@ -0,0 +1,210 @@
+"""エージェントの発言をトークン単位でコールバック・非同期イテレータに流すストリーミング出力"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterable, Optional, Tuple
+
+if TYPE_CHECKING:
+    from autogen import Agent
+    from autogen.io import IOStream
+
+# (エージェント名, トークン) を受け取るコールバック
+TokenCallback = Callable[[str, str], None]
+
+# autogen がストリーミング時に出力する端末の色指定
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+class TokenStreamer:
+    """autogen の IOStream を差し替え、ストリーミング応答のチャンクを発言中のエージェントのトークンとして通知する
+
+    autogen は stream=True のとき各チャンクを print(..., end="") で出力するため、
+    発言の開始〜送信の間に出力されたチャンクだけをトークンとして扱う
+    （スピーカー選択など、エージェントの発言以外の出力は通知しない）。
+    キャッシュヒットなどでチャンクが出力されなかった発言は、送信時に全文を1トークンとして通知する。
+    """
+
+    def __init__(self, on_token: TokenCallback, final_agent: Optional[str] = None, echo: Optional[IOStream] = None):
+        from autogen.io import IOStream
+
+        self.on_token = on_token
+        self.final_agent = final_agent
+        # 元の出力先（コンソール表示はそのまま残す）
+        self.echo = echo or IOStream.get_default()
+        # 発言中のエージェントはスレッドごとに管理（並行実行されるエージェントのトークンを混ぜない）
+        self._turn = threading.local()
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.final_first_token_at: Optional[float] = None
+        self.tokens: Counter = Counter()
+        self._lock = threading.Lock()
+
+    # --- IOStream プロトコル ---
+
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        self.echo.print(*objects, sep=sep, end=end, flush=flush)
+        agent_name = self.current_agent
+        if end == "" and agent_name is not None:
+            token = _ANSI_ESCAPE.sub("", sep.join(str(obj) for obj in objects))
+            if token:
+                self._turn.tokens += 1
+                self._emit(agent_name, token)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return self.echo.input(prompt, password=password)
+
+    # --- 発言の区切り ---
+
+    @property
+    def current_agent(self) -> Optional[str]:
+        """このスレッドで発言中のエージェント名"""
+        return getattr(self._turn, "agent", None)
+
+    def begin_turn(self, agent_name: str):
+        """エージェントが応答の生成を始めた"""
+        self._turn.agent = agent_name
+        self._turn.tokens = 0
+
+    def end_turn(self, agent_name: str, content: Optional[str]):
+        """エージェントが発言を送信した（チャンクが流れていなければ全文を通知）"""
+        streamed = self.current_agent == agent_name and self._turn.tokens > 0
+        self._turn.agent = None
+        if not streamed and content:
+            self._emit(agent_name, content)
+
+    @contextmanager
+    def activate(self):
+        """with ブロック内の autogen の出力をこのストリーマー経由にする"""
+        from autogen.io import IOStream
+        with IOStream.set_default(self):
+            yield self
+
+    def get_metrics(self) -> Dict:
+        """最初のトークンまでの時間（TTFT）などの計測値"""
+        def elapsed(at: Optional[float]) -> Optional[float]:
+            return round(at - self.started_at, 3) if at is not None else None
+
+        return {
+            "time_to_first_token": elapsed(self.first_token_at),
+            "final_time_to_first_token": elapsed(self.final_first_token_at),
+            "tokens_by_agent": dict(self.tokens),
+            "elapsed": round(time.perf_counter() - self.started_at, 3),
+        }
+
+    def _emit(self, agent_name: str, token: str):
+        now = time.perf_counter()
+        with self._lock:
+            self.tokens[agent_name] += 1
+            if self.first_token_at is None:
+                self.first_token_at = now
+            if agent_name == self.final_agent and self.final_first_token_at is None:
+                self.final_first_token_at = now
+        self.on_token(agent_name, token)
+
+class AsyncTokenStream:
+    """スレッドから受け取ったトークンを、イベントループ側で async for で読み出すためのキュー
+
+    インスタンス自体を on_token コールバックとして渡し、議論の終了後に close() を呼ぶ。
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def __call__(self, agent_name: str, token: str):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (agent_name, token))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    def __aiter__(self) -> AsyncIterator[Tuple[str, str]]:
+        return self
+
+    async def __anext__(self) -> Tuple[str, str]:
+        item = await self._queue.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+def _current_streamer() -> Optional[TokenStreamer]:
+    from autogen.io import IOStream
+    stream = IOStream.get_default()
+    return stream if isinstance(stream, TokenStreamer) else None
+
+def _mark_turn_start(recipient, messages=None, sender=None, config=None):
+    streamer = _current_streamer()
+    if streamer is not None:
+        streamer.begin_turn(recipient.name)
+    # 応答は生成せず、後続の返信関数（LLM呼び出し）に処理を渡す
+    return False, None
+
+def _mark_turn_end(sender, message, recipient, silent):
+    streamer = _current_streamer()
+    if streamer is not None:
+        content = message.get("content") if isinstance(message, dict) else message
+        streamer.end_turn(sender.name, content if isinstance(content, str) else None)
+    return message
+
+def attach_streaming(agents: Iterable[Agent]):
+    """エージェントに発言の開始・送信を知らせるフックを登録（同じエージェントへの登録は一度だけ）"""
+    from autogen import Agent
+    for agent in agents:
+        if getattr(agent, "_streaming_attached", False):
+            continue
+        agent.register_reply([Agent, None], _mark_turn_start, position=0)
+        agent.register_hook("process_message_before_send", _mark_turn_end)
+        agent._streaming_attached = True
+
+@contextmanager
+def stream_tokens(on_token: Optional[TokenCallback], agents: Iterable[Agent], final_agent: Optional[str] = None):
+    """on_token が指定されていれば、with ブロック内の各エージェントの発言をトークン単位で通知する
+
+    on_token が None の場合は何もせず None を返す。
+    LLM_STREAM=auto（既定）では、with ブロック内だけ各エージェントのLLM応答をストリーミングで受け取る。
+    """
+    if on_token is None:
+        yield None
+        return
+    agents = list(agents)
+    attach_streaming(agents)
+    streamer = TokenStreamer(on_token, final_agent=final_agent)
+    with streamer.activate(), _llm_streaming(agents if llm_stream_mode() == "auto" else ()):
+        yield streamer
+
+@contextmanager
+def _llm_streaming(agents: Iterable[Agent]):
+    """with ブロック内は、エージェントのLLM呼び出しを stream=True にする
+
+    autogen は llm_config の値を呼び出し時の引数より優先するため、各エージェントのクライアント設定を
+    一時的に書き換える（エージェントは議論ごとにプールから貸し出されるので、他の議論とは共有しない）。
+    """
+    changed = []
+    for agent in agents:
+        client = getattr(agent, "client", None)
+        for config in getattr(client, "_config_list", None) or ():
+            if not config.get("stream"):
+                changed.append((config, config.get("stream")))
+                config["stream"] = True
+    try:
+        yield
+    finally:
+        for config, previous in changed:
+            if previous is None:
+                config.pop("stream", None)
+            else:
+                config["stream"] = previous
+
+def llm_stream_mode() -> str:
+    """LLM_STREAM の設定（1: 常にストリーミング / 0: しない / auto: トークンの通知先がある議論だけ。既定は auto）"""
+    mode = os.getenv("LLM_STREAM", "auto").strip().lower()
+    return mode if mode in ("0", "1") else "auto"
+
+def llm_stream_enabled() -> bool:
+    """全てのLLM呼び出しをストリーミングで受け取るか（LLM_STREAM=1）"""
+    return llm_stream_mode() == "1"
@@ -0,0 +1,84 @@
+"""テナント情報をエージェント向けテキストに整形するサービス"""
+
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from data.tenant_store import Tenant, TenantStore, get_default_store
+from utils.tenant_index import get_tenant_index
+
+# 整形済みテキストの見出し（全件・上位K件とも同じ書き出し）
+TENANT_CONTEXT_TITLE = "=== 竹芝ポートシティ テナント情報"
+_TITLE_LINE = re.compile(rf"^{re.escape(TENANT_CONTEXT_TITLE)}.*===\n", re.MULTILINE)
+# format_tenant_lines が出力するテナントの行（名前 (フロア) [(適した天気: ...)]）
+_TENANT_LINE = re.compile(r"^- (.+?) \([^()\n]*\)(?: \(適した天気: [^()\n]*\))?$", re.MULTILINE)
+
+# 直近に整形したテキスト（ストアの版, 整形済みテキスト）。古い版のものは保持しない
+_rendered: Optional[Tuple[int, str]] = None
+_lock = threading.Lock()
+
+def tenant_data_version(store: Optional[TenantStore] = None) -> int:
+    """テナントデータの版（TenantStore.revision。データ量によらず一定時間で取得できる）"""
+    store = get_default_store() if store is None else store
+    return store.revision
+
+def render_tenant_context(store: Optional[TenantStore] = None) -> str:
+    """テナントデータをエージェント用にフォーマット（ストアの版が変わらない限り再生成しない）"""
+    global _rendered
+    store = get_default_store() if store is None else store
+    revision = store.revision
+    with _lock:
+        if _rendered is not None and _rendered[0] == revision:
+            return _rendered[1]
+
+    text = _render(store.grouped())
+    with _lock:
+        _rendered = (revision, text)
+    return text
+
+def render_relevant_tenant_context(weather: Optional[str], request: Optional[str], top_k: int) -> str:
+    """天気と要望に合う上位K件のテナントだけを整形（該当なしの場合は全件）"""
+    grouped = get_tenant_index().query_grouped(weather, request, top_k)
+    if not grouped:
+        return render_tenant_context()
+    return _render(grouped, header=f"{TENANT_CONTEXT_TITLE}（天気・要望に合う上位{top_k}件） ===\n\n")
+
+def find_tenant_block(text: str) -> Optional[Tuple[int, int]]:
+    """プロンプト中のテナント一覧（見出しの次の行から最後のテナントの行まで）の位置 (開始, 終了)"""
+    match = _TITLE_LINE.search(text)
+    if match is None:
+        return None
+    start = end = match.end()
+    position = start
+    for line in text[start:].splitlines(keepends=True):
+        body = line.rstrip("\n")
+        if body and not (body.startswith(("- ", "  ")) or (body.startswith("【") and body.endswith("】"))):
+            break
+        position += len(line)
+        if body:
+            end = position
+    return start, end
+
+def tenant_names_in(text: str) -> List[str]:
+    """プロンプト中のテナント一覧に載っているテナント名（一覧の順）"""
+    span = find_tenant_block(text)
+    if span is None:
+        return []
+    return [match.group(1) for match in _TENANT_LINE.finditer(text, span[0], span[1])]
+
+def format_tenant_lines(tenants: Iterable[Tenant]) -> List[str]:
+    """テナントのリストを1件2行のテキストに整形"""
+    lines = []
+    for tenant in tenants:
+        weather_pref = tenant.weather_preference
+        weather_info = f" (適した天気: {', '.join(weather_pref)})" if weather_pref else ""
+        lines.append(f"- {tenant.name} ({tenant.floor}){weather_info}\n")
+        lines.append(f"  {tenant.description}\n")
+    return lines
+
+def _render(tenants: Dict[str, List[Tenant]], header: str = f"{TENANT_CONTEXT_TITLE} ===\n\n") -> str:
+    parts = [header]
+    for category, category_tenants in tenants.items():
+        parts.append(f"【{category}】\n")
+        parts.extend(format_tenant_lines(category_tenants))
+        parts.append("\n")
+    return "".join(parts)
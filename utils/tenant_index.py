@@ -0,0 +1,132 @@
+"""天気・カテゴリ・フロア・キーワードによるテナント索引"""
+
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+from data.tenant_store import Tenant, TenantStore, get_default_store, weather_match_mask, weather_names
+from utils.tenant_search import TenantSearchEngine
+
+# 要望文に出てきやすい言葉をテナントグループに結び付ける
+GROUP_KEYWORDS = {
+    "restaurants": ["食事", "ランチ", "ディナー", "グルメ", "レストラン", "ごはん", "美味しい", "食べ"],
+    "shops": ["ショッピング", "買い物", "お店", "ファッション", "服", "雑貨"],
+    "entertainment": ["エンターテイメント", "エンタメ", "映画", "ゲーム", "遊び", "遊ぶ", "観光"],
+}
+
+# 天気適性の加点（要望との一致より優先度を高くする）
+WEATHER_BONUS = 3.0
+
+# 検索索引の既定の保存先（実行時のカレントディレクトリではなく data ディレクトリ）
+DEFAULT_SEARCH_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", ".tenant_search_index.json"
+)
+
+class TenantIndex:
+    """テナントストアを一度だけ走査して作るインメモリ索引"""
+
+    def __init__(self, store: TenantStore, search_index_path: Optional[str] = None):
+        self.tenants: List[Tenant] = list(store)
+        # 索引を作った時点のストアの版
+        self.revision = store.revision
+        # 各リストは元データの順（IDの昇順）
+        self.by_weather: Dict[str, List[int]] = defaultdict(list)
+        self.by_category: Dict[str, List[int]] = defaultdict(list)
+        self.by_group: Dict[str, List[int]] = defaultdict(list)
+        self.by_floor: Dict[str, List[int]] = defaultdict(list)
+
+        for tenant_id, tenant in enumerate(self.tenants):
+            for weather in weather_names(tenant.weather_mask):
+                self.by_weather[weather].append(tenant_id)
+            self.by_category[tenant.category].append(tenant_id)
+            self.by_group[tenant.group].append(tenant_id)
+            self.by_floor[tenant.floor].append(tenant_id)
+
+        self._store = store
+        self._search_index_path = search_index_path
+        self._search_engine: Optional[TenantSearchEngine] = None
+        self._search_lock = threading.Lock()
+
+    @property
+    def search_engine(self) -> TenantSearchEngine:
+        """名前・カテゴリ・説明文（＋グループの関連語）のBM25索引（最初の検索時に構築または読み込み）"""
+        with self._search_lock:
+            if self._search_engine is None:
+                self._search_engine = TenantSearchEngine.build_or_load(self._store, self._search_index_path, GROUP_KEYWORDS)
+            return self._search_engine
+
+    def query(
+        self,
+        weather: Optional[str] = None,
+        request: Optional[str] = None,
+        top_k: int = 5,
+        categories: Optional[Iterable[str]] = None,
+        floors: Optional[Iterable[str]] = None,
+    ) -> List[Tenant]:
+        """天気と要望に合う上位K件のテナントを取得"""
+        return [self.tenants[tenant_id] for tenant_id in self._rank(weather, request, top_k, categories, floors)]
+
+    def query_grouped(self, weather: Optional[str] = None, request: Optional[str] = None, top_k: int = 5) -> Dict[str, List[Tenant]]:
+        """query の結果を元のグループ構造・順序で返す（グループ -> テナント）"""
+        grouped: Dict[str, List[Tenant]] = {}
+        for tenant_id in sorted(self._rank(weather, request, top_k)):
+            tenant = self.tenants[tenant_id]
+            grouped.setdefault(tenant.group, []).append(tenant)
+        return grouped
+
+    def search(self, request: str, top_k: int = 10) -> List[Tenant]:
+        """要望文だけでテナントを検索（天気は考慮しない）"""
+        return [self.tenants[tenant_id] for tenant_id, _ in self.search_engine.search(request, top_k)]
+
+    def _rank(
+        self,
+        weather: Optional[str],
+        request: Optional[str],
+        top_k: int,
+        categories: Optional[Iterable[str]] = None,
+        floors: Optional[Iterable[str]] = None,
+    ) -> List[int]:
+        candidates: Optional[Set[int]] = None
+        if categories:
+            candidates = {i for c in categories for i in self.by_category.get(c, ())}
+        if floors:
+            on_floors = {i for f in floors for i in self.by_floor.get(f, ())}
+            candidates = on_floors if candidates is None else candidates & on_floors
+
+        mask = weather_match_mask(weather)
+        scores: Dict[int, float] = {}
+
+        # 要望文とのBM25一致度に、天気適性（ビット演算）を加点
+        for tenant_id, score in self.search_engine.search(request or "", top_k=max(top_k * 4, 20)):
+            if candidates is not None and tenant_id not in candidates:
+                continue
+            if self.tenants[tenant_id].weather_mask & mask:
+                score += WEATHER_BONUS
+            scores[tenant_id] = score
+
+        # 要望に一致するテナントが少なければ、天気に合うテナントで補う
+        if len(scores) < top_k and mask:
+            for name in weather_names(mask):
+                for tenant_id in self.by_weather.get(name, ()):
+                    if len(scores) >= top_k:
+                        break
+                    if tenant_id not in scores and (candidates is None or tenant_id in candidates):
+                        scores[tenant_id] = WEATHER_BONUS
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [tenant_id for tenant_id, _ in ranked[:top_k]]
+
+_tenant_index: Optional[TenantIndex] = None
+_tenant_index_lock = threading.Lock()
+
+def get_tenant_index() -> TenantIndex:
+    """全システムで共有するテナント索引（最初に使う時とストアの版が変わった時に作成。検索索引はデータが同じなら保存済みのものを読み込む）"""
+    global _tenant_index
+    store = get_default_store()
+    with _tenant_index_lock:
+        if _tenant_index is None or _tenant_index.revision != store.revision:
+            _tenant_index = TenantIndex(
+                store,
+                search_index_path=os.getenv("TENANT_SEARCH_INDEX_PATH", DEFAULT_SEARCH_INDEX_PATH),
+            )
+        return _tenant_index
@@ -0,0 +1,196 @@
+"""テナントの名前・カテゴリ・説明文に対するBM25全文検索（外部サービス不要）"""
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import tempfile
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from data.tenant_store import Tenant, TenantStore
+
+INDEX_FORMAT_VERSION = 2
+
+_SKIP_CHARS = re.compile(r"[\s\W_]+", re.UNICODE)
+
+def normalize_text(text: str) -> str:
+    """NFKC正規化し、空白・記号を除去"""
+    return _SKIP_CHARS.sub("", unicodedata.normalize("NFKC", text or "").lower())
+
+def tokenize(text: str, n: int = 2) -> List[str]:
+    """文字n-gramのリスト（出現回数を保つ）。n文字未満の場合は全体を1トークンとする"""
+    text = normalize_text(text)
+    if len(text) < n:
+        return [text] if text else []
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+def tenant_document(tenant: Tenant, extra_terms: Iterable[str] = ()) -> List[str]:
+    """検索対象のトークン列（フィールドをまたぐn-gramは作らない）"""
+    tokens: List[str] = []
+    for field in (tenant.name, tenant.category, tenant.description, *extra_terms):
+        tokens.extend(tokenize(field))
+    return tokens
+
+class TenantSearchEngine:
+    """文字bigramの転置インデックスとBM25スコアによる検索エンジン
+
+    各語のポスティングはBM25の寄与（インパクト）の降順に保存し、
+    検索時は語ごとに上位 max_postings_per_term 件だけを走査する。
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_postings_per_term: int = 256):
+        self.k1 = k1
+        self.b = b
+        self.max_postings_per_term = max_postings_per_term
+        self.doc_count = 0
+        self.fingerprint = ""
+        # 語 -> (文書ID配列, インパクト配列)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+
+    @classmethod
+    def build(
+        cls,
+        store: TenantStore,
+        extra_terms: Optional[Dict[str, List[str]]] = None,
+        **kwargs,
+    ) -> "TenantSearchEngine":
+        """テナントストアから索引を構築（extra_terms はグループごとの追加語）"""
+        engine = cls(**kwargs)
+        extra_terms = extra_terms or {}
+
+        term_freqs: List[Counter] = []
+        doc_lengths: List[int] = []
+        document_frequency: Counter = Counter()
+        for tenant in store:
+            tokens = tenant_document(tenant, extra_terms.get(tenant.group, ()))
+            counts = Counter(tokens)
+            term_freqs.append(counts)
+            doc_lengths.append(len(tokens))
+            document_frequency.update(counts.keys())
+
+        engine.doc_count = len(term_freqs)
+        engine.fingerprint = engine.fingerprint_for(store, extra_terms)
+        if not engine.doc_count:
+            return engine
+
+        average_length = sum(doc_lengths) / engine.doc_count or 1.0
+        idf = {
+            term: engine._idf(df)
+            for term, df in document_frequency.items()
+        }
+
+        impacts: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        for doc_id, (counts, length) in enumerate(zip(term_freqs, doc_lengths)):
+            norm = engine.k1 * (1 - engine.b + engine.b * length / average_length)
+            for term, tf in counts.items():
+                impacts[term].append((idf[term] * tf * (engine.k1 + 1) / (tf + norm), doc_id))
+
+        for term, entries in impacts.items():
+            entries.sort(key=lambda entry: (-entry[0], entry[1]))
+            engine.postings[term] = (
+                array("i", (doc_id for _, doc_id in entries)),
+                array("f", (impact for impact, _ in entries)),
+            )
+        return engine
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """クエリに一致する (文書ID, スコア) を上位K件取得"""
+        scores: Dict[int, float] = defaultdict(float)
+        limit = self.max_postings_per_term
+        for term, query_tf in Counter(tokenize(query)).items():
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            doc_ids, impacts = entry
+            for doc_id, impact in zip(doc_ids[:limit], impacts[:limit]):
+                scores[doc_id] += impact * query_tf
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def save(self, path: str):
+        """索引をJSONファイルに保存"""
+        payload = {
+            "format": INDEX_FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "max_postings_per_term": self.max_postings_per_term,
+            "doc_count": self.doc_count,
+            "fingerprint": self.fingerprint,
+            "postings": {term: [doc_ids.tolist(), impacts.tolist()] for term, (doc_ids, impacts) in self.postings.items()},
+        }
+        # 同時に構築した別プロセスと一時ファイルを共有しないよう、一意な名前で書き出してから置き換える
+        directory = os.path.dirname(os.path.abspath(path))
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, suffix=".tmp", delete=False) as f:
+                tmp_path = f.name
+                json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "TenantSearchEngine":
+        """保存済みの索引を読み込み（JSONのみを扱い、ファイルの内容でコードが実行されることはない）"""
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if not isinstance(payload, dict) or payload.get("format") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"索引ファイルの形式が異なります: {path}")
+
+        engine = cls(float(payload["k1"]), float(payload["b"]), int(payload["max_postings_per_term"]))
+        engine.doc_count = int(payload["doc_count"])
+        engine.fingerprint = str(payload["fingerprint"])
+        engine.postings = {
+            term: (array("i", doc_ids), array("f", impacts))
+            for term, (doc_ids, impacts) in payload["postings"].items()
+        }
+        return engine
+
+    @classmethod
+    def build_or_load(
+        cls,
+        store: TenantStore,
+        path: Optional[str],
+        extra_terms: Optional[Dict[str, List[str]]] = None,
+        **kwargs,
+    ) -> "TenantSearchEngine":
+        """保存済みの索引がデータ・パラメータと一致すれば読み込み、なければ構築して保存"""
+        if path and os.path.exists(path):
+            try:
+                engine = cls.load(path)
+                if engine.fingerprint == cls(**kwargs).fingerprint_for(store, extra_terms):
+                    return engine
+            except (OSError, ValueError, TypeError, KeyError):
+                pass
+
+        engine = cls.build(store, extra_terms, **kwargs)
+        if path:
+            try:
+                engine.save(path)
+            except OSError as e:
+                print(f"検索索引の保存に失敗しました: {e}")
+        return engine
+
+    def fingerprint_for(self, store: TenantStore, extra_terms: Optional[Dict[str, List[str]]] = None) -> str:
+        """このエンジンのパラメータでストアを索引にした場合の指紋"""
+        return store_fingerprint(store, extra_terms, params=(self.k1, self.b, self.max_postings_per_term))
+
+    def _idf(self, document_frequency: int) -> float:
+        # BM25+系の非負IDF
+        return max(0.0, math.log(1 + (self.doc_count - document_frequency + 0.5) / (document_frequency + 0.5)))
+
+def store_fingerprint(
+    store: TenantStore,
+    extra_terms: Optional[Dict[str, List[str]]] = None,
+    params: Tuple = (),
+) -> str:
+    """索引と元データ（および追加語・BM25のパラメータ）の対応を確認するための指紋"""
+    digest = hashlib.sha256(repr((params, sorted((extra_terms or {}).items()))).encode("utf-8"))
+    for tenant in store:
+        digest.update(f"{tenant.group}\x1f{tenant.name}\x1f{tenant.category}\x1f{tenant.description}\x1e".encode("utf-8"))
+    return digest.hexdigest()[:16]
@@ -0,0 +1,131 @@
+"""GroupChatの早期終了判定と、要望の複雑さに応じたラウンド数の決定"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Union
+from utils.discussion import TERMINATE_MARK, agent_spoke, strip_terminate
+from utils.intent import classify_intent, normalize_request
+
+if TYPE_CHECKING:
+    from autogen import Agent, GroupChat
+
+# 統合役の発言を「完成した提案」とみなす最低文字数
+MIN_PLAN_LENGTH = 150
+
+def request_complexity(request: str) -> float:
+    """要望の複雑さ（0〜1）。天気以外の意図の数と文の長さから見積もる"""
+    topics = [intent for intent in classify_intent(request) if intent != "weather"]
+    length = len(normalize_request(request))
+    return min(1.0, 0.3 * len(topics) + length / 100)
+
+def round_budget(request: str, min_rounds: int, max_rounds: int) -> int:
+    """要望の複雑さに応じて min_rounds〜max_rounds の間で max_round を決める"""
+    return min_rounds + round((max_rounds - min_rounds) * request_complexity(request))
+
+def _ngrams(text: str, n: int) -> Set[str]:
+    text = "".join(text.split())
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class DiscussionTerminator:
+    """GroupChatManager の is_termination_msg に渡す終了判定
+
+    次のいずれかで議論を終える。
+    - 発言の末尾が TERMINATE
+    - 統合役が完成した提案（MIN_PLAN_LENGTH 文字以上で、質問で終わらない発言）を出した
+    - 統合役の発言後に、既出の内容の繰り返し（文字n-gramの重複率が閾値以上）があった
+    統合役の発言前に繰り返しが repeat_limit 回続いた場合や、統合役が発言しないまま
+    最後のラウンドになった場合は、route() でラップしたスピーカー選択が残りの発言者を飛ばして
+    統合役に発言させる。
+    """
+
+    def __init__(
+        self,
+        groupchat: GroupChat,
+        final_agent: str,
+        repetition_threshold: float = 0.7,
+        repeat_limit: int = 2,
+        ngram: int = 3,
+    ):
+        self.groupchat = groupchat
+        self.final_agent = final_agent
+        self.repetition_threshold = repetition_threshold
+        self.repeat_limit = repeat_limit
+        self.ngram = ngram
+        self.reason: Optional[str] = None
+        self.repeated_turns = 0
+        self.skipped_to_final = False
+        self._consecutive_repeats = 0
+        self._seen: Set[str] = set()
+        self._checked = 0
+
+    def __call__(self, message: Dict) -> bool:
+        content = message.get("content") if isinstance(message, dict) else message
+        if not isinstance(content, str):
+            return False
+        speaker = self._latest_speaker()
+
+        if content.rstrip().endswith(TERMINATE_MARK):
+            return self._stop("terminate")
+        if speaker == self.final_agent and self._is_complete_plan(content):
+            return self._stop("final_plan")
+        if self._is_repetition(content) and self._final_agent_spoke():
+            return self._stop("repetition")
+        return False
+
+    @property
+    def stalled(self) -> bool:
+        """繰り返しが repeat_limit 回続いているか"""
+        return self._consecutive_repeats >= self.repeat_limit
+
+    def route(self, method: Union[str, Callable]) -> Callable:
+        """speaker_selection_method をラップし、統合役の発言前に議論が停滞するか最後のラウンドになったら統合役を選ぶ"""
+        def select(last_speaker: Agent, groupchat: GroupChat) -> Union[Agent, str]:
+            # GroupChatManager は発言数が max_round - 1 のときに最後の発言者を選ぶ
+            last_round = len(groupchat.messages) >= groupchat.max_round - 1
+            if (self.stalled or last_round) and not self._final_agent_spoke():
+                self.skipped_to_final = True
+                return groupchat.agent_by_name(self.final_agent)
+            return method(last_speaker, groupchat) if callable(method) else method
+        return select
+
+    def get_stats(self) -> Dict:
+        """使ったラウンド数・上限・終了理由"""
+        return {
+            "rounds_used": len(self.groupchat.messages),
+            "rounds_allowed": self.groupchat.max_round,
+            "stop_reason": self.reason or "max_round",
+            "repeated_turns": self.repeated_turns,
+            "skipped_to_final": self.skipped_to_final,
+        }
+
+    def _stop(self, reason: str) -> bool:
+        self.reason = reason
+        return True
+
+    def _latest_speaker(self) -> Optional[str]:
+        messages: List[Dict] = self.groupchat.messages
+        return messages[-1].get("name") if messages else None
+
+    def _final_agent_spoke(self) -> bool:
+        return agent_spoke(self.groupchat.messages, self.final_agent)
+
+    def _is_complete_plan(self, content: str) -> bool:
+        plan = strip_terminate(content)
+        return len(plan) >= MIN_PLAN_LENGTH and not plan.endswith(("?", "？"))
+
+    def _is_repetition(self, content: str) -> bool:
+        # 最初の依頼文（テナント一覧を含む）は比較対象にしない
+        if self._checked == 0:
+            self._checked += 1
+            return False
+        self._checked += 1
+
+        grams = _ngrams(content, self.ngram)
+        overlap = len(grams & self._seen) / len(grams) if grams else 1.0
+        self._seen |= grams
+        if overlap >= self.repetition_threshold:
+            self.repeated_turns += 1
+            self._consecutive_repeats += 1
+            return True
+        self._consecutive_repeats = 0
+        return False
@@ -1,14 +1,77 @@
 """天気情報取得サービス"""
 
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor, wait
 import requests
+from requests.adapters import HTTPAdapter
 import os
-from typing import Dict, Optional
+import random
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+# リトライ対象のHTTPステータス（一時的な障害）
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
 class WeatherService:
-    def __init__(self):
+    def __init__(
+        self,
+        cache_ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 3.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        total_budget: Optional[float] = None,
+        pool_size: int = 10,
+        breaker: Optional[CircuitBreaker] = None,
+        last_known_good_path: Optional[str] = None,
+        last_known_good_max_age: float = 6 * 3600,
+    ):
         self.api_key = os.getenv('WEATHER_API_KEY')
         self.base_url = "http://api.openweathermap.org/data/2.5/weather"
-    
+
+        # HTTP設定: keep-aliveで接続を使い回し、最悪ケースの待ち時間を total_budget 秒に抑える
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.total_budget = total_budget if total_budget is not None else float(os.getenv('WEATHER_TOTAL_BUDGET', '5'))
+        self.pool_size = pool_size
+        self.session = self._create_session(pool_size)
+
+        # 都市ごとのTTLキャッシュ設定（秒）
+        # cache_ttl 内は新鮮、さらに stale_ttl 内は古いデータを返しつつ裏で更新する
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv('WEATHER_CACHE_TTL', '600'))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv('WEATHER_STALE_TTL', '1800'))
+
+        self._cache: Dict[str, Tuple[Dict, float]] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0,
+            "short_circuits": 0, "last_known_good_served": 0,
+        }
+
+        # サーキットブレーカー: 連続失敗または高レイテンシで上流呼び出しを止める
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv('WEATHER_BREAKER_FAILURES', '3')),
+            reset_timeout=float(os.getenv('WEATHER_BREAKER_RESET', '30')),
+            latency_threshold=float(os.getenv('WEATHER_BREAKER_LATENCY', '2.5')),
+        )
+
+        # 最後に取得できた実測値（ローカルファイルに永続化）
+        self.last_known_good_path = last_known_good_path or os.getenv(
+            'WEATHER_LKG_PATH', '.weather_last_known_good.json'
+        )
+        self.last_known_good_max_age = last_known_good_max_age
+        self._last_known_good = self._load_last_known_good()
+        # ファイルへの書き込みを直列化する（キャッシュ用の _lock はファイルI/Oの間保持しない）
+        self._file_lock = threading.Lock()
+
     def get_current_weather(self, city: str = "Tokyo") -> Optional[Dict]:
         """現在の天気情報を取得"""
         if not self.api_key:
@@ -19,44 +82,330 @@ class WeatherService:
                 "description": "晴れ",
                 "humidity": 60
             }
-        
+
         try:
-            params = {
-                'q': city,
-                'appid': self.api_key,
-                'units': 'metric',
-                'lang': 'ja'
-            }
-            
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            weather_condition = self._classify_weather(data['weather'][0]['main'])
-            
-            return {
-                "weather": weather_condition,
-                "temperature": data['main']['temp'],
-                "description": data['weather'][0]['description'],
-                "humidity": data['main']['humidity']
-            }
-            
+            return self._get_cached_weather(city)
+
+        except CircuitOpenError:
+            # 回路が開いている間は上流を待たずに直近の実測値を返す
+            pass
         except Exception as e:
             print(f"天気情報の取得に失敗しました: {e}")
-            # フォールバック用のダミーデータ
-            return {
-                "weather": "cloudy",
-                "temperature": 20,
-                "description": "曇り",
-                "humidity": 70
-            }
-    
+
+        # 直近の実測値があれば、作り物のデータより優先して返す
+        last_known = self._get_last_known_good(city)
+        if last_known is not None:
+            return last_known
+
+        # フォールバック用のダミーデータ
+        return {
+            "weather": "cloudy",
+            "temperature": 20,
+            "description": "曇り",
+            "humidity": 70
+        }
+
+    async def aget_current_weather(self, city: str = "Tokyo") -> Optional[Dict]:
+        """現在の天気情報を非同期で取得（イベントループをブロックしない）"""
+        # キャッシュ・セッションを共有するため、同期版をワーカースレッドで実行する
+        return await asyncio.to_thread(self.get_current_weather, city)
+
+    def get_weather_batch(
+        self,
+        cities: Iterable[str],
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Dict]:
+        """複数都市の天気情報を並行取得
+
+        戻り値は {"results": {都市: 天気情報}, "errors": {都市: エラー内容}}。
+        timeout 秒以内に終わらなかった都市はエラー扱いとし、他の都市の結果を待たせない。
+        """
+        cities = list(dict.fromkeys(cities))
+        results: Dict[str, Dict] = {}
+        errors: Dict[str, str] = {}
+        if not cities:
+            return {"results": results, "errors": errors}
+
+        if not self.api_key:
+            return {"results": {city: self.get_current_weather(city) for city in cities}, "errors": errors}
+
+        # セッションのプールサイズを超えない範囲で並行実行（TTLキャッシュ・single-flightは共有）
+        workers = max_workers or min(len(cities), self.pool_size)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="weather")
+        try:
+            futures = {executor.submit(self._get_batch_entry, city): city for city in cities}
+            timeout = timeout if timeout is not None else self.total_budget
+            done, not_done = wait(futures, timeout=timeout)
+
+            for future in done:
+                city = futures[future]
+                weather, error = future.result()
+                if weather is not None:
+                    results[city] = weather
+                else:
+                    errors[city] = error
+
+            for future in not_done:
+                errors[futures[future]] = f"{timeout} 秒以内に取得できませんでした"
+        finally:
+            # 遅い都市の完了は待たずに戻る（スレッドは裏で終了し、結果はキャッシュに残る）
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # 入力順に並べ替えて返す
+        return {
+            "results": {city: results[city] for city in cities if city in results},
+            "errors": {city: errors[city] for city in cities if city in errors},
+        }
+
+    def get_cache_stats(self) -> Dict:
+        """キャッシュのヒット/ミス/更新回数を取得"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["cached_cities"] = len(self._cache)
+        stats["breaker"] = self.breaker.snapshot()
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear_cache(self):
+        """キャッシュを破棄"""
+        with self._lock:
+            self._cache.clear()
+
+    def _get_cached_weather(self, city: str) -> Dict:
+        """TTLキャッシュ経由で天気情報を取得（取得できない場合は例外）"""
+        key = city.strip().lower()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._cache.get(key)
+            age = now - entry[1] if entry else None
+
+            if entry and age < self.cache_ttl:
+                self.stats["hits"] += 1
+                return dict(entry[0])
+
+            if entry and age < self.cache_ttl + self.stale_ttl:
+                # stale-while-revalidate: 古いデータを即座に返し、裏で1回だけ更新する
+                self.stats["stale_hits"] += 1
+                if not self.breaker.allow_request():
+                    # 回路が開いている間の更新はバックグラウンドの試行に任せる
+                    self._maybe_probe(key, city)
+                elif key not in self._inflight:
+                    self._inflight[key] = threading.Event()
+                    threading.Thread(
+                        target=self._refresh, args=(key, city), daemon=True
+                    ).start()
+                return dict(entry[0])
+
+            self.stats["misses"] += 1
+            if not self.breaker.allow_request():
+                self.stats["short_circuits"] += 1
+                self._maybe_probe(key, city)
+                raise CircuitOpenError(f"{city} の天気APIは一時的に停止中です")
+
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            # single-flight: 同じ都市の取得が進行中なら、その結果を待つ
+            event.wait()
+            with self._lock:
+                entry = self._cache.get(key)
+            if entry is None:
+                raise RuntimeError(f"{city} の天気情報を取得できませんでした")
+            return dict(entry[0])
+
+        try:
+            return dict(self._fetch_upstream(key, city))
+        except Exception:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            self._finish_inflight(key)
+
+    def _get_batch_entry(self, city: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """バッチ取得の1都市分（失敗時は最終実測値、なければエラー内容を返す）"""
+        try:
+            return self._get_cached_weather(city), None
+        except Exception as e:
+            last_known = self._get_last_known_good(city)
+            if last_known is not None:
+                return last_known, None
+            return None, str(e) or type(e).__name__
+
+    def _refresh(self, key: str, city: str):
+        """バックグラウンドでキャッシュを更新"""
+        try:
+            self._fetch_upstream(key, city)
+            with self._lock:
+                self.stats["refreshes"] += 1
+        except Exception as e:
+            # 更新に失敗しても古いデータは残す
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"天気情報の更新に失敗しました: {e}")
+        finally:
+            self._finish_inflight(key)
+
+    def _fetch_upstream(self, key: str, city: str) -> Dict:
+        """上流から取得し、結果をブレーカー・キャッシュ・最終実測値に反映"""
+        started = time.monotonic()
+        try:
+            weather = self._fetch_weather(city)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success(time.monotonic() - started)
+        self._store(key, weather)
+        self._save_last_known_good(key, weather)
+        return weather
+
+    def _maybe_probe(self, key: str, city: str):
+        """回路が開いてから一定時間経過していれば、バックグラウンドで上流を試行"""
+        if self.breaker.try_begin_probe():
+            threading.Thread(target=self._probe, args=(key, city), daemon=True).start()
+
+    def _probe(self, key: str, city: str):
+        """half-open状態での試行"""
+        try:
+            self._fetch_upstream(key, city)
+        except Exception as e:
+            print(f"天気APIの回復確認に失敗しました: {e}")
+
+    def _get_last_known_good(self, city: str) -> Optional[Dict]:
+        """最大保持期間内の最終実測値を取得"""
+        key = city.strip().lower()
+        with self._lock:
+            entry = self._last_known_good.get(key)
+            if entry is None or time.time() - entry["observed_at"] > self.last_known_good_max_age:
+                return None
+            self.stats["last_known_good_served"] += 1
+            return dict(entry["weather"])
+
+    def _load_last_known_good(self) -> Dict[str, Dict]:
+        """永続化された最終実測値を読み込み"""
+        try:
+            with open(self.last_known_good_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_last_known_good(self, key: str, weather: Dict):
+        """最終実測値をファイルへ保存（一意な一時ファイル経由で置き換え）"""
+        with self._lock:
+            self._last_known_good[key] = {"weather": weather, "observed_at": time.time()}
+
+        # スナップショットはファイルロックの中で取り、最後に書き込むものが常に最新になるようにする
+        with self._file_lock:
+            with self._lock:
+                snapshot = json.dumps(self._last_known_good, ensure_ascii=False)
+            directory = os.path.dirname(os.path.abspath(self.last_known_good_path))
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", dir=directory, suffix=".tmp", delete=False
+                ) as f:
+                    tmp_path = f.name
+                    f.write(snapshot)
+                os.replace(tmp_path, self.last_known_good_path)
+            except OSError as e:
+                print(f"天気情報の保存に失敗しました: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _store(self, key: str, weather: Dict):
+        """取得結果をキャッシュに保存"""
+        with self._lock:
+            self._cache[key] = (weather, time.monotonic())
+
+    def _finish_inflight(self, key: str):
+        """進行中の取得を完了扱いにし、待機中の呼び出し元を起こす"""
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _fetch_weather(self, city: str) -> Dict:
+        """OpenWeatherMapから天気情報を取得"""
+        params = {
+            'q': city,
+            'appid': self.api_key,
+            'units': 'metric',
+            'lang': 'ja'
+        }
+
+        data = self._request_with_retry(params)
+
+        weather_condition = self._classify_weather(data['weather'][0]['main'])
+
+        return {
+            "weather": weather_condition,
+            "temperature": data['main']['temp'],
+            "description": data['weather'][0]['description'],
+            "humidity": data['main']['humidity']
+        }
+
+    def close(self):
+        """HTTPセッションを閉じる"""
+        self.session.close()
+
+    def _create_session(self, pool_size: int) -> requests.Session:
+        """コネクションプール付きのセッションを作成"""
+        session = requests.Session()
+        # リトライは _request_with_retry で予算管理するため、アダプタ側では行わない
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _request_with_retry(self, params: Dict) -> Dict:
+        """タイムアウト・ジッター付きバックオフ・合計時間予算つきでAPIを呼び出す"""
+        deadline = time.monotonic() + self.total_budget
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                response = self.session.get(
+                    self.base_url,
+                    params=params,
+                    timeout=(min(self.connect_timeout, remaining), min(self.read_timeout, remaining)),
+                )
+                if response.status_code in RETRYABLE_STATUS:
+                    raise requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+                response.raise_for_status()
+                return response.json()
+
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                last_error = e
+                status = e.response.status_code if e.response is not None else None
+                if status is not None and status not in RETRYABLE_STATUS:
+                    # 4xx（APIキー不正など）はリトライしても回復しない
+                    raise
+
+            if attempt < self.max_retries:
+                # full jitter: 0〜base*2^attempt 秒のランダム待機（残り予算を超えない）
+                delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+                time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+        raise TimeoutError(
+            f"天気APIの呼び出しがリトライ上限または {self.total_budget} 秒の予算を超えました: {last_error}"
+        )
+
     def _classify_weather(self, weather_main: str) -> str:
         """天気情報を分類"""
         weather_map = {
             'Clear': 'sunny',
-            'Clouds': 'cloudy', 
+            'Clouds': 'cloudy',
             'Rain': 'rainy',
             'Drizzle': 'rainy',
             'Thunderstorm': 'rainy',
@@ -64,5 +413,5 @@ class WeatherService:
             'Mist': 'cloudy',
             'Fog': 'cloudy'
         }
-        
+
         return weather_map.get(weather_main, 'cloudy')
\ No newline at end of file